@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the Atmosphere module.
+
+Times the scalar functions and the private layer helpers in every layer of
+Hi, and the array functions for array sizes from 1 to 10^7. Run e.g.::
+
+    python benchmarks/bench_Atmosphere.py -o new.json -b baseline.json -t 10
+
+The script exits with code 1 if the throughput of any benchmark dropped by
+more than the threshold compared to the baseline.
+
+Copyright 2016, ALR
+"""
+#pylint: disable-msg=C0103
+
+from __future__ import print_function
+import os
+import sys
+
+import numpy as np
+
+#benchmark the working tree, not an installed version
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pyAPP6Tools import Atmosphere
+import benchtools
+
+def layerAltitudes():
+    '''
+    Returns one altitude in the middle of every layer of Hi.
+    '''
+    bounds = Atmosphere.Hi + [Atmosphere.maxH]
+    return [0.5 * (lo + hi) if hi > lo else lo for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+def benchScalar(results):
+    for idx, alt in enumerate(layerAltitudes()):
+        for dT in [0.0, 10.0]:
+            tag = 'layer{0}_dT{1:g}'.format(idx, dT)
+            benchtools.record(results, 'scalar/getAirState/' + tag,
+                              lambda: Atmosphere.getAirState(alt, dT), 1)
+            benchtools.record(results, 'scalar/getPressureAlt/' + tag,
+                              lambda: Atmosphere.getPressureAlt(alt, dT), 1)
+
+        T = Atmosphere._temperature(alt, 0.0, idx)
+        tag = 'layer{0}'.format(idx)
+        benchtools.record(results, 'scalar/_getIndex/' + tag,
+                          lambda: Atmosphere._getIndex(alt), 1)
+        benchtools.record(results, 'scalar/_temperature/' + tag,
+                          lambda: Atmosphere._temperature(alt, 0.0, idx), 1)
+        benchtools.record(results, 'scalar/_pressure/' + tag,
+                          lambda: Atmosphere._pressure(alt, T, idx), 1)
+
+def benchArray(results, maxexp):
+    rng = np.random.RandomState(0)
+    table = Atmosphere.airStateTable()
+    for exp in range(maxexp + 1):
+        n = 10**exp
+        alt = rng.uniform(Atmosphere.minH, Atmosphere.maxH, n)
+        idx = Atmosphere._getIndexArray(alt)
+        T = Atmosphere._temperatureArray(alt, 0.0, idx)
+        for dT in [0.0, 10.0]:
+            tag = 'n{0}_dT{1:g}'.format(n, dT)
+            benchtools.record(results, 'array/getAirStateArray/' + tag,
+                              lambda: Atmosphere.getAirStateArray(alt, dT), n)
+            benchtools.record(results, 'array/getPressureAltArray/' + tag,
+                              lambda: Atmosphere.getPressureAltArray(alt, dT), n)
+            benchtools.record(results, 'array/solvePressureAlt/' + tag,
+                              lambda: Atmosphere.solvePressureAlt(alt, dT), n)
+            benchtools.record(results, 'array/airStateTable/' + tag,
+                              lambda: table.getAirState(alt, dT), n)
+            benchtools.record(results, 'array/getAirStateDerivativesArray/' + tag,
+                              lambda: Atmosphere.getAirStateDerivativesArray(alt, dT), n)
+
+        tag = 'n{0}'.format(n)
+        benchtools.record(results, 'array/_getIndexArray/' + tag,
+                          lambda: Atmosphere._getIndexArray(alt), n)
+        benchtools.record(results, 'array/_temperatureArray/' + tag,
+                          lambda: Atmosphere._temperatureArray(alt, 0.0, idx), n)
+        benchtools.record(results, 'array/_pressureArray/' + tag,
+                          lambda: Atmosphere._pressureArray(alt, T, idx), n)
+
+def main():
+    parser = benchtools.argumentParser(__doc__.split('\n\n')[0].strip())
+    args = parser.parse_args()
+
+    results = {}
+    benchScalar(results)
+    benchArray(results, args.maxexp)
+    return benchtools.finish(args, results)
+
+if __name__ == "__main__":
+    sys.exit(main())
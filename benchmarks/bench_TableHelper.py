@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the TableHelper module.
+
+Times restructureArrayData against the previous implementation, which
+masks the arrays for every unique altitude and Mach number, and
+convertX3TableToArrays against its previous, list based implementation,
+for decks of 10^2 to 10^maxexp points. The x3TableInterpolator is timed for
+10^2 to 10^maxexp query points. Run e.g.::
+
+    python benchmarks/bench_TableHelper.py -o new.json -b baseline.json -t 10
+
+The script exits with code 1 if the throughput of any benchmark dropped by
+more than the threshold compared to the baseline.
+
+Copyright 2016, ALR
+"""
+#pylint: disable-msg=C0103
+
+from __future__ import print_function
+import os
+import sys
+
+import numpy as np
+
+#benchmark the working tree, not an installed version
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pyAPP6Tools import TableHelper
+import benchtools
+
+def restructureArrayDataReference(a, b, c, d):
+    '''
+    Previous implementation of TableHelper.restructureArrayData, used as
+    reference.
+    '''
+    result = []
+    unique_a = np.unique(a)
+    for element_a in unique_a:
+        b_tmp = b[a == element_a]
+        c_tmp = c[a == element_a]
+        d_tmp = d[a == element_a]
+
+        m_list = []
+        result.append([element_a, m_list])
+
+        for m in np.unique(b_tmp):
+            ff_m = d_tmp[b_tmp == m]
+            t_m = c_tmp[b_tmp == m]
+            t_ff_array = np.vstack([t_m, ff_m]).T
+            t_ff_array = t_ff_array[np.argsort(t_ff_array[:, 0])]
+            m_list.append([m, t_ff_array])
+
+    return result
+
+def convertX3TableToArraysReference(x3table):
+    '''
+    Previous implementation of TableHelper.convertX3TableToArrays, used as
+    reference.
+    '''
+    a_list = []
+    b_list = []
+    c_list = []
+    d_list = []
+
+    for val_a, tab_x2 in zip(x3table.value, x3table.table):
+        for val_b, tab_x1 in zip(tab_x2.value, tab_x2.table):
+            thrust = tab_x1[:, 0]
+            ff = tab_x1[:, 1]
+            a_list.extend([val_a] * len(thrust))
+            b_list.extend([val_b] * len(thrust))
+            c_list.extend(thrust)
+            d_list.extend(ff)
+
+    return np.array(a_list), np.array(b_list), np.array(c_list), np.array(d_list)
+
+class tableStandIn(object):
+    '''
+    Minimal stand-in for the X3Table and X2Table of pyAPP6, with the
+    attributes value and table.
+    '''
+    def __init__(self, value, table):
+        self.value = value
+        self.table = table
+
+def x3TableStandIn(a, b, c, d):
+    '''
+    Returns a tableStandIn with the structure of an X3Table.
+    '''
+    alist = TableHelper.restructureArrayData(a, b, c, d)
+    return tableStandIn([alt for alt, _ in alist],
+                        [tableStandIn([m for m, _ in m_list], [np.array(t) for _, t in m_list])
+                         for _, m_list in alist])
+
+def engineDeck(n, rng):
+    '''
+    Returns a shuffled engine deck (alt, Mach, thrust, fuel flow) with about
+    *n* points, on a grid with about n^(1/3) values per axis.
+    '''
+    k = max(2, int(round(n**(1.0/3.0))))
+    alt, mach, thrust = np.meshgrid(np.linspace(0.0, 12000.0, k),
+                                    np.linspace(0.0, 0.9, k),
+                                    np.linspace(1e3, 1e5, k), indexing='ij')
+    alt, mach, thrust = alt.ravel(), mach.ravel(), thrust.ravel()
+    ff = 1e-5 * thrust * (1.0 + 0.5 * mach) * (1.0 - alt / 5e4)
+    order = rng.permutation(len(alt))
+    return alt[order], mach[order], thrust[order], ff[order]
+
+def main():
+    parser = benchtools.argumentParser(__doc__.split('\n\n')[0].strip())
+    parser.set_defaults(maxexp=6)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    results = {}
+    for exp in range(2, args.maxexp + 1):
+        a, b, c, d = engineDeck(10**exp, rng)
+        tag = 'n{0}'.format(len(a))
+        benchtools.record(results, 'restructureArrayData/' + tag,
+                          lambda: TableHelper.restructureArrayData(a, b, c, d), len(a))
+        benchtools.record(results, 'restructureArrayDataReference/' + tag,
+                          lambda: restructureArrayDataReference(a, b, c, d), len(a))
+
+        x3table = x3TableStandIn(a, b, c, d)
+        benchtools.record(results, 'convertX3TableToArrays/' + tag,
+                          lambda: TableHelper.convertX3TableToArrays(x3table), len(a))
+        benchtools.record(results, 'convertX3TableToArraysReference/' + tag,
+                          lambda: convertX3TableToArraysReference(x3table), len(a))
+
+    a, b, c, d = engineDeck(10**4, rng)
+    interp = TableHelper.x3TableInterpolator.fromArrays(a, b, c, d)
+    for exp in range(2, args.maxexp + 1):
+        n = 10**exp
+        alt = rng.uniform(a.min(), a.max(), n)
+        mach = rng.uniform(b.min(), b.max(), n)
+        thrust = rng.uniform(c.min(), c.max(), n)
+        benchtools.record(results, 'x3TableInterpolator/n{0}'.format(n),
+                          lambda: interp(alt, mach, thrust), n)
+    return benchtools.finish(args, results)
+
+if __name__ == "__main__":
+    sys.exit(main())
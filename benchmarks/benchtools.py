@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Helper functions for the benchmark scripts: timing, writing the results to
+a JSON file and comparing them with a baseline run.
+
+Copyright 2016, ALR
+"""
+#pylint: disable-msg=C0103
+
+from __future__ import print_function
+import argparse
+import json
+import platform
+import sys
+import time
+import timeit
+
+import numpy as np
+
+def timeCall(func, repeat=3):
+    '''
+    Times a function call with timeit. The number of calls per measurement is
+    chosen such that a measurement takes at least 0.2 s, and the best of
+    *repeat* measurements is returned.
+
+    Arguments
+    ---------
+    func : callable
+        function without arguments to time
+    repeat : int
+        number of measurements
+
+    Returns
+    -------
+    float
+        best time of a single call [s]
+    '''
+    timer = timeit.Timer(func)
+    number = timer.autorange()[0]
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+def record(results, name, func, n):
+    '''
+    Times *func* and stores time and throughput under *name* in *results*.
+
+    Arguments
+    ---------
+    results : dict
+        dictionary with the results
+    name : str
+        name of the benchmark
+    func : callable
+        function without arguments to time
+    n : int
+        number of points evaluated per call
+    '''
+    t = timeCall(func)
+    results[name] = {'n': n, 'time': t, 'throughput': n / t}
+    print('{0:60s} {1:12.3e} s {2:12.3e} pts/s'.format(name, t, n / t))
+
+def writeResults(filename, results):
+    '''
+    Writes the results together with information on the platform to a JSON
+    file.
+
+    Arguments
+    ---------
+    filename : str
+        path of the JSON file
+    results : dict
+        dictionary with the results
+    '''
+    data = {'meta': {'python': sys.version,
+                     'numpy': np.__version__,
+                     'platform': platform.platform(),
+                     'date': time.strftime('%Y-%m-%d %H:%M:%S')},
+            'results': results}
+    with open(filename, 'w') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+
+def compareResults(results, baselineFile, threshold):
+    '''
+    Compares the throughput of the results with a baseline JSON file.
+
+    Arguments
+    ---------
+    results : dict
+        dictionary with the results
+    baselineFile : str
+        path of a JSON file written by writeResults
+    threshold : float
+        maximum allowed drop of the throughput [%]
+
+    Returns
+    -------
+    list
+        list of tuples (name, baseline throughput, throughput) of all
+        benchmarks with a regression
+    '''
+    with open(baselineFile) as f:
+        baseline = json.load(f)['results']
+
+    regressions = []
+    for name, res in sorted(results.items()):
+        if name not in baseline:
+            continue
+        ref = baseline[name]['throughput']
+        if res['throughput'] < ref * (1.0 - threshold / 100.0):
+            regressions.append((name, ref, res['throughput']))
+    return regressions
+
+def argumentParser(description):
+    '''
+    Returns an argument parser with the options common to all benchmarks.
+
+    Arguments
+    ---------
+    description : str
+        description of the benchmark script
+
+    Returns
+    -------
+    argparse.ArgumentParser
+        the argument parser
+    '''
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-o', '--output', help='JSON file to write the results to')
+    parser.add_argument('-b', '--baseline', help='JSON file of a previous run to compare with')
+    parser.add_argument('-t', '--threshold', type=float, default=10.0,
+                        help='maximum allowed drop of the throughput in percent (default 10)')
+    parser.add_argument('--maxexp', type=int, default=7,
+                        help='largest array size as power of ten (default 7)')
+    return parser
+
+def finish(args, results):
+    '''
+    Writes the results and compares them with the baseline, if given.
+
+    Arguments
+    ---------
+    args : argparse.Namespace
+        parsed arguments of argumentParser
+    results : dict
+        dictionary with the results
+
+    Returns
+    -------
+    int
+        exit code, 1 if a regression was found, else 0
+    '''
+    if args.output:
+        writeResults(args.output, results)
+    if args.baseline:
+        regressions = compareResults(results, args.baseline, args.threshold)
+        for name, ref, val in regressions:
+            print('REGRESSION {0}: {1:.3e} -> {2:.3e} pts/s ({3:+.1f} %)'.format(
+                name, ref, val, (val / ref - 1.0) * 100.0))
+        if regressions:
+            return 1
+        print('No regression above {0} %'.format(args.threshold))
+    return 0
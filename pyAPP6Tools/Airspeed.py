@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+This module converts between Mach number, true airspeed (TAS), calibrated
+airspeed (CAS) and equivalent airspeed (EAS), based on the atmosphere module.
+
+All functions accept numpy arrays. The class airspeedConverter evaluates the
+atmosphere once for a set of points and then performs any number of
+conversions at these points. convertAirspeed is a shortcut for a single
+conversion.
+
+CAS is defined by the impact pressure qc, which is computed with the
+isentropic relation for subsonic and with the Rayleigh pitot formula for
+supersonic flow. The inverse, the Mach number from the impact pressure, is
+closed form for subsonic flow and solved with Newton's method for supersonic
+flow.
+
+Copyright 2016, ALR
+"""
+
+#pylint: disable-msg=C0103
+
+import numpy as np
+
+from pyAPP6Tools import Atmosphere
+
+#sea level values of the standard atmosphere
+p0 = Atmosphere.pi[0]
+T0 = Atmosphere.Ti[0]
+rho0 = p0 / Atmosphere.R / T0
+a0 = (Atmosphere.GAMMA * Atmosphere.R * T0)**0.5
+
+speedTypes = ['mach', 'tas', 'cas', 'eas']
+
+def impactPressure(mach, p):
+    '''
+    Impact pressure (total minus static pressure) of a pitot tube.
+
+    Arguments
+    ---------
+    mach : array_like
+        Mach number
+    p : array_like
+        static pressure [Pa]
+
+    Returns
+    -------
+    ndarray
+        impact pressure [Pa]
+    '''
+    mach, p = np.broadcast_arrays(np.asarray(mach, dtype=float),
+                                  np.asarray(p, dtype=float))
+    return p * (_pressureRatio(mach) - 1.0)
+
+def machFromImpactPressure(qc, p, tol=1e-12, maxiter=50):
+    '''
+    Mach number from the impact pressure of a pitot tube, the inverse of
+    impactPressure.
+
+    The subsonic solution is closed form. Where it exceeds Mach 1, the Rayleigh
+    pitot formula is solved with Newton's method, starting from the subsonic
+    solution.
+
+    Arguments
+    ---------
+    qc : array_like
+        impact pressure [Pa]
+    p : array_like
+        static pressure [Pa]
+    tol : float
+        tolerance of the supersonic Mach number
+    maxiter : int
+        maximum number of Newton iterations
+
+    Raises
+    ------
+    ValueError
+        If the impact pressure is negative
+
+    Returns
+    -------
+    ndarray
+        Mach number
+    '''
+    qc, p = np.broadcast_arrays(np.asarray(qc, dtype=float),
+                                np.asarray(p, dtype=float))
+    if np.any(qc < 0.0):
+        raise ValueError('Negative impact pressure')
+    gm = Atmosphere.GAMMA
+    ratio = qc / p + 1.0
+
+    mach = np.array(np.sqrt(2.0 / (gm - 1.0) * (ratio**((gm - 1.0) / gm) - 1.0)))
+
+    #Newton's method on the logarithm of the Rayleigh pitot formula, only for
+    #the supersonic points. Converged points are removed from the active set.
+    active = np.flatnonzero(mach > 1.0)
+    logRatio = np.log(ratio.flat[active])
+    counter = 0
+    while active.size > 0 and counter < maxiter:
+        M = mach.flat[active]
+        M2 = M * M
+        f = np.log(_pressureRatioSupersonic(M)) - logRatio
+        df = 2.0 * gm / (gm - 1.0) / M - 4.0 * gm * M / (gm - 1.0) / (2.0*gm*M2 - gm + 1.0)
+        step = f / df
+        mach.flat[active] = M - step
+
+        done = np.abs(step) <= tol
+        active = active[~done]
+        logRatio = logRatio[~done]
+        counter += 1
+    return mach
+
+class airspeedConverter(object):
+    '''
+    Converts airspeeds at a set of points in the atmosphere.
+
+    The atmosphere is evaluated once in the constructor, and the conversions
+    are broadcast against the shape of *alt* and *dT*.
+
+    Arguments
+    ---------
+    alt : array_like
+        Geometric altitude [m]
+    dT : array_like
+        Temperature offset from standard temperature [K]
+    table : airStateTable
+        if given, the atmosphere is evaluated with the table instead of
+        getAirStateArray
+
+    Raises
+    ------
+    ValueError
+        If any altitude or temperature offset is out of bounds
+
+    Examples
+    --------
+    Several conversions along a mission history::
+
+        conv = airspeedConverter(alt, dT)
+        cas = conv.convert(mach, 'mach', 'cas')
+        eas = conv.convert(mach, 'mach', 'eas')
+        mach_max = conv.convert(vmo, 'cas', 'mach')
+    '''
+
+    def __init__(self, alt, dT=0.0, table=None):
+        if table is None:
+            state = Atmosphere.getAirStateArray(alt, dT)
+        else:
+            state = table.getAirState(alt, dT)
+        self.temp, self.p, self.dens, self.mu, self.a = state
+
+    def convert(self, speed, fromType, toType):
+        '''
+        Converts airspeeds.
+
+        Arguments
+        ---------
+        speed : array_like
+            airspeed [m/s] or Mach number
+        fromType : str
+            type of *speed*, one of 'mach', 'tas', 'cas', 'eas'
+        toType : str
+            type of the result, one of 'mach', 'tas', 'cas', 'eas'
+
+        Raises
+        ------
+        ValueError
+            If a type is unknown
+
+        Returns
+        -------
+        ndarray
+            converted airspeed [m/s] or Mach number
+        '''
+        for speedType in [fromType, toType]:
+            if speedType not in speedTypes:
+                raise ValueError('Unknown airspeed type: ' + str(speedType))
+        if fromType == 'mach':
+            mach = np.asarray(speed, dtype=float)
+        else:
+            mach = getattr(self, 'machFrom' + fromType.upper())(speed)
+        if toType == 'mach':
+            return mach
+        return getattr(self, toType.upper() + 'FromMach')(mach)
+
+    def machFromTAS(self, tas):
+        '''Mach number from true airspeed [m/s]'''
+        return np.asarray(tas, dtype=float) / self.a
+
+    def TASFromMach(self, mach):
+        '''True airspeed [m/s] from Mach number'''
+        return np.asarray(mach, dtype=float) * self.a
+
+    def machFromEAS(self, eas):
+        '''Mach number from equivalent airspeed [m/s]'''
+        return np.asarray(eas, dtype=float) * np.sqrt(rho0 / self.dens) / self.a
+
+    def EASFromMach(self, mach):
+        '''Equivalent airspeed [m/s] from Mach number'''
+        return np.asarray(mach, dtype=float) * self.a * np.sqrt(self.dens / rho0)
+
+    def machFromCAS(self, cas):
+        '''Mach number from calibrated airspeed [m/s]'''
+        qc = impactPressure(np.asarray(cas, dtype=float) / a0, p0)
+        return machFromImpactPressure(qc, self.p)
+
+    def CASFromMach(self, mach):
+        '''Calibrated airspeed [m/s] from Mach number'''
+        qc = impactPressure(mach, self.p)
+        return a0 * machFromImpactPressure(qc, p0)
+
+def convertAirspeed(speed, fromType, toType, alt, dT=0.0):
+    '''
+    Converts airspeeds at given altitudes, see airspeedConverter.
+
+    Arguments
+    ---------
+    speed : array_like
+        airspeed [m/s] or Mach number
+    fromType : str
+        type of *speed*, one of 'mach', 'tas', 'cas', 'eas'
+    toType : str
+        type of the result, one of 'mach', 'tas', 'cas', 'eas'
+    alt : array_like
+        Geometric altitude [m]
+    dT : array_like
+        Temperature offset from standard temperature [K]
+
+    Raises
+    ------
+    ValueError
+        If a type is unknown, or the altitude or temperature offset is out of
+        bounds
+
+    Returns
+    -------
+    ndarray
+        converted airspeed [m/s] or Mach number
+
+    Examples
+    --------
+    CAS of Mach 0.8 at 10000 m::
+
+        cas = convertAirspeed(0.8, 'mach', 'cas', 10000.0)
+    '''
+    return airspeedConverter(alt, dT).convert(speed, fromType, toType)
+
+def _pressureRatio(mach):
+    '''
+    Internal function for the ratio of total to static pressure behind a
+    pitot tube, isentropic for subsonic and Rayleigh pitot for supersonic
+    Mach numbers.
+
+    Arguments
+    ---------
+    mach : ndarray
+        Mach number
+
+    Returns
+    -------
+    ndarray
+        pressure ratio
+    '''
+    gm = Atmosphere.GAMMA
+    ratio = np.array((1.0 + 0.5 * (gm - 1.0) * mach**2)**(gm / (gm - 1.0)))
+    supersonic = mach > 1.0
+    ratio[supersonic] = _pressureRatioSupersonic(mach[supersonic])
+    return ratio
+
+def _pressureRatioSupersonic(mach):
+    '''
+    Internal function for the Rayleigh pitot formula
+
+    Arguments
+    ---------
+    mach : ndarray
+        Mach number, >= 1
+
+    Returns
+    -------
+    ndarray
+        ratio of total pressure behind the normal shock to static pressure
+    '''
+    gm = Atmosphere.GAMMA
+    M2 = mach**2
+    return ((0.5 * (gm + 1.0) * M2)**(gm / (gm - 1.0)) *
+            ((gm + 1.0) / (2.0 * gm * M2 - gm + 1.0))**(1.0 / (gm - 1.0)))
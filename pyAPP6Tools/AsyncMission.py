@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""
+This module provides an asyncio interface to the mission evaluations of
+MissionOptimization, for applications which are based on asyncio.
+
+The mission computations run in an executor (by default a process pool),
+such that the event loop is never blocked, and the number of concurrent
+computations is limited by a semaphore. Evaluations are cancelled like any
+other asyncio task.
+
+The mission computation depends on APP and the pyAPP6 package. For tests
+without APP, see MockAPP.
+
+Copyright 2016, ALR
+"""
+#pylint: disable-msg=C0103
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import CancelledError, Executor, ProcessPoolExecutor
+
+from pyAPP6Tools import MissionOptimization
+
+class asyncMissionEvaluator(object):
+    '''
+    Evaluates missions as awaitables.
+
+    The values are cached as by missionEvaluator. Concurrent evaluations of
+    the same point share one mission computation.
+
+    An evaluation can be cancelled. If it is still waiting for the
+    semaphore, the mission is never computed. A mission computation which
+    has already started in the executor cannot be interrupted, its result is
+    discarded.
+
+    Arguments
+    ---------
+    misfile : str
+        path to the APP6 .mis file
+    segParList : list[segmentParameter]
+        list of segmentParameter class instances
+    misObjective : missionObjective
+        instance of a missionObjective class. If the norm is not set, it is
+        set by start.
+    maxConcurrent : int
+        maximum number of concurrent mission computations
+    executor : concurrent.futures.Executor
+        executor for the mission computations. By default, a process pool
+        with *maxConcurrent* processes is created.
+    workdir : workDirectory
+        scratch file manager. If None, the scratch files are created next to
+        the mission file.
+    cache : evaluationCache
+        cache of the objective values. If None, an in-memory cache is used.
+    run : optimizationRun
+        if given, every mission computation is recorded in it
+    constraints : list[missionConstraint]
+        constraints, which are evaluated in the same mission computation as
+        the objective
+
+    Examples
+    --------
+    Evaluate candidates as they are proposed, and abandon a superseded one::
+
+        async with asyncMissionEvaluator(misfile, segParList, objective) as evaluator:
+            await evaluator.start()
+            task = asyncio.ensure_future(evaluator.evaluate(x))
+            ...
+            task.cancel()
+    '''
+    def __init__(self, misfile, segParList, misObjective, maxConcurrent=4, executor=None,
+                 workdir=None, cache=None, run=None, constraints=None):
+        self.evaluator = MissionOptimization.missionEvaluator(
+            misfile, segParList, misObjective, workdir=workdir, cache=cache, run=run,
+            constraints=constraints)
+        self.maxConcurrent = maxConcurrent
+        #created in the running event loop, see _run
+        self._semaphore = None
+        self._executor = executor
+        self._ownsExecutor = executor is None
+        self._ownsWorkdir = workdir is None
+        self._pending = {}
+        self._waiters = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
+
+    async def start(self):
+        '''
+        Computes the mission file to set the norm of the objective, if it is
+        not set.
+        '''
+        ev = self.evaluator
+        if ev.misObjective.value is None:
+            value = await self._run(_normTask, (ev.misfile, ev.misObjective))
+            ev.misObjective.value = value
+
+    async def evaluate(self, x):
+        '''
+        Returns the objective value of the parameter vector *x*.
+        '''
+        values = await self.evaluateValues(x)
+        return values[0]
+
+    async def evaluateValues(self, x):
+        '''
+        Returns the list [objective value, constraint values] of the
+        parameter vector *x*.
+        '''
+        key, values = self.evaluator.lookup(x)
+        if values is not None:
+            return values
+        if key not in self._pending or self._pending[key].cancelled():
+            self._pending[key] = asyncio.ensure_future(self._compute(key, x))
+            self._pending[key].add_done_callback(functools.partial(self._done, key))
+            self._waiters[key] = 0
+        task = self._pending[key]
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            #abandon the computation if nobody else waits for it
+            if self._waiters[key] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            if key in self._waiters:
+                self._waiters[key] -= 1
+
+    async def evaluateBatch(self, xList):
+        '''
+        Returns the objective values of a list of parameter vectors, which
+        are evaluated concurrently.
+        '''
+        return list(await asyncio.gather(*[self.evaluate(x) for x in xList]))
+
+    def close(self):
+        '''
+        Shuts down the executor and removes the scratch directory, if they
+        have been created by this instance.
+        '''
+        if self._ownsExecutor and self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._ownsWorkdir:
+            self.evaluator.workdir.cleanup()
+
+    async def _compute(self, key, x):
+        value, timing = await self._run(MissionOptimization._evaluateTask,
+                                        self.evaluator.taskArguments(x))
+        self.evaluator.store(key, x, value, timing)
+        return value
+
+    def _done(self, key, task):
+        if self._pending.get(key) is task:
+            del self._pending[key]
+            del self._waiters[key]
+
+    async def _run(self, func, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.maxConcurrent)
+        async with self._semaphore:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.maxConcurrent)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+
+async def sweepMissionAsync(misfile, segParList, design, variables, func=None, names=None,
+                            filename=None, maxConcurrent=4, executor=None, workdir=None):
+    '''
+    asyncio version of MissionOptimization.sweepMission.
+
+    If the sweep is cancelled, the design points computed so far are saved
+    in *filename*, and the sweep can be restarted.
+
+    Arguments
+    ---------
+    misfile, segParList, design, variables, func, names, filename, workdir :
+        see sweepMission
+    maxConcurrent : int
+        maximum number of concurrent mission computations
+    executor : concurrent.futures.Executor
+        executor for the mission computations. By default, a process pool
+        with *maxConcurrent* processes is created.
+
+    Returns
+    -------
+    ndarray
+        structured array with the results, see sweepMission
+    '''
+    table = MissionOptimization._sweepTable(segParList, design, variables, names, filename)
+    ownsWorkdir = workdir is None
+    if ownsWorkdir:
+        workdir = MissionOptimization.workDirectory(misfile)
+    tasks = MissionOptimization._sweepTasks(misfile, segParList, table, variables, func, workdir)
+    ownsExecutor = executor is None
+    if ownsExecutor:
+        executor = ProcessPoolExecutor(max_workers=maxConcurrent)
+    semaphore = asyncio.Semaphore(maxConcurrent)
+    loop = asyncio.get_running_loop()
+
+    async def runTask(task):
+        async with semaphore:
+            result = await loop.run_in_executor(executor, MissionOptimization._sweepTask, task)
+        MissionOptimization._storeSweepResult(table, variables, result)
+
+    pending = [asyncio.ensure_future(runTask(task)) for task in tasks]
+    try:
+        await asyncio.gather(*pending)
+    except BaseException:
+        #stop the other design points if one has failed
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        raise
+    finally:
+        if ownsExecutor:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if filename is not None:
+            MissionOptimization._saveArray(filename, table)
+        if ownsWorkdir:
+            workdir.cleanup()
+    return table
+
+async def optimizeMissionAsync(misfile, segParList, misObjective, evaluator=None,
+                               maxConcurrent=4, **kwargs):
+    '''
+    asyncio version of MissionOptimization.optimizeMission.
+
+    The optimizer runs in a thread, and its mission evaluations are run
+    with the semaphore and the executor of an asyncMissionEvaluator. Several
+    optimizations sharing one *evaluator* compute at most its
+    *maxConcurrent* missions at the same time. If the optimization is
+    cancelled, its pending evaluations are cancelled, and the
+    CancelledError is raised once the thread has ended (a checkpoint is
+    saved, if given). Mission computations which have already started
+    cannot be interrupted, their results are discarded.
+
+    Arguments
+    ---------
+    misfile, segParList, misObjective :
+        see optimizeMission
+    evaluator : asyncMissionEvaluator
+        evaluator whose semaphore and executor are used. By default, an
+        evaluator with *maxConcurrent* processes is created.
+    maxConcurrent : int
+        maximum number of concurrent mission computations, if no
+        *evaluator* is given
+    kwargs :
+        further arguments of optimizeMission, except executor
+
+    Returns
+    -------
+    OptimizeResult
+        see optimizeMission
+
+    Examples
+    --------
+    Run two optimizations with at most 4 mission computations at a time::
+
+        async with asyncMissionEvaluator(misfile, segParList, objective) as evaluator:
+            results = await asyncio.gather(
+                optimizeMissionAsync(misfile, segParList, objective, evaluator=evaluator),
+                optimizeMissionAsync(misfile, segParList2, objective, evaluator=evaluator))
+    '''
+    ownsEvaluator = evaluator is None
+    if ownsEvaluator:
+        evaluator = asyncMissionEvaluator(misfile, segParList, misObjective,
+                                          maxConcurrent=maxConcurrent)
+    loop = asyncio.get_running_loop()
+    executor = _evaluatorExecutor(evaluator, loop)
+    try:
+        if misObjective.value is None and not kwargs.get('resume'):
+            #compute the mission file within the semaphore as well
+            misObjective.value = await evaluator._run(_normTask, (misfile, misObjective))
+        future = loop.run_in_executor(None, functools.partial(
+            MissionOptimization.optimizeMission, misfile, segParList, misObjective,
+            executor=executor, **kwargs))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            #cancel the pending evaluations, the thread stops at the next one
+            executor.shutdown(cancel_futures=True)
+            try:
+                await future
+            except (_optimizationCancelled, CancelledError):
+                pass
+            raise
+    finally:
+        executor.shutdown()
+        if ownsEvaluator:
+            evaluator.close()
+
+class _evaluatorExecutor(Executor):
+    '''
+    Executor for the thread of optimizeMissionAsync, which runs the tasks in
+    the event loop with the semaphore and the executor of an
+    asyncMissionEvaluator. After shutdown, submit raises
+    _optimizationCancelled.
+    '''
+    def __init__(self, evaluator, loop):
+        self._evaluator = evaluator
+        self._loop = loop
+        self._futures = set()
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            if self._shutdown:
+                raise _optimizationCancelled()
+            future = asyncio.run_coroutine_threadsafe(
+                self._evaluator._run(functools.partial(fn, *args, **kwargs)), self._loop)
+            self._futures.add(future)
+        future.add_done_callback(self._discard)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        with self._lock:
+            self._shutdown = True
+            futures = list(self._futures)
+        if cancel_futures:
+            for future in futures:
+                future.cancel()
+
+    def _discard(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+class _optimizationCancelled(Exception):
+    '''Raised in the thread of optimizeMissionAsync to stop a cancelled
+    optimization.
+    '''
+
+def _normTask(args):
+    '''Helper function for asyncMissionEvaluator, executed in the executor.
+    Don't call directely.
+
+    Computes the mission file and returns the value of the objective
+    variable.
+    '''
+    misfile, misObjective = args
+    misCmp = MissionOptimization.Mission.MissionComputation()
+    misCmp.run(misfile)
+    return misObjective.func(misCmp.result, misObjective.variable)
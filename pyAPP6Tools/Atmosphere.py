@@ -1,13 +1,22 @@
 # -*- coding: utf-8 -*-
 """
 This module provides data for the international standard atmosphere (ISA) as
-implemented in APP, through the two functions getAirState and getPressureAlt
+implemented in APP, through the two functions getAirState and getPressureAlt.
+
+For large numbers of points, the functions getAirStateArray and
+getPressureAltArray accept numpy arrays and return the same values as their
+scalar counterparts. solvePressureAlt solves for the pressure altitude to a
+selectable tolerance using Newton's method. The class airStateTable provides
+a faster, table-backed evaluation with a bounded error.
+getAirStateDerivativesArray returns the air state together with its analytic
+derivatives with respect to altitude and temperature offset.
 
 Copyright 2016, ALR
 """
 
 #pylint: disable-msg=C0103
 
+import os
 import sys
 import numpy as np
 
@@ -30,6 +39,12 @@ Ti = [288.15, 216.65, 216.65, 228.65, 270.65, 270.65, 214.65, 196.65]
 pi = [1.013250e5, 2.263204e4, 5.474879e3, 8.680160e2, 1.109058e2, 6.693853e1,
       3.956392, 8.862722e-1]
 
+#array versions of the layer data, used by the vectorized functions
+_HiArray = np.array(Hi)
+_LiArray = np.array(Li)
+_TiArray = np.array(Ti)
+_piArray = np.array(pi)
+
 def getAirState(alt, dT):
     '''
     Get the atmospheric properties of the international standard
@@ -101,6 +116,458 @@ def getPressureAlt(alt, dT):
             counter += 1
         return Hp
 
+def getAirStateArray(alt, dT):
+    '''
+    Vectorized version of getAirState. The arguments are broadcast against
+    each other, and the results agree with the ones of getAirState to
+    rounding errors.
+
+    Arguments
+    ---------
+    alt : array_like
+        Geometric altitude [m]
+    dT : array_like
+        Temperature offset from standard temperature [K]
+
+    Raises
+    ------
+    ValueError
+        If any altitude or temperature offset is out of bounds
+
+    Returns
+    -------
+    tuple
+        Tuple of ndarrays containing temperature [K], pressure [Pa],
+        density [Kg/m^3], viscosity [Ns/(m^2)] and speed of sound [m/s]
+    '''
+    Hp = getPressureAltArray(alt, dT)
+    dT = np.broadcast_to(np.asarray(dT, dtype=float), Hp.shape)
+    return _airStateArray(Hp, dT)
+
+def getPressureAltArray(alt, dT):
+    '''
+    Vectorized version of getPressureAlt. The arguments are broadcast against
+    each other, and the results agree with the ones of getPressureAlt to
+    rounding errors.
+
+    Arguments
+    ---------
+    alt : array_like
+        Geometric altitude [m]
+    dT : array_like
+        Temperature offset from standard temperature [K]
+
+    Raises
+    ------
+    ValueError
+        If any altitude or temperature offset is out of bounds
+
+    Returns
+    -------
+    ndarray
+        Pressure altitude [m]
+    '''
+    alt, dT = np.broadcast_arrays(np.asarray(alt, dtype=float),
+                                  np.asarray(dT, dtype=float))
+    _checkBounds(alt, dT)
+
+    po = pi[0]
+    Hp = alt.copy()
+
+    #same fixed point iteration as getPressureAlt, for all points at once.
+    #Converged points are removed from the active set.
+    active = np.flatnonzero(dT != 0.0)
+    counter = 0
+    while active.size > 0 and counter < 100:
+        Hp_act = Hp.flat[active]
+        i = _getIndexArray(Hp_act)
+        T = _temperatureArray(Hp_act, 0.0, i)
+        p = _pressureArray(Hp_act, T, i)
+
+        Hp_new = alt.flat[active] + (R/G * dT.flat[active] * np.log(p/po))
+        Hp.flat[active] = Hp_new
+        active = active[np.abs(Hp_new-Hp_act) > 1]
+
+        counter += 1
+    return Hp
+
+def solvePressureAlt(alt, dT, tol=1e-6, maxiter=20):
+    '''
+    Solves for the pressure altitude with Newton's method, for arrays of
+    altitudes and temperature offsets.
+
+    In contrast to getPressureAlt, which stops at a tolerance of 1 m, the
+    iteration is continued until the Newton step is smaller than *tol*. The
+    derivative of the residual is known analytically from the hydrostatic
+    equation, d(ln p)/dHp = -G/(R*T_ISA), so that only a few iterations are
+    needed.
+
+    Arguments
+    ---------
+    alt : array_like
+        Geometric altitude [m]
+    dT : array_like
+        Temperature offset from standard temperature [K]
+    tol : float
+        tolerance of the pressure altitude [m]
+    maxiter : int
+        maximum number of iterations
+
+    Raises
+    ------
+    ValueError
+        If any altitude or temperature offset is out of bounds
+
+    Returns
+    -------
+    tuple
+        Tuple (Hp, iterations, converged) of ndarrays containing the pressure
+        altitude [m], the number of iterations and whether the iteration
+        converged for each point
+    '''
+    alt, dT = np.broadcast_arrays(np.asarray(alt, dtype=float),
+                                  np.asarray(dT, dtype=float))
+    _checkBounds(alt, dT)
+
+    po = pi[0]
+    Hp = alt.copy()
+    iterations = np.zeros(alt.shape, dtype=int)
+    converged = np.ones(alt.shape, dtype=bool)
+
+    active = np.flatnonzero(dT != 0.0)
+    converged.flat[active] = False
+    counter = 0
+    while active.size > 0 and counter < maxiter:
+        Hp_act = Hp.flat[active]
+        dT_act = dT.flat[active]
+        i = _getIndexArray(Hp_act)
+        T = _temperatureArray(Hp_act, 0.0, i)
+        p = _pressureArray(Hp_act, T, i)
+
+        #residual and derivative of Hp - alt - R/G*dT*ln(p/po)
+        f = Hp_act - alt.flat[active] - (R/G * dT_act * np.log(p/po))
+        df = 1.0 + dT_act / T
+        step = f / df
+
+        Hp.flat[active] = Hp_act - step
+        iterations.flat[active] += 1
+
+        done = np.abs(step) <= tol
+        converged.flat[active[done]] = True
+        active = active[~done]
+
+        counter += 1
+    return Hp, iterations, converged
+
+def getAirStateDerivativesArray(alt, dT):
+    '''
+    Vectorized evaluation of the air state together with its derivatives
+    with respect to the geometric altitude and the temperature offset.
+
+    The derivatives are analytic, using the lapse rate of the layer of each
+    point. The pressure altitude Hp follows from
+    Hp = alt + R/G*dT*ln(p(Hp)/po), which gives
+
+        dHp/dalt = T_ISA/T
+        dHp/ddT = R/G*ln(p/po)*T_ISA/T
+
+    and the hydrostatic equation dp/dalt = -rho*G. The values are identical
+    to the ones of getAirStateArray.
+
+    Arguments
+    ---------
+    alt : array_like
+        Geometric altitude [m]
+    dT : array_like
+        Temperature offset from standard temperature [K]
+
+    Raises
+    ------
+    ValueError
+        If any altitude or temperature offset is out of bounds
+
+    Returns
+    -------
+    tuple
+        Tuple (values, d_dalt, d_ddT) of tuples of ndarrays. Each tuple
+        contains temperature [K], pressure [Pa], density [Kg/m^3],
+        viscosity [Ns/(m^2)] and speed of sound [m/s], or their derivatives
+        with respect to the altitude [1/m] and the temperature offset [1/K]
+
+    Examples
+    --------
+    Rate of change of the density in a climb::
+
+        values, d_dalt, d_ddT = getAirStateDerivativesArray(alt, dT)
+        drho_dt = d_dalt[2] * climbRate
+    '''
+    Hp = getPressureAltArray(alt, dT)
+    dT = np.broadcast_to(np.asarray(dT, dtype=float), Hp.shape)
+    return _airStateDerivativesArray(Hp, dT)
+
+class airStateTable(object):
+    '''
+    Table-backed version of the atmosphere model for fast evaluation.
+
+    The pressure altitude correction Hp - alt and its derivative with respect
+    to dT are precomputed with solvePressureAlt on a regular grid over
+    minH..maxH and min_dT..max_dT. The correction is interpolated linearly in
+    altitude and with cubic hermite polynomials in dT. Temperature, pressure,
+    density, viscosity and speed of sound are then evaluated with the exact
+    layer formulas, so the only approximation is the interpolated pressure
+    altitude.
+
+    With the default grid (25 m, 0.25 K), the relative error of all quantities
+    compared to the exact solution is below *maxRelError* = 1e-6. Note that
+    this is more accurate than getAirState, which solves the pressure
+    altitude to 1 m only. Use checkError to verify the bound for a grid.
+
+    Arguments
+    ---------
+    dAlt : float
+        grid spacing of the altitude [m]
+    d_dT : float
+        grid spacing of the temperature offset [K]
+    cachefile : str
+        path to a .npy file. If it exists and matches the grid, the table is
+        loaded from it, otherwise the table is computed and saved to it.
+
+    Examples
+    --------
+    The table is used like the module functions::
+
+        table = airStateTable(cachefile='isa_table.npy')
+        temp, p, dens, mu, a = table.getAirState(alt, dT)
+    '''
+
+    maxRelError = 1e-6
+
+    def __init__(self, dAlt=25.0, d_dT=0.25, cachefile=None):
+        n_alt = int(np.ceil((maxH - minH) / dAlt)) + 1
+        n_dT = int(np.ceil((max_dT - min_dT) / d_dT)) + 1
+        self.alt = np.linspace(minH, maxH, n_alt)
+        self.dT = np.linspace(min_dT, max_dT, n_dT)
+        self._dAlt = self.alt[1] - self.alt[0]
+        self._d_dT = self.dT[1] - self.dT[0]
+
+        self.table = None
+        if cachefile is not None and os.path.exists(cachefile):
+            table = np.load(cachefile)
+            if table.shape == (n_alt, n_dT, 2):
+                self.table = table
+        if self.table is None:
+            alt, dT = np.meshgrid(self.alt, self.dT, indexing='ij')
+            Hp = solvePressureAlt(alt, dT, tol=1e-9)[0]
+            idx = _getIndexArray(Hp)
+            Tisa = _temperatureArray(Hp, 0.0, idx)
+            p = _pressureArray(Hp, Tisa, idx)
+            #derivative of Hp with respect to dT at constant altitude
+            dHp_ddT = R/G * np.log(p/pi[0]) * Tisa / (Tisa + dT)
+            self.table = np.stack([Hp - alt, dHp_ddT], axis=-1)
+            if cachefile is not None:
+                np.save(cachefile, self.table)
+
+    def getAirState(self, alt, dT):
+        '''
+        Get the atmospheric properties from the table. See getAirStateArray.
+
+        Arguments
+        ---------
+        alt : array_like
+            Geometric altitude [m]
+        dT : array_like
+            Temperature offset from standard temperature [K]
+
+        Raises
+        ------
+        ValueError
+            If any altitude or temperature offset is out of bounds
+
+        Returns
+        -------
+        tuple
+            Tuple of ndarrays containing temperature [K], pressure [Pa],
+            density [Kg/m^3], viscosity [Ns/(m^2)] and speed of sound [m/s]
+        '''
+        Hp = self.getPressureAlt(alt, dT)
+        dT = np.broadcast_to(np.asarray(dT, dtype=float), Hp.shape)
+        return _airStateArray(Hp, dT)
+
+    def getPressureAlt(self, alt, dT):
+        '''
+        Get the pressure altitude by interpolation of the table.
+
+        Arguments
+        ---------
+        alt : array_like
+            Geometric altitude [m]
+        dT : array_like
+            Temperature offset from standard temperature [K]
+
+        Raises
+        ------
+        ValueError
+            If any altitude or temperature offset is out of bounds
+
+        Returns
+        -------
+        ndarray
+            Pressure altitude [m]
+        '''
+        alt, dT = np.broadcast_arrays(np.asarray(alt, dtype=float),
+                                      np.asarray(dT, dtype=float))
+        _checkBounds(alt, dT)
+
+        u = (alt - minH) / self._dAlt
+        i = np.minimum(u.astype(int), len(self.alt) - 2)
+        u -= i
+        v = (dT - min_dT) / self._d_dT
+        j = np.minimum(v.astype(int), len(self.dT) - 2)
+        v -= j
+
+        #cubic hermite interpolation in dT, using the values and derivatives
+        #at j and j+1, which are contiguous in the flattened table
+        w = np.empty(alt.shape + (4,))
+        w[..., 0] = (1.0 + 2.0*v) * (1.0 - v)**2
+        w[..., 1] = v * (1.0 - v)**2 * self._d_dT
+        w[..., 2] = v**2 * (3.0 - 2.0*v)
+        w[..., 3] = v**2 * (v - 1.0) * self._d_dT
+        offset = np.arange(4)
+        flat = self.table.ravel()
+        start = (i * len(self.dT) + j) * 2
+        dH_lo = np.einsum('...k,...k->...', flat[start[..., None] + offset], w)
+        start += 2 * len(self.dT)
+        dH_hi = np.einsum('...k,...k->...', flat[start[..., None] + offset], w)
+
+        #linear interpolation in altitude
+        dH = dH_lo + u * (dH_hi - dH_lo)
+        return alt + dH
+
+    def checkError(self, n=100000, seed=0):
+        '''
+        Compares the table with the exact solution at random points.
+
+        Arguments
+        ---------
+        n : int
+            number of random points
+        seed : int
+            seed of the random number generator
+
+        Returns
+        -------
+        float
+            maximum relative error of temperature, pressure, density,
+            viscosity and speed of sound
+        '''
+        rng = np.random.RandomState(seed)
+        alt = rng.uniform(minH, maxH, n)
+        dT = rng.uniform(min_dT, max_dT, n)
+
+        Hp = solvePressureAlt(alt, dT, tol=1e-9)[0]
+        exact = _airStateArray(Hp, dT)
+        approx = self.getAirState(alt, dT)
+        return max(np.max(np.abs(x_approx / x_exact - 1.0))
+                   for x_approx, x_exact in zip(approx, exact))
+
+def _checkBounds(alt, dT):
+    '''
+    Internal helper function to check altitude and temperature offset arrays
+
+    Arguments
+    ---------
+    alt : ndarray
+        Geometric altitude [m]
+    dT : ndarray
+        Temperature offset from standard temperature [K]
+
+    Raises
+    ------
+    ValueError
+        If any value is out of bounds
+    '''
+    if np.any(alt > maxH) or np.any(alt < minH):
+        raise ValueError('Altitude Values out of Bounds')
+    if np.any(dT > max_dT) or np.any(dT < min_dT):
+        raise ValueError('Temperature Values out of Bounds')
+
+def _airStateArray(Hp, dT):
+    '''
+    Internal function to calculate the air state from the pressure altitude
+
+    Arguments
+    ---------
+    Hp : ndarray
+        pressure altitude [m]
+    dT : ndarray
+        Temperature offset from standard temperature [K]
+
+    Returns
+    -------
+    tuple
+        Tuple of ndarrays containing temperature [K], pressure [Pa],
+        density [Kg/m^3], viscosity [Ns/(m^2)] and speed of sound [m/s]
+    '''
+    index = _getIndexArray(Hp)
+
+    temp = _temperatureArray(Hp, dT, index)
+    Tisa = _temperatureArray(Hp, 0.0, index)
+    p = _pressureArray(Hp, Tisa, index)
+    dens = _density(temp, p)
+    mu = _dynamicViscosity(temp)
+    a = _speedOfSound(temp)
+
+    return temp, p, dens, mu, a
+
+def _airStateDerivativesArray(Hp, dT):
+    '''
+    Internal function to calculate the air state and its derivatives with
+    respect to altitude and temperature offset from the pressure altitude
+
+    Arguments
+    ---------
+    Hp : ndarray
+        pressure altitude [m]
+    dT : ndarray
+        Temperature offset from standard temperature [K]
+
+    Returns
+    -------
+    tuple
+        Tuple (values, d_dalt, d_ddT), see getAirStateDerivativesArray
+    '''
+    index = _getIndexArray(Hp)
+
+    temp = _temperatureArray(Hp, dT, index)
+    Tisa = _temperatureArray(Hp, 0.0, index)
+    p = _pressureArray(Hp, Tisa, index)
+    dens = _density(temp, p)
+    mu = _dynamicViscosity(temp)
+    a = _speedOfSound(temp)
+
+    #derivatives of the pressure altitude
+    L = _LiArray[index]
+    logp = np.log(p/pi[0])
+    dHp_dalt = Tisa / temp
+    dHp_ddT = R/G * logp * dHp_dalt
+
+    #logarithmic derivatives of p and T, with d(ln p)/dHp = -G/(R*T_ISA)
+    dlogp_dalt = -G / R / temp
+    dlogp_ddT = -logp / temp
+    dlogT_dalt = L * dHp_dalt / temp
+    dlogT_ddT = (1.0 + L * dHp_ddT) / temp
+
+    #mu = c*T**1.5/(T + 110.4)
+    dlogmu_dlogT = 1.5 - temp / (temp + 110.4)
+
+    def derivatives(dlogp, dlogT):
+        return (temp * dlogT, p * dlogp, dens * (dlogp - dlogT),
+                mu * dlogmu_dlogT * dlogT, 0.5 * a * dlogT)
+
+    return ((temp, p, dens, mu, a),
+            derivatives(dlogp_dalt, dlogT_dalt),
+            derivatives(dlogp_ddT, dlogT_ddT))
+
 def _getIndex(Hp):
     '''
     Internal helper function to get current layer index
@@ -120,6 +587,23 @@ def _getIndex(Hp):
     else:
         return np.where(np.array(Hi) <= Hp)[0][-1]
 
+def _getIndexArray(Hp):
+    '''
+    Internal helper function to get the layer indices of an array
+
+    Arguments
+    ---------
+    Hp : ndarray
+        pressure altitude [m]
+
+    Returns
+    -------
+    ndarray
+        layer indices
+    '''
+    idx = np.searchsorted(_HiArray, Hp, side='right') - 1
+    return np.maximum(idx, 0)
+
 def _dynamicViscosity(temp):
     ''' Dynamic Viscosity according to Sutherland's empicial coefficients. See ESDU 77022.
 
@@ -212,3 +696,55 @@ def _pressure(alt, T_ISA, idx):
     else:
         p = np.exp(-(G/R * (alt - Hi[idx]) / Ti[idx])) * pi[idx]
     return p
+
+def _temperatureArray(alt, dT, idx):
+    '''
+    Internal function to calculate air temperature for arrays of altitudes
+    and layer indices.
+
+    Arguments
+    ---------
+    alt : ndarray
+        pressure altitude [m]
+    dT : float or ndarray
+        Temperature offset from standard temperature [K]
+    idx : ndarray
+        indices of atmosphere layers
+
+    Returns
+    -------
+    ndarray
+        Temperature [K]
+    '''
+    T = _TiArray[idx] + dT + (_LiArray[idx] * (alt - _HiArray[idx]))
+    return T
+
+def _pressureArray(alt, T_ISA, idx):
+    '''
+    Internal function to calculate the pressure for arrays of altitudes
+    and layer indices.
+
+    Arguments
+    ---------
+    alt : ndarray
+        pressure altitude [m]
+    T_ISA : ndarray
+        ISA Temperature [K]
+    idx : ndarray
+        indices of atmosphere layers
+
+    Returns
+    -------
+    ndarray
+        pressure [Pa]
+    '''
+    L = _LiArray[idx]
+    gradient = L != 0
+
+    p = np.empty(np.shape(alt))
+    i = idx[gradient]
+    p[gradient] = np.power(_TiArray[i] / T_ISA[gradient],
+                           G / R / L[gradient]) * _piArray[i]
+    i = idx[~gradient]
+    p[~gradient] = np.exp(-(G/R * (alt[~gradient] - _HiArray[i]) / _TiArray[i])) * _piArray[i]
+    return p
@@ -3,26 +3,101 @@
 This module provides a function and classes for optimizing APP missions.
 
 The optimizer depends on scipy and the mission computation on APP and
-the pyAPP6 package
+the pyAPP6 package. Independent mission evaluations can be run in parallel
+in a process pool (argument *workers* of optimizeMission). Every evaluation
+writes its mission to its own scratch file, managed by workDirectory, and
+the objective values are cached by evaluationCache. The mission file is parsed
+only once per process (missionTemplate). The progress of an optimization is
+recorded by optimizationRun, and saved periodically by
+optimizationCheckpoint. For missions with several local optima,
+optimizeMissionGlobal runs local optimizations from several start points.
+optimizeMissionSurrogate spends the mission computations on the minima of a
+response surface, for missions which are expensive to compute.
+optimizeMissionPareto approximates the Pareto front of several objectives.
+sweepMission computes the missions of a design of experiments, e.g. a grid.
+resultReader reads the time histories of result variables, e.g. for
+objectives which integrate over the mission.
 
 Copyright 2016, ALR
 """
 #pylint: disable-msg=C0103
 
 from __future__ import print_function
-import copy, os
-from scipy import optimize
+import copy, os, shutil, tempfile, hashlib, json, time, csv, threading, multiprocessing, base64, warnings
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from scipy import optimize, interpolate
+from scipy.stats import qmc
 import numpy as np
 from pyAPP6 import Mission, Files
 
-Nfeval = 0
-state_list = []
+#parsed mission files of this process, see _getTemplate
+_templates = {}
 
-def optimizeMission(misfile, segParList, misObjective, tol=1e-3, method='Nelder-Mead'):
+#hashes of mission files, see _fileHash
+_hashes = {}
+
+#timed phases of a mission evaluation
+_phases = ['parse', 'patch', 'write', 'run', 'objective']
+
+#methods of scipy.optimize.minimize that use the gradient
+_gradientMethods = ['CG', 'BFGS', 'L-BFGS-B', 'TNC', 'SLSQP', 'trust-constr']
+
+#finite difference schemes of missionEvaluator.gradient
+_gradientSchemes = ['forward', 'central']
+
+#default finite difference step of the normalized parameters. Steps near the
+#machine precision are lost in the printed mission file and in the noise of
+#the mission computation.
+_defaultGradientStep = 1e-4
+
+#minimum ratio of a finite difference step to the resolution of the cache
+_minStepResolution = 1e3
+
+#methods of scipy.optimize.minimize that support bounds and constraints
+_boundedMethods = ['Nelder-Mead', 'L-BFGS-B', 'TNC', 'SLSQP', 'Powell', 'trust-constr', 'COBYLA']
+_constrainedMethods = ['COBYLA', 'SLSQP', 'trust-constr']
+
+#default (lower, upper) bounds of the normalized parameters for sampleStartPoints
+_defaultStartBounds = (0.5, 1.5)
+
+def optimizeMission(misfile, segParList, misObjective, tol=1e-3, method='Nelder-Mead',
+                    workers=1, workdir=None, cache=None, run=None, constraints=None,
+                    checkpoint=None, resume=False, gradient=None, writeOptimum=True,
+                    executor=None):
     '''
     Function to optimize the parameter of a mission. The optimized mission will
     be saved with the filename "misfile" with a "_optTmp" suffix.
 
+    The bounds of the segment parameters are passed to the methods which
+    support them (Nelder-Mead, L-BFGS-B, TNC, SLSQP, Powell, trust-constr and
+    COBYLA), and points outside of the bounds are never computed by APP:
+    their objective value is np.inf. Constraints on the mission results
+    (missionConstraint) require COBYLA, SLSQP or trust-constr.
+
+    With workers > 1, independent mission evaluations are run in parallel in
+    a process pool: the vertices of the initial simplex for Nelder-Mead and
+    the finite difference stencils for gradient based methods. The results
+    are identical to a serial run.
+
+    For gradient based methods, *gradient* selects forward or central
+    differences, which are evaluated in a batch (in parallel with
+    workers > 1). The step of each parameter is set with the *step* of its
+    segmentParameter. The base point of forward differences has already
+    been evaluated by the optimizer and is taken from the cache, so that a
+    gradient costs N evaluations (2N for central differences).
+
+    Every evaluation writes its mission to its own scratch file in *workdir*,
+    such that several optimizations of the same mission can run at the same
+    time. Only the optimum is copied to the "_optTmp" file.
+
+    Objective values are cached, such that points visited again by the
+    optimizer are not evaluated again. With a persistent cache, an
+    interrupted optimization can be restarted without evaluating the same
+    missions again. With a *checkpoint*, the evaluations and the best
+    mission are saved in a single file periodically, and the optimization
+    is continued from it with *resume*.
+
     Arguments
     ---------
     misfile : str
@@ -35,12 +110,53 @@ def optimizeMission(misfile, segParList, misObjective, tol=1e-3, method='Nelder-
         tolerance, see scipy.optimize.minimize
     method : str
         optimization method, see scipy.optimize.minimize
+    workers : int
+        number of worker processes for parallel mission evaluations
+    workdir : workDirectory
+        scratch file manager. By default, the scratch files are created next
+        to the mission file and removed after each evaluation.
+    cache : evaluationCache
+        cache of the objective values. By default, an in-memory cache is used.
+    run : optimizationRun
+        records the evaluations and iterations. By default, an
+        optimizationRun which prints every iteration is used.
+    constraints : list[missionConstraint]
+        constraints on the mission results, or None
+    checkpoint : optimizationCheckpoint or str
+        checkpoint (or path of the checkpoint file) to save the progress of
+        the optimization in, or None
+    resume : bool
+        if True and the checkpoint file exists, the optimization is continued
+        from the checkpoint
+    gradient : str
+        finite difference scheme of the gradient for gradient based methods,
+        'forward' or 'central'. If None, forward differences are used with
+        workers > 1, otherwise scipy computes the gradient.
+    writeOptimum : bool
+        if False, the optimized mission is not written
+    executor : concurrent.futures.Executor
+        executor for the mission evaluations instead of a process pool of
+        *workers* processes, e.g. of optimizeMissionAsync. The evaluations
+        are submitted in batches as with workers > 1.
 
     Returns
     -------
     OptimizeResult
         The optimization result represented as a OptimizeResult object. See the
-        documentation of scipy.optimize.minimize
+        documentation of scipy.optimize.minimize. The number of cache hits and
+        misses are added as "cacheHits" and "cacheMisses", the number of
+        points outside of the bounds as "screened", and the total time
+        of each phase of the mission evaluations [s] as "timing". The
+        optimizationRun is added as "run".
+
+    Raises
+    ------
+    ValueError
+        if constraints are given for a method which does not support them,
+        if a gradient scheme is given for a method which does not use the
+        gradient, if a finite difference step is too small for the
+        resolution of the cache, or if the checkpoint to resume from was
+        written for a different optimization
 
     Examples
     --------
@@ -54,37 +170,1743 @@ def optimizeMission(misfile, segParList, misObjective, tol=1e-3, method='Nelder-
         objective = missionObjective('Distance', resFunctionMinimizeEndValue, mode='max')
 
         res = optimizeMission(misfile=misfile, segParList=segParList, misObjective=objective)
+
+    Bound the altitudes and limit the mission time to 2 hours::
+
+        segParList = [segmentParameter(1, 8000.0, updateEndCondition, 6000.0, 12000.0),
+                      segmentParameter(9, 11000.0, updateEndCondition, 6000.0, 12000.0)]
+
+        constraint = missionConstraint('Time', resFunctionMinimizeEndValue, upper=7200.0)
+
+        res = optimizeMission(misfile, segParList, objective, method='SLSQP',
+                              constraints=[constraint])
+
+    Use central differences with steps of 50 m and 0.005 Mach on 4 workers::
+
+        segParList = [segmentParameter(1, 8000.0, updateEndCondition, step=50.0),
+                      segmentParameter(2, 0.78, updateEndCondition, step=0.005)]
+
+        res = optimizeMission(misfile, segParList, objective, method='BFGS',
+                              gradient='central', workers=4)
     '''
-    global Nfeval, state_list
+    constraints = [] if constraints is None else list(constraints)
+    if constraints and method not in _constrainedMethods:
+        raise ValueError('method %s does not support constraints, use one of %s'
+                         % (method, ', '.join(_constrainedMethods)))
+    if gradient is not None and method not in _gradientMethods:
+        raise ValueError('method %s does not use the gradient, use one of %s'
+                         % (method, ', '.join(_gradientMethods)))
+    if isinstance(checkpoint, str):
+        checkpoint = optimizationCheckpoint(checkpoint)
+    resumed = resume and checkpoint is not None and checkpoint.load()
 
-    misCmp0 = Mission.MissionComputation()
-    misCmp0.run(misfile)
-    misObjective.setNorm(misCmp0.result)
+    if resumed and misObjective.value is None:
+        #the norm of the checkpoint keeps the cache keys valid
+        misObjective.value = checkpoint.norm
+    else:
+        _setNorms(misfile, [misObjective])
+    if checkpoint is not None:
+        checkpoint.start(misfile, segParList, misObjective, constraints, method, tol)
 
     #parameter
-    Nfeval = 0
-    state_list = []
     endValueList = len(segParList)*[1.0]
 
-    res = optimize.minimize(_evaluateMis,
-                            method=method,
-                            x0=endValueList,
-                            args=(misfile, segParList, misObjective), tol=tol, callback=_myCallback)
-    if res['success']:
-        _evaluateMis(res['x'], misfile, segParList, misObjective)
-        suffix = '_optTmp'
-        filepath, ext = os.path.splitext(misfile)
-        modpath = filepath+suffix+ext
-        print('Done. Output written to', modpath)
+    ownsWorkdir = workdir is None
+    if ownsWorkdir:
+        workdir = workDirectory(misfile)
+    if run is None:
+        run = optimizationRun()
+
+    evaluator = missionEvaluator(misfile, segParList, misObjective, workers=workers,
+                                 workdir=workdir, cache=cache, run=run,
+                                 constraints=constraints, checkpoint=checkpoint,
+                                 gradient=gradient or 'forward', executor=executor)
+    if resumed:
+        print('Resuming from', checkpoint.filename, 'with',
+              checkpoint.restore(evaluator.cache), 'evaluations')
+
+    def callback(xk, *args):
+        run.iteration(xk, *args)
+        if checkpoint is not None:
+            checkpoint.iteration(xk)
+
+    try:
+        options = {}
+        jac = None
+        if gradient is not None:
+            jac = evaluator.gradient
+            evaluator.checkGradientSteps()
+        elif evaluator.parallel:
+            if method == 'Nelder-Mead':
+                options['initial_simplex'] = evaluator.initialSimplex(endValueList)
+            elif method in _gradientMethods:
+                jac = evaluator.gradient
+                evaluator.checkGradientSteps()
+        kwargs = {}
+        if method in _boundedMethods and evaluator.bounded:
+            kwargs['bounds'] = [p.bounds() for p in segParList]
+        if constraints:
+            kwargs['constraints'] = [{'type': 'ineq', 'fun': evaluator.constraintMargins}]
+
+        res = optimize.minimize(evaluator,
+                                method=method,
+                                x0=endValueList, jac=jac, options=options,
+                                tol=tol, callback=callback, **kwargs)
+        if checkpoint is not None:
+            checkpoint.save(finished=True)
+        res['run'] = run
+        res['cacheHits'] = evaluator.cache.hits
+        res['cacheMisses'] = evaluator.cache.misses
+        res['screened'] = evaluator.screened
+        res['timing'] = evaluator.timing
+        if res['success'] and writeOptimum:
+            #the optimum has been evaluated already, only write the mission
+            modpath = _saveOptimum(res['x'], misfile, segParList, workdir)
+            print('Done. Output written to', modpath)
+    except BaseException:
+        #keep the evaluations done since the last checkpoint
+        if checkpoint is not None and checkpoint.config is not None:
+            checkpoint.save()
+        raise
+    finally:
+        evaluator.close()
+        if ownsWorkdir:
+            workdir.cleanup()
+        run.close()
+    return res
+
+def optimizeMissionGlobal(misfile, segParList, misObjective, nStarts=8, bounds=None,
+                          sampling='lhs', seed=None, basinTol=0.05, tol=1e-3,
+                          method='Nelder-Mead', workers=1, workdir=None):
+    '''
+    Multi-start optimization of the parameter of a mission, for missions
+    with several local optima.
+
+    *nStarts* start points are sampled in the normalized parameter space
+    (see sampleStartPoints), and a local optimization (see
+    scipy.optimize.minimize) is run from each of them. With workers > 1, the
+    local optimizations are run in parallel in a process pool. A local
+    optimization is stopped early when an iterate comes within *basinTol* of
+    an optimum found by another one.
+
+    The distinct optima are ranked by their objective value, and the mission
+    of the k-th optimum is saved with the filename "misfile" with a
+    "_optTmp_<k>" suffix.
+
+    .. note::
+        With workers > 1, which local optimizations are stopped early
+        depends on the order in which they finish. Serial runs with the same
+        *seed* are reproducible.
+
+    Arguments
+    ---------
+    misfile : str
+        path to the APP6 .mis file
+    segParList : list[segmentParameter]
+        list of segmentParameter class instances
+    misObjective : missionObjective
+        instance of a missionObjective class
+    nStarts : int
+        number of start points
+    bounds : list
+        list of (lower, upper) bounds of the normalized parameters for the
+        start points, see sampleStartPoints. By default, the bounds of the
+        segment parameters are used where given.
+    sampling : str
+        'lhs' (Latin hypercube) or 'sobol'
+    seed : int
+        seed of the sampling
+    basinTol : float
+        maximum distance (in each normalized parameter) of two points in the
+        same basin
+    tol, method : float, str
+        see optimizeMission
+    workers : int
+        number of worker processes for parallel local optimizations
+    workdir : workDirectory
+        scratch file manager, see optimizeMission
+
+    Returns
+    -------
+    OptimizeResult
+        The parameter vector "x" and objective value "fun" of the best
+        optimum, the total number of mission evaluations "nfev", and
+
+        - "optima": the distinct optima ranked by their objective value,
+          OptimizeResult objects with "x", "fun", "path" (path of the mission
+          file) and "starts" (indices of the start points in the basin)
+        - "starts": the results of the local optimizations, OptimizeResult
+          objects with "start", "x0", "x", "fun", "success", "stopped",
+          "message", "nfev" and "nit"
+
+    Examples
+    --------
+    Search the climb schedule from 16 start points on 4 processes::
+
+        res = optimizeMissionGlobal(misfile, segParList, objective, nStarts=16,
+                                    seed=0, workers=4)
+        for opt in res['optima']:
+            print(opt['fun'], opt['path'])
+    '''
+    _setNorms(misfile, [misObjective])
+
+    if bounds is None:
+        bounds = [_startBounds(p) for p in segParList]
+    starts = sampleStartPoints(len(segParList), nStarts, bounds=bounds,
+                               sampling=sampling, seed=seed)
+    ownsWorkdir = workdir is None
+    if ownsWorkdir:
+        workdir = workDirectory(misfile)
+
+    manager = None
+    executor = None
+    try:
+        if workers > 1:
+            #the known optima are shared between the worker processes
+            manager = multiprocessing.Manager()
+            known = manager.list()
+            executor = ProcessPoolExecutor(max_workers=workers)
+            mapper = executor.map
+        else:
+            known = []
+            mapper = map
+        tasks = [(k, x0, misfile, segParList, misObjective, method, tol, workdir, known, basinTol)
+                 for k, x0 in enumerate(starts)]
+        results = list(mapper(_localSearchTask, tasks))
+
+        optima = _rankOptima(results, basinTol)
+        for rank, opt in enumerate(optima):
+            opt['path'] = _saveOptimum(opt['x'], misfile, segParList, workdir, rank)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if manager is not None:
+            manager.shutdown()
+        if ownsWorkdir:
+            workdir.cleanup()
+
+    res = optimize.OptimizeResult(optima=optima, starts=results,
+                                  nfev=sum(r['nfev'] for r in results),
+                                  success=len(optima) > 0)
+    if optima:
+        res['x'] = optima[0]['x']
+        res['fun'] = optima[0]['fun']
+        print('Done. Found', len(optima), 'optima, best written to', optima[0]['path'])
+    else:
+        res['x'] = None
+        res['fun'] = np.nan
     return res
 
+def sampleStartPoints(n, nStarts, bounds=None, sampling='lhs', seed=None):
+    '''
+    Samples start points in the normalized parameter space.
+
+    Arguments
+    ---------
+    n : int
+        number of parameters
+    nStarts : int
+        number of start points
+    bounds : list
+        list of n (lower, upper) bounds of the normalized parameters. By
+        default, each parameter is sampled between 0.5 and 1.5 times its
+        start value.
+    sampling : str
+        'lhs' (Latin hypercube) or 'sobol' (scrambled Sobol sequence)
+    seed : int
+        seed of the sampling
+
+    Returns
+    -------
+    ndarray
+        start points of shape (nStarts, n)
+
+    Raises
+    ------
+    ValueError
+        if the sampling or the bounds are invalid
+    '''
+    if bounds is None:
+        bounds = n*[_defaultStartBounds]
+    bounds = np.asarray(bounds, dtype=float)
+    if bounds.shape != (n, 2) or np.any(bounds[:, 0] > bounds[:, 1]):
+        raise ValueError('bounds must be a list of %d (lower, upper) pairs' % n)
+    if sampling == 'lhs':
+        engine = qmc.LatinHypercube(d=n, seed=seed)
+    elif sampling == 'sobol':
+        engine = qmc.Sobol(d=n, seed=seed)
+    else:
+        raise ValueError("sampling must be 'lhs' or 'sobol'")
+    return qmc.scale(engine.random(nStarts), bounds[:, 0], bounds[:, 1])
+
+def optimizeMissionSurrogate(misfile, segParList, misObjective, maxEvaluations=50,
+                             nInitial=None, model='rbf', batchSize=None, tol=1e-3,
+                             seed=None, workers=1, workdir=None, cache=None, run=None,
+                             compare=False):
+    '''
+    Surrogate assisted optimization of the parameter of a mission, for
+    missions whose computation is expensive. The optimized mission will be
+    saved with the filename "misfile" with a "_optTmp" suffix.
+
+    The missions of an initial design (the start point and a Latin
+    hypercube) are computed, and a response surface (see responseSurface) is
+    fitted to the objective values. In every iteration, the minima of the
+    response surface within a search region around the best computed
+    mission are computed by APP (infill points), and the response surface
+    is fitted again. With *batchSize* > 1, several infill points are
+    computed in parallel, the further minima of the response surface or, if
+    there are not enough, points far from all computed missions.
+
+    The search region is halved whenever an iteration does not improve the
+    objective value of the best mission by more than tol**2 (relative).
+    The optimization has converged when the search region is smaller than
+    *tol*, or when the minimum of the response surface is the best mission
+    and the other infill points do not improve it.
+
+    The parameters are searched within their bounds (see segmentParameter),
+    and between 0.5 and 1.5 times their start value where no bounds are given.
+
+    Arguments
+    ---------
+    misfile : str
+        path to the APP6 .mis file
+    segParList : list[segmentParameter]
+        list of segmentParameter class instances
+    misObjective : missionObjective
+        instance of a missionObjective class
+    maxEvaluations : int
+        maximum number of mission computations
+    nInitial : int
+        number of missions of the initial design, by default 2*N+1 for N
+        parameters
+    model : str
+        'rbf' or 'quadratic', see responseSurface
+    batchSize : int
+        number of infill points per iteration, by default *workers*
+    tol : float
+        tolerance of the normalized parameters
+    seed : int
+        seed of the initial design and the exploration points
+    workers : int
+        number of worker processes for parallel mission evaluations
+    workdir, cache, run : workDirectory, evaluationCache, optimizationRun
+        see optimizeMission
+    compare : bool
+        if True, the mission is optimized with optimizeMission (Nelder-Mead)
+        as well, to report the number of mission computations saved
+
+    Returns
+    -------
+    OptimizeResult
+        The best computed mission "x" and "fun", the number of iterations
+        "nit", the number of mission computations "nfev", "success" and
+        "message", and "run", "cacheHits", "cacheMisses" and "timing" as
+        returned by optimizeMission. With *compare*, the number of mission
+        computations of optimizeMission is added as "referenceEvaluations",
+        and the difference as "savedEvaluations".
+
+    Examples
+    --------
+    Optimize the A320 mission with at most 40 APP runs, 4 at a time::
+
+        res = optimizeMissionSurrogate(misfile, segParList, objective,
+                                       maxEvaluations=40, workers=4, seed=0)
+    '''
+    _setNorms(misfile, [misObjective])
+
+    reference = None
+    if compare:
+        reference = optimizeMission(misfile, segParList, misObjective, tol=tol,
+                                    run=optimizationRun(callbacks=[]), writeOptimum=False)
+
+    n = len(segParList)
+    bounds = np.array([_startBounds(p) for p in segParList])
+    if nInitial is None:
+        nInitial = 2*n + 1
+    if batchSize is None:
+        batchSize = workers
+    rng = np.random.RandomState(seed)
+
+    ownsWorkdir = workdir is None
+    if ownsWorkdir:
+        workdir = workDirectory(misfile)
+    if run is None:
+        run = optimizationRun()
+
+    evaluator = missionEvaluator(misfile, segParList, misObjective, workers=workers,
+                                 workdir=workdir, cache=cache, run=run)
+    try:
+        x0 = np.clip(np.ones(n), bounds[:, 0], bounds[:, 1])
+        points = [x0] + list(sampleStartPoints(n, nInitial - 1, bounds, seed=seed))
+        width = bounds[:, 1] - bounds[:, 0]
+        scale = 1.0
+        X = []
+        y = []
+        ybest = np.inf
+        modelAtBest = False
+        converged = False
+        nit = 0
+        while True:
+            X.extend(points)
+            y.extend(evaluator.evaluateBatch(points))
+            ok = np.isfinite(y)
+            if not np.any(ok):
+                break
+            ibest = int(np.argmin(np.where(ok, y, np.inf)))
+            #near a smooth minimum, a distance tol changes the objective by ~tol**2.
+            #The initial design always counts as an improvement.
+            improved = not np.isfinite(ybest) or y[ibest] < ybest - tol**2*abs(ybest)
+            xbest, ybest = X[ibest], y[ibest]
+            run.iteration(xbest)
+            nit += 1
+            if not improved:
+                scale *= 0.5
+                if modelAtBest or scale*np.max(width) < tol:
+                    converged = True
+                    break
+            if len(X) >= maxEvaluations:
+                break
+            surface = responseSurface(np.array(X)[ok], np.array(y)[ok], model)
+            region = np.column_stack([np.maximum(bounds[:, 0], xbest - scale*width),
+                                      np.minimum(bounds[:, 1], xbest + scale*width)])
+            points, xmodel = _surrogateInfill(surface, np.array(X), region, xbest,
+                                              min(batchSize, maxEvaluations - len(X)),
+                                              tol, rng)
+            modelAtBest = np.max(np.abs(xmodel - xbest)) < tol
+
+        y = np.array(y)
+        success = bool(np.any(np.isfinite(y)))
+        if success:
+            ibest = int(np.nanargmin(np.where(np.isfinite(y), y, np.nan)))
+            res = optimize.OptimizeResult(x=np.array(X[ibest]), fun=float(y[ibest]))
+        else:
+            res = optimize.OptimizeResult(x=x0, fun=np.nan)
+        if converged:
+            message = 'The infill points do not improve the best mission.'
+        elif success:
+            message = 'Maximum number of mission computations reached.'
+        else:
+            message = 'All mission computations failed.'
+        res.update(nit=nit, nfev=evaluator.cache.misses, success=success, message=message,
+                   run=run, cacheHits=evaluator.cache.hits,
+                   cacheMisses=evaluator.cache.misses, timing=evaluator.timing)
+        if reference is not None:
+            res['referenceEvaluations'] = reference['cacheMisses']
+            res['savedEvaluations'] = reference['cacheMisses'] - res['cacheMisses']
+        if success:
+            #the optimum has been evaluated already, only write the mission
+            modpath = _saveOptimum(res['x'], misfile, segParList, workdir)
+            print('Done. Output written to', modpath)
+    finally:
+        evaluator.close()
+        if ownsWorkdir:
+            workdir.cleanup()
+        run.close()
+    return res
+
+class responseSurface(object):
+    '''
+    Response surface of the objective values y at the points X, used by
+    optimizeMissionSurrogate.
+
+    Arguments
+    ---------
+    X : ndarray
+        points of shape (M, N)
+    y : ndarray
+        values of shape (M,)
+    model : str
+        'rbf': thin plate spline radial basis function interpolation with a
+        quadratic polynomial (linear for too few points), see
+        scipy.interpolate.RBFInterpolator
+
+        'quadratic': least squares quadratic polynomial
+
+    Raises
+    ------
+    ValueError
+        if the model is unknown
+    '''
+    def __init__(self, X, y, model='rbf'):
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        y = np.asarray(y, dtype=float)
+        self.model = model
+        if model == 'rbf':
+            n = X.shape[1]
+            degree = 2 if len(X) >= (n + 1)*(n + 2)//2 else 1
+            #a little smoothing keeps the system solvable for close points
+            self._rbf = interpolate.RBFInterpolator(X, y, kernel='thin_plate_spline',
+                                                    degree=degree, smoothing=1e-10)
+        elif model == 'quadratic':
+            self._coef = np.linalg.lstsq(self._quadraticTerms(X), y, rcond=None)[0]
+        else:
+            raise ValueError("model must be 'rbf' or 'quadratic'")
+
+    def __call__(self, x):
+        '''
+        Returns the value of the response surface at the point *x* of shape
+        (N,), or the values at the points *x* of shape (M, N).
+        '''
+        x = np.asarray(x, dtype=float)
+        X = np.atleast_2d(x)
+        if self.model == 'rbf':
+            values = self._rbf(X)
+        else:
+            values = self._quadraticTerms(X).dot(self._coef)
+        return values[0] if x.ndim == 1 else values
+
+    @staticmethod
+    def _quadraticTerms(X):
+        n = X.shape[1]
+        terms = [np.ones(len(X))] + [X[:, i] for i in range(n)]
+        terms += [X[:, i]*X[:, j] for i in range(n) for j in range(i, n)]
+        return np.column_stack(terms)
+
+def optimizeMissionPareto(misfile, segParList, objectives, nPoints=32, generations=5,
+                          mutation=0.1, bounds=None, sampling='lhs', seed=None, workers=1,
+                          workdir=None):
+    '''
+    Multi-objective optimization of the parameter of a mission, which
+    approximates the Pareto front of several objectives, e.g. fuel mass
+    against mission time.
+
+    All objectives are evaluated from one mission computation, and
+    objectives using the same resultReader read the result once. The first
+    batch of *nPoints* missions is sampled in the normalized parameter space
+    (see sampleStartPoints). Each
+    further generation perturbs randomly chosen points of the current
+    non-dominated set with a normal distribution, whose standard deviation
+    starts at *mutation* times the width of the bounds and is halved every
+    generation. Each batch of missions is computed in parallel with
+    workers > 1.
+
+    The mission of the k-th point of the non-dominated set is saved with the
+    filename "misfile" with a "_optTmp_<k>" suffix.
+
+    Arguments
+    ---------
+    misfile : str
+        path to the APP6 .mis file
+    segParList : list[segmentParameter]
+        list of segmentParameter class instances
+    objectives : list[missionObjective]
+        at least two instances of the missionObjective class. The norms
+        which are not set are set from the mission file.
+    nPoints : int
+        number of missions computed per generation
+    generations : int
+        number of generations after the first batch
+    mutation : float
+        initial standard deviation of the perturbations, relative to the
+        width of the bounds
+    bounds : list
+        list of (lower, upper) bounds of the normalized parameters. By
+        default, the bounds of the segment parameters are used where given,
+        see optimizeMissionGlobal.
+    sampling : str
+        'lhs' (Latin hypercube) or 'sobol', for the first batch
+    seed : int
+        seed of the sampling and of the perturbations
+    workers : int
+        number of worker processes for parallel mission computations
+    workdir : workDirectory
+        scratch file manager, see optimizeMission
+
+    Returns
+    -------
+    OptimizeResult
+        "x": the parameter vectors of the non-dominated set, sorted by the
+        first objective, "fun": their objective values (one column per
+        objective, normalized and minimized as in optimizeMission), "paths":
+        the paths of their mission files, "nfev": the number of mission
+        computations and "X", "F": all computed parameter vectors and
+        objective values
+
+    Raises
+    ------
+    ValueError
+        if less than two objectives are given
+
+    Examples
+    --------
+    Trade fuel mass against mission time on 4 processes::
+
+        objectives = [missionObjective('Fuel Mass', resFunctionMinimizeEndValue, mode='min'),
+                      missionObjective('Time', resFunctionMinimizeEndValue, mode='min')]
+        res = optimizeMissionPareto(misfile, segParList, objectives, seed=0, workers=4)
+        for f, path in zip(res['fun'], res['paths']):
+            print(f, path)
+    '''
+    objectives = list(objectives)
+    if len(objectives) < 2:
+        raise ValueError('a Pareto front requires at least two objectives')
+    _setNorms(misfile, objectives)
+
+    n = len(segParList)
+    if bounds is None:
+        bounds = [_startBounds(p) for p in segParList]
+    bounds = np.array(bounds, dtype=float)
+    width = bounds[:, 1] - bounds[:, 0]
+    rng = np.random.RandomState(seed)
+    ownsWorkdir = workdir is None
+    if ownsWorkdir:
+        workdir = workDirectory(misfile)
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    mapper = executor.map if executor is not None else map
+
+    def evaluate(points):
+        tasks = [(x, misfile, segParList, objectives, workdir) for x in points]
+        return np.array(list(mapper(_paretoTask, tasks)))
+
+    try:
+        x0 = np.clip(np.ones(n), bounds[:, 0], bounds[:, 1])
+        X = np.vstack([x0, sampleStartPoints(n, nPoints - 1, bounds, sampling, seed)])
+        F = evaluate(X)
+        for g in range(generations):
+            parents = X[paretoFront(F)]
+            if len(parents) == 0:
+                break
+            children = parents[rng.randint(len(parents), size=nPoints)]
+            children = children + rng.normal(size=children.shape) * mutation * 0.5**g * width
+            children = np.clip(children, bounds[:, 0], bounds[:, 1])
+            X = np.vstack([X, children])
+            F = np.vstack([F, evaluate(children)])
+
+        front = np.flatnonzero(paretoFront(F))
+        front = front[np.argsort(F[front, 0], kind='stable')]
+        paths = [_saveOptimum(X[k], misfile, segParList, workdir, rank)
+                 for rank, k in enumerate(front)]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if ownsWorkdir:
+            workdir.cleanup()
+
+    print('Done. Found', len(front), 'non-dominated points')
+    return optimize.OptimizeResult(x=X[front], fun=F[front], paths=paths, nfev=len(X),
+                                   X=X, F=F, success=len(front) > 0)
+
+def paretoFront(F):
+    '''
+    Returns the non-dominated points of a set of objective values, which
+    are all minimized.
+
+    A point is dominated if another point is at least as good in every
+    objective and better in one. Points with values which are not finite
+    (failed missions) are never part of the front.
+
+    Arguments
+    ---------
+    F : array_like
+        objective values of shape (N, number of objectives)
+
+    Returns
+    -------
+    ndarray
+        boolean mask of the non-dominated points, of shape (N,)
+    '''
+    F = np.asarray(F, dtype=float)
+    finite = np.all(np.isfinite(F), axis=1)
+    dominated = np.zeros(len(F), dtype=bool)
+    for i in np.flatnonzero(finite):
+        dominated |= np.all(F[i] <= F, axis=1) & np.any(F[i] < F, axis=1)
+    return finite & ~dominated
+
+def sweepMission(misfile, segParList, design, variables, func=None, names=None,
+                 filename=None, workers=1, workdir=None, saveInterval=10.0):
+    '''
+    Computes the mission for every point of a design, e.g. a grid of cruise
+    altitudes and Mach numbers, and returns the results as a table.
+
+    With workers > 1, the missions are computed in parallel in a process
+    pool. Every mission is written to its own scratch file.
+
+    With a *filename*, the table is saved as a .npy file at most every
+    *saveInterval* seconds and at the end. If the file exists, the sweep is
+    restarted: only the design points without results are computed.
+
+    Arguments
+    ---------
+    misfile : str
+        path to the APP6 .mis file
+    segParList : list[segmentParameter]
+        list of segmentParameter class instances
+    design : array_like
+        design points of shape (M, N) for N segment parameters, in the units
+        of the start values of the segment parameters, see gridDesign and
+        sampleDesign
+    variables : list[str]
+        result variables to record, e.g. ['Fuel Mass', 'Time']
+    func : function
+        function (result, variable) which returns the value of a variable,
+        by default resFunctionMinimizeEndValue
+    names : list[str]
+        field names of the segment parameters in the table, by default
+        "par0", "par1", ...
+    filename : str
+        path of the .npy file to save the table to, or None
+    workers : int
+        number of worker processes for parallel mission evaluations
+    workdir : workDirectory
+        scratch file manager. By default, the scratch files are created next
+        to the mission file and removed after each evaluation.
+    saveInterval : float
+        minimum time [s] between two saves of the table
+
+    Returns
+    -------
+    ndarray
+        structured array with one row per design point and the fields of
+        the segment parameters, the variables, "failed" (the mission or a
+        variable failed), "done" (the mission has been computed) and "time"
+        (computing time [s])
+
+    Raises
+    ------
+    ValueError
+        if the table in *filename* has been computed for a different design
+
+    Examples
+    --------
+    Fuel burn over cruise altitude and Mach number::
+
+        segParList = [segmentParameter(5, 9144.0, updateEndCondition),
+                      segmentParameter(4, 0.78, updateEndCondition)]
+        design = gridDesign(np.linspace(8000.0, 12000.0, 9), np.linspace(0.70, 0.82, 7))
+        table = sweepMission(misfile, segParList, design, ['Fuel Mass'],
+                             names=['alt', 'Mach'], filename='sweep.npy', workers=4)
+    '''
+    table = _sweepTable(segParList, design, variables, names, filename)
+    ownsWorkdir = workdir is None
+    if ownsWorkdir:
+        workdir = workDirectory(misfile)
+    tasks = _sweepTasks(misfile, segParList, table, variables, func, workdir)
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    lastSave = time.time()
+    try:
+        if executor is not None:
+            results = (future.result() for future in
+                       as_completed([executor.submit(_sweepTask, task) for task in tasks]))
+        else:
+            results = map(_sweepTask, tasks)
+        for result in results:
+            _storeSweepResult(table, variables, result)
+            if filename is not None and time.time() - lastSave >= saveInterval:
+                _saveArray(filename, table)
+                lastSave = time.time()
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        if filename is not None:
+            _saveArray(filename, table)
+        if ownsWorkdir:
+            workdir.cleanup()
+    return table
+
+def gridDesign(*values):
+    '''
+    Returns the full factorial design of the values of each parameter.
+
+    Arguments
+    ---------
+    values : array_like
+        values of each parameter
+
+    Returns
+    -------
+    ndarray
+        design points of shape (M, N), the last parameter varies fastest
+
+    Examples
+    --------
+    >>> gridDesign([1.0, 2.0], [10.0, 20.0, 30.0]).shape
+    (6, 2)
+    '''
+    grids = np.meshgrid(*[np.asarray(v, dtype=float) for v in values], indexing='ij')
+    return np.column_stack([grid.ravel() for grid in grids])
+
+def sampleDesign(segParList, n, sampling='lhs', seed=None):
+    '''
+    Returns a sampled design within the bounds of the segment parameters,
+    and between 0.5 and 1.5 times their start value where no bounds are given.
+
+    Arguments
+    ---------
+    segParList : list[segmentParameter]
+        list of segmentParameter class instances
+    n : int
+        number of design points
+    sampling : str
+        'lhs' (Latin hypercube) or 'sobol', see sampleStartPoints
+    seed : int
+        seed of the sampling
+
+    Returns
+    -------
+    ndarray
+        design points of shape (n, N), in the units of the start values
+    '''
+    bounds = [_startBounds(p) for p in segParList]
+    startValues = np.array([p.startValue for p in segParList], dtype=float)
+    return sampleStartPoints(len(segParList), n, bounds, sampling, seed)*startValues
+
+class workDirectory(object):
+    '''
+    Manager for the scratch mission files of an optimization.
+
+    Every mission evaluation gets its own uniquely named scratch file, which
+    is removed after the evaluation unless *keep* is True. The instance can
+    be passed to worker processes.
+
+    The optimize functions do not remove the scratch directory of a
+    workDirectory passed to them, such that it can be used for several
+    runs. It is removed by cleanup.
+
+    .. note::
+        By default, the scratch files are created in the directory of the
+        mission file, such that relative paths in the mission (e.g. to the
+        aircraft file) stay valid. With a different *root*, e.g. 'tmpfs' to
+        avoid disk I/O, the mission has to reference its files with absolute
+        paths.
+
+    Arguments
+    ---------
+    misfile : str
+        path to the APP6 .mis file
+    root : str
+        directory for the scratch files. If None, the directory of the
+        mission file is used. With 'tmpfs', /dev/shm is used if available.
+        Otherwise, a new subdirectory is created in *root*.
+    keep : bool
+        if True, the scratch files are kept
+
+    Examples
+    --------
+    Optimize with scratch files in memory, and keep them for inspection::
+
+        workdir = workDirectory(misfile, root='tmpfs', keep=True)
+        res = optimizeMission(misfile, segParList, objective, workdir=workdir)
+    '''
+    def __init__(self, misfile, root=None, keep=False):
+        self.misfile = misfile
+        self.keep = keep
+        filepath, self.ext = os.path.splitext(misfile)
+        self.prefix = os.path.basename(filepath)+'_optTmp_'
+        if root is None:
+            self.path = os.path.dirname(os.path.abspath(misfile))
+            self._ownsPath = False
+        else:
+            if root == 'tmpfs':
+                root = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+            self.path = tempfile.mkdtemp(prefix=self.prefix, dir=root)
+            self._ownsPath = True
+
+    def newFile(self):
+        '''
+        Creates a new, empty scratch file.
+
+        Returns
+        -------
+        str
+            path of the scratch file
+        '''
+        fd, path = tempfile.mkstemp(suffix=self.ext, prefix=self.prefix, dir=self.path)
+        os.close(fd)
+        return path
+
+    def release(self, path):
+        '''
+        Removes a scratch file, unless the files are kept.
+
+        Arguments
+        ---------
+        path : str
+            path of the scratch file
+        '''
+        if not self.keep and os.path.exists(path):
+            os.remove(path)
+
+    def optimumPath(self, rank=None):
+        '''
+        Returns the path of the optimized mission, the mission file with a
+        "_optTmp" suffix, or with a "_optTmp_<rank>" suffix for the optima of
+        optimizeMissionGlobal.
+        '''
+        filepath, ext = os.path.splitext(self.misfile)
+        if rank is None:
+            return filepath+'_optTmp'+ext
+        return filepath+'_optTmp_%d' % rank+ext
+
+    def saveOptimum(self, path, rank=None):
+        '''
+        Copies a scratch file to the path of the optimized mission.
+
+        Arguments
+        ---------
+        path : str
+            path of the scratch file
+        rank : int
+            rank of the optimum, see optimumPath
+
+        Returns
+        -------
+        str
+            path of the optimized mission
+        '''
+        modpath = self.optimumPath(rank)
+        shutil.copyfile(path, modpath)
+        return modpath
+
+    def cleanup(self):
+        '''
+        Removes the scratch directory created by this instance, unless the
+        files are kept.
+        '''
+        if self._ownsPath and not self.keep and os.path.isdir(self.path):
+            shutil.rmtree(self.path)
+
+class evaluationCache(object):
+    '''
+    Least recently used cache of objective values.
+
+    The values are keyed on the parameter vector rounded to *decimals*, the
+    segment parameters, the objective, the constraints and the hash of the
+    mission file. A value is the list of the objective value and the
+    constraint values, see missionEvaluator. If a
+    *filename* is given, all values are appended to this file as they are
+    computed, and the file is read again when a cache is created with the
+    same filename.
+
+    The functions of the segment parameters, the objective and the
+    constraints are identified by the function objects in memory. Keys which
+    are stored (with a *filename* or a checkpoint) identify them by their
+    names instead, which requires module level functions or methods of
+    instances with a stable repr, e.g. resultReader.
+
+    Arguments
+    ---------
+    maxsize : int
+        maximum number of values held in memory
+    decimals : int
+        number of decimals of the (normalized) parameter vector in the key
+    filename : str
+        path of a file to store the values in, or None
+
+    Examples
+    --------
+    Resume an interrupted optimization::
+
+        cache = evaluationCache(filename='myStudy.cache')
+        res = optimizeMission(misfile, segParList, objective, cache=cache)
+    '''
+    def __init__(self, maxsize=1024, decimals=9, filename=None):
+        self.maxsize = maxsize
+        self.decimals = decimals
+        self.filename = filename
+        self.hits = 0
+        self.misses = 0
+        self._values = OrderedDict()
+        #functions identified by their id, kept such that the id is not reused
+        self._functions = {}
+        if filename is not None and os.path.exists(filename):
+            with open(filename) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self._store(entry['key'], entry['value'])
+
+    def key(self, x, misfile, segParList, misObjective, constraints=(), stored=False):
+        '''
+        Returns the key of a parameter vector.
+
+        Arguments
+        ---------
+        x : ndarray
+            parameter vector
+        misfile : str
+            path to the APP6 .mis file
+        segParList : list[segmentParameter]
+            list of segmentParameter class instances
+        misObjective : missionObjective
+            instance of a missionObjective class, with the norm already set
+        constraints : list[missionConstraint]
+            constraints evaluated with the objective
+        stored : bool
+            True if the key is stored outside of this cache, e.g. in a
+            checkpoint. The key of a cache with a filename is always stored.
+
+        Returns
+        -------
+        str
+            key of the parameter vector
+
+        Raises
+        ------
+        ValueError
+            if a stored key is requested for a function without a stable
+            name, see _funcName
+        '''
+        if stored or self.filename is not None:
+            funcKey = _funcName
+        else:
+            funcKey = self._functionId
+        return json.dumps([np.round(np.asarray(x, dtype=float), self.decimals).tolist(),
+                           [[p.segIdx, p.startValue, funcKey(p.func)] for p in segParList],
+                           [misObjective.variable, misObjective.mode,
+                            funcKey(misObjective.func), misObjective.value],
+                           [[c.variable, funcKey(c.func)] for c in constraints],
+                           _fileHash(misfile)])
+
+    def get(self, key):
+        '''
+        Returns the value of *key*, or None if it is not in the cache.
+        '''
+        if key in self._values:
+            self.hits += 1
+            self._values.move_to_end(key)
+            return self._values[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        '''
+        Stores *value* under *key*.
+        '''
+        self._store(key, value)
+        if self.filename is not None:
+            with open(self.filename, 'a') as f:
+                f.write(json.dumps({'key': key, 'value': value})+'\n')
+
+    def _functionId(self, func):
+        self._functions.setdefault(id(func), func)
+        return id(func)
+
+    def _store(self, key, value):
+        self._values[key] = value
+        self._values.move_to_end(key)
+        while len(self._values) > self.maxsize:
+            self._values.popitem(last=False)
+
+class missionEvaluator(object):
+    '''
+    Objective function of optimizeMission, which evaluates missions either in
+    the calling process or in a process pool.
+
+    All values are stored in a cache, such that the optimizer does not
+    evaluate the same point again.
+
+    Arguments
+    ---------
+    misfile : str
+        path to the APP6 .mis file
+    segParList : list[segmentParameter]
+        list of segmentParameter class instances
+    misObjective : missionObjective
+        instance of a missionObjective class, with the norm already set
+    workers : int
+        number of worker processes. If 1, all missions are evaluated in the
+        calling process
+    workdir : workDirectory
+        scratch file manager. If None, the scratch files are created next to
+        the mission file.
+    cache : evaluationCache
+        cache of the objective values. If None, an in-memory cache is used.
+    run : optimizationRun
+        if given, every mission evaluation is recorded in it
+    constraints : list[missionConstraint]
+        constraints, which are evaluated in the same mission computation as
+        the objective
+    checkpoint : optimizationCheckpoint
+        if given, every mission evaluation is recorded in it
+    gradient : str
+        finite difference scheme of the gradient method, 'forward' or
+        'central'
+    executor : concurrent.futures.Executor
+        if given, the missions are evaluated with it instead of a process
+        pool of *workers* processes. It is not shut down by close.
+
+    Raises
+    ------
+    ValueError
+        if the gradient scheme is unknown
+
+    Attributes
+    ----------
+    timing : dict
+        total time [s] of the phases parse, patch, write, run and objective
+        of all mission evaluations
+    bounded : bool
+        True if any segment parameter has a bound
+    screened : int
+        number of points outside of the bounds, which were not evaluated
+    steps : ndarray
+        finite difference steps of the normalized parameters
+    '''
+    def __init__(self, misfile, segParList, misObjective, workers=1, workdir=None,
+                 cache=None, run=None, constraints=None, checkpoint=None,
+                 gradient='forward', executor=None):
+        if gradient not in _gradientSchemes:
+            raise ValueError('unknown gradient scheme %s, use one of %s'
+                             % (gradient, ', '.join(sorted(_gradientSchemes))))
+        self.misfile = misfile
+        self.segParList = segParList
+        self.misObjective = misObjective
+        self.constraints = [] if constraints is None else list(constraints)
+        self.workdir = workdir if workdir is not None else workDirectory(misfile)
+        self.cache = cache if cache is not None else evaluationCache()
+        self.timing = dict.fromkeys(_phases, 0.0)
+        self.run = run
+        self.checkpoint = checkpoint
+        bounds = [p.bounds() for p in segParList]
+        self.lower = np.array([-np.inf if lo is None else lo for lo, _ in bounds])
+        self.upper = np.array([np.inf if hi is None else hi for _, hi in bounds])
+        self.bounded = bool(np.any(np.isfinite(self.lower)) or np.any(np.isfinite(self.upper)))
+        self.screened = 0
+        self.scheme = gradient
+        self.steps = np.array([_defaultGradientStep if p.normalizedStep() is None
+                               else p.normalizedStep() for p in segParList])
+        self.parallel = workers > 1 or executor is not None
+        self._ownsExecutor = executor is None
+        if executor is None and self.parallel:
+            executor = ProcessPoolExecutor(max_workers=workers)
+        self._executor = executor
+
+    def __call__(self, x):
+        return self.evaluateBatch([x])[0]
+
+    def inBounds(self, x):
+        '''
+        Returns True if the parameter vector *x* is within the bounds of the
+        segment parameters.
+        '''
+        x = np.asarray(x, dtype=float)
+        return bool(np.all(x >= self.lower) and np.all(x <= self.upper))
+
+    def evaluateBatch(self, xList):
+        '''
+        Evaluates a list of parameter vectors, in parallel if a process pool
+        is available. Values in the cache are not evaluated again, and points
+        outside of the bounds are not evaluated at all (objective value
+        np.inf). The order of the results corresponds to *xList*.
+
+        Arguments
+        ---------
+        xList : list[ndarray]
+            list of parameter vectors
+
+        Returns
+        -------
+        list[float]
+            objective values
+        '''
+        return [values[0] for values in self._evaluate(xList)]
+
+    def constraintMargins(self, x):
+        '''
+        Returns the margins of all constraints at *x*, see
+        missionConstraint.margins. The mission is only computed if it is not
+        in the cache.
+
+        Arguments
+        ---------
+        x : ndarray
+            parameter vector
+
+        Returns
+        -------
+        ndarray
+            margins, positive if the constraints are satisfied
+        '''
+        values = self._evaluate([x])[0]
+        margins = []
+        for constraint, value in zip(self.constraints, values[1:]):
+            margins.extend(constraint.margins(value))
+        return np.array(margins)
+
+    def lookup(self, x):
+        '''
+        Looks up a parameter vector in the cache.
+
+        Arguments
+        ---------
+        x : ndarray
+            parameter vector
+
+        Returns
+        -------
+        tuple
+            the cache key and the list [objective, constraint values], or
+            None if the mission has to be computed. For a point outside of
+            the bounds, the key is None and the objective value np.inf.
+        '''
+        if not self.inBounds(x):
+            self.screened += 1
+            return None, [np.inf] + len(self.constraints)*[np.nan]
+        key = self.cache.key(x, self.misfile, self.segParList, self.misObjective,
+                             self.constraints, stored=self.checkpoint is not None)
+        return key, self.cache.get(key)
+
+    def taskArguments(self, x):
+        '''
+        Returns the arguments of the task computing the mission of the
+        parameter vector *x* in the calling or in a worker process.
+        '''
+        return (x, self.misfile, self.segParList, self.misObjective, self.workdir,
+                self.constraints)
+
+    def store(self, key, x, value, timing):
+        '''
+        Stores a computed mission in the cache, and records it.
+
+        Arguments
+        ---------
+        key : str
+            cache key, see lookup
+        x : ndarray
+            parameter vector
+        value : list
+            list [objective, constraint values]
+        timing : dict
+            time [s] of each phase of the evaluation
+        '''
+        self.cache.put(key, value)
+        for phase, t in timing.items():
+            self.timing[phase] += t
+        if self.run is not None:
+            self.run.recordEvaluation(x, value[0], timing)
+        if self.checkpoint is not None:
+            self.checkpoint.recordEvaluation(key, x, value)
+
+    def _evaluate(self, xList):
+        '''
+        Returns the lists [objective, constraint values] of a list of
+        parameter vectors, see evaluateBatch.
+        '''
+        keys, values = zip(*[self.lookup(x) for x in xList]) if xList else ((), ())
+
+        #evaluate every missing key once
+        todo = OrderedDict()
+        for x, key, value in zip(xList, keys, values):
+            if value is None and key not in todo:
+                todo[key] = self.taskArguments(x)
+        if self.parallel:
+            results = self._executor.map(_evaluateTask, todo.values())
+        else:
+            results = map(_evaluateTask, todo.values())
+        computed = {}
+        for (key, args), (value, timing) in zip(todo.items(), results):
+            computed[key] = value
+            self.store(key, args[0], value, timing)
+
+        return [computed[key] if value is None else value
+                for key, value in zip(keys, values)]
+
+    def initialSimplex(self, x0):
+        '''
+        Returns the default initial simplex of scipy's Nelder-Mead method,
+        after evaluating all vertices in a batch.
+
+        Arguments
+        ---------
+        x0 : list
+            start vector
+
+        Returns
+        -------
+        ndarray
+            initial simplex of shape (N+1, N)
+        '''
+        nonzdelt = 0.05
+        zdelt = 0.00025
+        x0 = np.asarray(x0, dtype=float)
+        sim = np.tile(x0, (len(x0) + 1, 1))
+        for k in range(len(x0)):
+            if sim[k+1, k] != 0:
+                sim[k+1, k] = (1 + nonzdelt)*sim[k+1, k]
+            else:
+                sim[k+1, k] = zdelt
+        #as scipy does with bounds
+        if self.bounded:
+            sim = np.clip(sim, self.lower, self.upper)
+        self.evaluateBatch(list(sim))
+        return sim
+
+    def gradient(self, x):
+        '''
+        Finite difference gradient, with all points evaluated in a batch.
+
+        The scheme (forward or central differences) and the steps of the
+        parameters are set in the constructor. The base point *x* is only
+        needed by forward differences, and is normally found in the cache,
+        because the optimizer has evaluated it already. Where a step would
+        leave the bounds, a one-sided difference into the bounds is used.
+
+        Arguments
+        ---------
+        x : ndarray
+            parameter vector
+
+        Returns
+        -------
+        ndarray
+            gradient of the objective function
+
+        Raises
+        ------
+        ValueError
+            if a step is below the resolution of the cache, see
+            checkGradientSteps
+        '''
+        self.checkGradientSteps()
+        x = np.asarray(x, dtype=float)
+        xList = []
+        stencils = []
+
+        def addPoint(xk):
+            xList.append(xk)
+            return len(xList) - 1
+
+        base = None
+        for k, h in enumerate(self.steps):
+            up = x[k] + h <= self.upper[k]
+            down = x[k] - h >= self.lower[k]
+            xp = x.copy()
+            xm = x.copy()
+            xp[k] += h
+            xm[k] -= h
+            if self.scheme == 'central' and up and down:
+                stencils.append((addPoint(xp), addPoint(xm)))
+            else:
+                if base is None:
+                    base = addPoint(x)
+                if up or not down:
+                    stencils.append((addPoint(xp), base))
+                else:
+                    stencils.append((base, addPoint(xm)))
+        values = self.evaluateBatch(xList)
+        return np.array([(values[ip] - values[im]) / (xList[ip][k] - xList[im][k])
+                         for k, (ip, im) in enumerate(stencils)])
+
+    def checkGradientSteps(self):
+        '''
+        Checks that the finite difference steps are resolved by the cache.
+        The cache keys are rounded to *decimals*, such that the value of a
+        nearby point could be returned for a stencil point, with an error of
+        the gradient of up to 10**-decimals/step.
+
+        Raises
+        ------
+        ValueError
+            if a step of the normalized parameters is smaller than 1000 times
+            10**-decimals of the cache
+        '''
+        resolution = 10.0**-self.cache.decimals
+        small = [k for k, h in enumerate(self.steps) if h < _minStepResolution*resolution]
+        if small:
+            raise ValueError('finite difference steps of the parameters %s are below %g '
+                             'times the resolution %g of the evaluation cache, increase the '
+                             'steps or the decimals of the cache'
+                             % (small, _minStepResolution, resolution))
+
+    def close(self):
+        '''
+        Shuts down the process pool, if it has been created by this instance.
+        '''
+        if self._executor is not None:
+            if self._ownsExecutor:
+                self._executor.shutdown()
+            self._executor = None
+
+class optimizationRun(object):
+    '''
+    Records the progress of an optimization.
+
+    For every mission evaluation, the parameter vector, the objective value,
+    the time of each phase and whether the mission failed (objective value
+    not finite, e.g. np.nan from resFunctionMinimizeEndValue) are recorded,
+    and optionally written to a CSV file as they come in. Every iteration of
+    the optimizer is passed to the callbacks.
+
+    Arguments
+    ---------
+    filename : str
+        path of a CSV file to write the evaluations to, or None
+    callbacks : list
+        functions called with (run, xk) after every iteration. The default is
+        [printIteration]
+    evaluationCallbacks : list
+        functions called with (run, record) after every mission evaluation
+
+    Attributes
+    ----------
+    evaluations : list[dict]
+        records of all mission evaluations with the keys index, x, objective,
+        failed and the phases parse, patch, write, run and objective (as
+        "time_<phase>")
+    iterations : list[ndarray]
+        parameter vectors of all iterations
+
+    Examples
+    --------
+    Record an optimization without printing::
+
+        run = optimizationRun('history.csv', callbacks=[])
+        res = optimizeMission(misfile, segParList, objective, run=run)
+        failed = [rec for rec in run.evaluations if rec['failed']]
+    '''
+    def __init__(self, filename=None, callbacks=None, evaluationCallbacks=None):
+        self.filename = filename
+        self.callbacks = [printIteration] if callbacks is None else list(callbacks)
+        self.evaluationCallbacks = [] if evaluationCallbacks is None else list(evaluationCallbacks)
+        self.evaluations = []
+        self.iterations = []
+        self._file = None
+        self._writer = None
+        self._lock = threading.Lock()
+
+    def recordEvaluation(self, x, value, timing):
+        '''
+        Records a mission evaluation.
+
+        Arguments
+        ---------
+        x : ndarray
+            parameter vector
+        value : float
+            objective value
+        timing : dict
+            time [s] of each phase of the evaluation
+        '''
+        with self._lock:
+            record = {'index': len(self.evaluations),
+                      'x': np.array(x, dtype=float),
+                      'objective': value,
+                      'failed': not np.isfinite(value)}
+            for phase in _phases:
+                record['time_'+phase] = timing.get(phase, 0.0)
+            self.evaluations.append(record)
+            if self.filename is not None:
+                self._writeRow(record)
+        for callback in self.evaluationCallbacks:
+            callback(self, record)
+
+    def iteration(self, xk, *args):
+        '''
+        Records an iteration, to be used as callback of the optimizer.
+
+        Arguments
+        ---------
+        xk : ndarray
+            current parameter vector
+        args :
+            further arguments of some methods (the state of trust-constr),
+            which are ignored
+        '''
+        self.iterations.append(copy.copy(xk))
+        for callback in self.callbacks:
+            callback(self, xk)
+
+    def close(self):
+        '''
+        Closes the CSV file.
+        '''
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+    def _writeRow(self, record):
+        if self._writer is None:
+            self._file = open(self.filename, 'w')
+            self._writer = csv.writer(self._file)
+            header = ['index'] + ['x%d' % i for i in range(len(record['x']))]
+            header += ['objective', 'failed'] + ['time_'+phase for phase in _phases]
+            self._writer.writerow(header)
+        row = [record['index']] + list(record['x'])
+        row += [record['objective'], int(record['failed'])]
+        row += [record['time_'+phase] for phase in _phases]
+        self._writer.writerow(row)
+        self._file.flush()
+
+def printIteration(run, xk):
+    '''
+    Callback of optimizationRun, which prints the iteration number and the
+    parameter vector
+    '''
+    print('iteration', len(run.iterations)-1, xk)
+
+class optimizationCheckpoint(object):
+    '''
+    Checkpoint of an optimization with optimizeMission, to resume it after
+    the process has been killed.
+
+    The checkpoint is a single JSON file with the configuration of the
+    optimization, all mission evaluations (cache keys and values), the
+    iterations and the best mission found so far (parameter vector and the
+    content of the mission file). It is written at most every *interval*
+    seconds after a mission evaluation or an iteration, and when the
+    optimization ends. The file is replaced atomically, such that a killed
+    process leaves either the old or the new checkpoint.
+
+    An optimization is resumed by starting it again from the beginning with
+    all evaluations of the checkpoint in the cache: the optimizer takes the
+    same steps, without computing the missions again, and continues where the
+    checkpoint was written.
+
+    Arguments
+    ---------
+    filename : str
+        path of the checkpoint file
+    interval : float
+        minimum time [s] between two checkpoints
+
+    Examples
+    --------
+    Checkpoint every 5 minutes, and resume after the process was killed::
+
+        res = optimizeMission(misfile, segParList, objective,
+                              checkpoint=optimizationCheckpoint('study.ckpt', 300.0),
+                              resume=True)
+    '''
+    version = 1
+
+    def __init__(self, filename, interval=60.0):
+        self.filename = filename
+        self.interval = interval
+        self.config = None
+        self.norm = None
+        self.evaluations = OrderedDict()
+        self.iterations = []
+        self.best = None
+        self.bestMission = None
+        self.finished = False
+        self._misfile = None
+        self._segParList = None
+        self._saved = None
+        self._lastSave = time.time()
+
+    def start(self, misfile, segParList, misObjective, constraints, method, tol):
+        '''
+        Sets the configuration of the optimization.
+
+        Raises
+        ------
+        ValueError
+            if the checkpoint has been loaded for a different configuration
+        '''
+        config = json.loads(json.dumps(
+            {'misHash': _fileHash(misfile),
+             'segParList': [[p.segIdx, p.startValue, _funcName(p.func), p.lower, p.upper]
+                            for p in segParList],
+             'objective': [misObjective.variable, misObjective.mode,
+                           _funcName(misObjective.func)],
+             'constraints': [[c.variable, _funcName(c.func), c.lower, c.upper]
+                             for c in constraints],
+             'method': method, 'tol': tol}))
+        if self.config is not None and self.config != config:
+            raise ValueError('checkpoint %s was written for a different optimization'
+                             % self.filename)
+        self.config = config
+        self.norm = misObjective.value
+        self._misfile = misfile
+        self._segParList = segParList
+
+    def load(self):
+        '''
+        Loads the checkpoint file, if it exists.
+
+        Returns
+        -------
+        bool
+            True if the checkpoint file has been loaded
+
+        Raises
+        ------
+        ValueError
+            if the file has an unknown format version
+        '''
+        if not os.path.exists(self.filename):
+            return False
+        with open(self.filename) as f:
+            state = json.load(f)
+        if state.get('version') != self.version:
+            raise ValueError('%s has an unknown format version %s'
+                             % (self.filename, state.get('version')))
+        self.config = state['config']
+        self.norm = state['norm']
+        self.evaluations = OrderedDict((entry['key'], entry['value'])
+                                       for entry in state['evaluations'])
+        self.iterations = [np.array(xk) for xk in state['iterations']]
+        self.best = state['best']
+        if state['bestMission'] is not None:
+            self.bestMission = base64.b64decode(state['bestMission'])
+        self.finished = state['finished']
+        self._saved = self.best
+        return True
+
+    def restore(self, cache):
+        '''
+        Puts all evaluations of the checkpoint into *cache*. The size of the
+        cache is increased if necessary.
+
+        Returns
+        -------
+        int
+            number of evaluations
+        '''
+        cache.maxsize = max(cache.maxsize, len(self.evaluations) + 1)
+        for key, value in self.evaluations.items():
+            cache.put(key, value)
+        #replayed iterations are recorded again
+        self.iterations = []
+        return len(self.evaluations)
+
+    def recordEvaluation(self, key, x, value):
+        '''
+        Records a mission evaluation, see missionEvaluator.
+        '''
+        self.evaluations[key] = value
+        if np.isfinite(value[0]) and (self.best is None or value[0] < self.best['objective']):
+            self.best = {'x': np.asarray(x, dtype=float).tolist(), 'objective': value[0]}
+        self.update()
+
+    def iteration(self, xk):
+        '''
+        Records an iteration.
+        '''
+        self.iterations.append(np.array(xk, dtype=float))
+        self.update()
+
+    def update(self):
+        '''
+        Saves the checkpoint, if the last one is older than the interval.
+        '''
+        if time.time() - self._lastSave >= self.interval:
+            self.save()
+
+    def save(self, finished=False):
+        '''
+        Writes the checkpoint file atomically.
+
+        Arguments
+        ---------
+        finished : bool
+            True if the optimization has ended
+        '''
+        self.finished = finished
+        if self.best is not None and self.best is not self._saved:
+            self.bestMission = self._missionContent(self.best['x'])
+            self._saved = self.best
+        state = {'version': self.version,
+                 'config': self.config,
+                 'norm': self.norm,
+                 'evaluations': [{'key': key, 'value': value}
+                                 for key, value in self.evaluations.items()],
+                 'iterations': [xk.tolist() for xk in self.iterations],
+                 'best': self.best,
+                 'bestMission': (None if self.bestMission is None else
+                                 base64.b64encode(self.bestMission).decode('ascii')),
+                 'finished': finished}
+        path = os.path.dirname(os.path.abspath(self.filename))
+        fd, tmpname = tempfile.mkstemp(prefix='.ckpt_', dir=path)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmpname, self.filename)
+        except BaseException:
+            os.remove(tmpname)
+            raise
+        self._lastSave = time.time()
+
+    def writeBestMission(self, path):
+        '''
+        Writes the best mission of the checkpoint to *path*.
+
+        Raises
+        ------
+        ValueError
+            if the checkpoint has no mission
+        '''
+        if self.bestMission is None:
+            raise ValueError('checkpoint %s has no mission' % self.filename)
+        with open(path, 'wb') as f:
+            f.write(self.bestMission)
+
+    def _missionContent(self, x):
+        _, ext = os.path.splitext(self._misfile)
+        path = os.path.dirname(os.path.abspath(self.filename))
+        fd, path = tempfile.mkstemp(suffix=ext, dir=path)
+        os.close(fd)
+        try:
+            _writeMis(np.array(x), self._misfile, self._segParList, path)
+            with open(path, 'rb') as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
 class segmentParameter(object):
-    def __init__(self, idx, value, func):
+    '''
+    Parameter of a mission segment, which is optimized.
+
+    The optimizer works on the normalized parameter x, the value of the
+    segment parameter is x*value.
+
+    Arguments
+    ---------
+    idx : int
+        index of the segment
+    value : float
+        start value of the parameter
+    func : function
+        function (seg, value) which sets the parameter of the segment, e.g.
+        updateEndCondition
+    lower : float
+        lower bound of the parameter (in the units of *value*), or None
+    upper : float
+        upper bound of the parameter (in the units of *value*), or None
+    step : float
+        finite difference step of the gradient (in the units of *value*), or
+        None for the default step of 1e-4 times the start value
+
+    Raises
+    ------
+    ValueError
+        if lower > upper, if bounds or a step are given for a start value
+        of 0, or if the step is not positive
+    '''
+    def __init__(self, idx, value, func, lower=None, upper=None, step=None):
         self.startValue = value
         self.segIdx = idx
         self.func = func
+        self.lower = lower
+        self.upper = upper
+        if lower is not None and upper is not None and lower > upper:
+            raise ValueError('lower bound %g is greater than upper bound %g' % (lower, upper))
+        if (lower is not None or upper is not None) and value == 0:
+            raise ValueError('bounds require a start value other than 0')
+        self.step = step
+        if step is not None and (step <= 0 or value == 0):
+            raise ValueError('the step must be positive, with a start value other than 0')
     def __call__(self, seg, x):
         return self.func(seg, x*self.startValue)
+    def bounds(self):
+        '''
+        Returns the bounds (lower, upper) of the normalized parameter, None
+        if unbounded. For a negative start value, the bounds are swapped.
+        '''
+        lower = None if self.lower is None else self.lower/float(self.startValue)
+        upper = None if self.upper is None else self.upper/float(self.startValue)
+        if self.startValue < 0:
+            lower, upper = upper, lower
+        return lower, upper
+    def normalizedStep(self):
+        '''
+        Returns the finite difference step of the normalized parameter, None
+        if no step is set.
+        '''
+        return None if self.step is None else self.step/abs(float(self.startValue))
 
 def updateEndCondition(seg, x):
     '''
@@ -107,59 +1929,664 @@ class missionObjective(object):
         self.variable = variable
         self.mode = mode
     def __call__(self, result):
+        return self.normalize(self.func(result, self.variable))
+    def normalize(self, value):
+        '''
+        Returns the normalized objective value of a value of the variable,
+        which is minimized.
+        '''
         if self.mode == 'max':
-            return self.value/self.func(result, self.variable)
+            return self.value/value
         else:
-            return self.func(result, self.variable)/self.value
+            return value/self.value
     def setNorm(self, result):
         if self.value is None:
             self.value = self.func(result, self.variable)
 
+class missionConstraint(object):
+    '''
+    Constraint on a result of the mission, e.g. a minimum reserve fuel or a
+    maximum mission time. It is evaluated in the same mission computation as
+    the objective.
+
+    Arguments
+    ---------
+    variable : str
+        name of the result variable
+    func : function
+        function (result, variable) which returns the constrained value,
+        e.g. resFunctionMinimizeEndValue
+    lower : float
+        minimum value, or None
+    upper : float
+        maximum value, or None
+
+    Examples
+    --------
+    Limit the mission time to 2 hours::
+
+        constraint = missionConstraint('Time', resFunctionMinimizeEndValue, upper=7200.0)
+        res = optimizeMission(misfile, segParList, objective, method='SLSQP',
+                              constraints=[constraint])
+    '''
+    def __init__(self, variable, func, lower=None, upper=None):
+        if lower is None and upper is None:
+            raise ValueError('a constraint requires a lower or an upper bound')
+        self.variable = variable
+        self.func = func
+        self.lower = lower
+        self.upper = upper
+    def __call__(self, result):
+        return self.func(result, self.variable)
+    def margins(self, value):
+        '''
+        Returns the margins of *value* to the bounds, relative to the bounds
+        (if not 0). The margins are positive if the constraint is satisfied.
+        A failed mission (*value* not finite) violates the constraint with
+        a margin of -1.
+        '''
+        margins = []
+        if self.lower is not None:
+            margins.append((value - self.lower)/(abs(self.lower) or 1.0))
+        if self.upper is not None:
+            margins.append((self.upper - value)/(abs(self.upper) or 1.0))
+        return [m if np.isfinite(m) else -1.0 for m in margins]
+
 def resFunctionMinimizeEndValue(misResult, variable):
     '''
     Objective function "mission end value"
 
-    To be used as func in missionObjective
+    To be used as func in missionObjective. The variable index is resolved
+    for every result. If the value cannot be read, e.g. from a failed
+    mission, a resultWarning with the reason is issued and np.nan is
+    returned.
+
+    To resolve the indices once per study, and to read a result once for the
+    objective and the constraints, use the endValue method of one
+    resultReader of the study instead.
+    '''
+    return resultReader(segments=[-1]).endValue(misResult, variable)
+
+def resFunctionEndValues(misResult, variables):
+    '''
+    End values of several variables, see resFunctionMinimizeEndValue.
     '''
     try:
-        idx_dst = misResult.getVariableIndex(variable)
-        seg = misResult.getSegmentList()[-1]
-        retVal = seg.getData()[-1, idx_dst]
-    except:
-        return np.nan
-    return retVal
-    
-def _myCallback(xk):
-    '''Helper function for optimizeMission. Don't call directely.
-    '''
-    global Nfeval
-    global state_list
-    state_list.append(copy.copy(xk))
-    print('iteration', Nfeval, xk)
-    Nfeval += 1
-
-def _evaluateMis(x, mispath, segParList, misObjective):
+        return list(resultReader(segments=[-1]).endValues(misResult, variables))
+    except resultError as e:
+        warnings.warn(str(e), resultWarning, stacklevel=2)
+        return len(variables)*[np.nan]
+
+class resultError(Exception):
+    '''
+    Raised by resultReader if a mission result cannot be read, with the
+    reason as message.
+    '''
+
+class resultWarning(UserWarning):
+    '''
+    Issued by the objective functions instead of raising resultError, before
+    they return np.nan.
+    '''
+
+class resultReader(object):
+    '''
+    Reads the time histories of variables from mission results.
+
+    The variable indices are resolved once and reused for all further
+    results, i.e. they are assumed to be the same for all results of the
+    study. Use one reader per study. Only the selected segments are read,
+    and only the requested columns are copied. The time histories of the
+    segments are stacked into one array. The segments of the last result are
+    kept, such that several objectives and constraints using the same reader
+    read a result only once.
+
+    The methods endValue and integral have the signature (misResult,
+    variable) of the functions of missionObjective and missionConstraint.
+    They issue a resultWarning and return np.nan if the result cannot be
+    read, whereas history and endValues raise a resultError.
+
+    A reader is passed to the worker processes with the objective and the
+    constraints, together with the indices resolved so far, e.g. from the
+    mission file computed by the optimize functions. Its repr identifies it
+    in the stored keys of evaluationCache.
+
+    Arguments
+    ---------
+    variables : list[str]
+        names of the result variables of history and endValues, if not given
+        to them
+    segments : list[int]
+        indices of the result segments (negative indices count from the
+        last segment), or None for all segments
+
+    Examples
+    --------
+    Minimize the time integral of the altitude, with a constraint on the
+    fuel mass, reading each result once::
+
+        reader = resultReader(segments=[2, 3, 4])
+        objective = missionObjective('Altitude', reader.integral, mode='min')
+        constraint = missionConstraint('Fuel Mass', reader.endValue, upper=5000.0)
+    '''
+    def __init__(self, variables=None, segments=None):
+        self.variables = None if variables is None else list(variables)
+        self.segments = None if segments is None else list(segments)
+        self._indices = {}
+        self._lastResult = None
+        self._lastData = None
+
+    def __repr__(self):
+        return 'resultReader(%r, segments=%r)' % (self.variables, self.segments)
+
+    def __getstate__(self):
+        #the last result is not sent to worker processes
+        state = self.__dict__.copy()
+        state['_lastResult'] = None
+        state['_lastData'] = None
+        return state
+
+    def index(self, misResult, variable):
+        '''
+        Returns the column index of a variable, which is resolved only for
+        the first result.
+
+        Raises
+        ------
+        resultError
+            if the variable is not in the result
+        '''
+        if variable not in self._indices:
+            try:
+                self._indices[variable] = int(misResult.getVariableIndex(variable))
+            except (ValueError, KeyError, IndexError, TypeError):
+                raise resultError('unknown result variable %r' % variable)
+        return self._indices[variable]
+
+    def history(self, misResult, variables=None):
+        '''
+        Returns the time histories of the variables in the selected
+        segments, stacked into an array of shape (time steps, variables).
+
+        Raises
+        ------
+        resultError
+            if the result has no segments (e.g. a failed mission), if a
+            selected segment does not exist or has no data, or if a variable
+            is not in the result
+        '''
+        return np.vstack([data[:, cols] for data, cols in
+                          self._columns(misResult, variables)])
+
+    def endValues(self, misResult, variables=None):
+        '''
+        Returns the values of the variables at the end of the last selected
+        segment.
+
+        Raises
+        ------
+        resultError
+            see history
+        '''
+        data, cols = self._columns(misResult, variables)[-1]
+        return data[-1, cols]
+
+    def endValue(self, misResult, variable):
+        '''
+        Returns the value of a variable at the end of the last selected
+        segment, or np.nan with a resultWarning.
+        '''
+        try:
+            return self.endValues(misResult, [variable])[0]
+        except resultError as e:
+            warnings.warn(str(e), resultWarning, stacklevel=2)
+            return np.nan
+
+    def integral(self, misResult, variable, timeVariable='Time'):
+        '''
+        Returns the integral of a variable over the time (trapezoidal rule)
+        in the selected segments, or np.nan with a resultWarning.
+        '''
+        try:
+            history = self.history(misResult, [timeVariable, variable])
+        except resultError as e:
+            warnings.warn(str(e), resultWarning, stacklevel=2)
+            return np.nan
+        t, y = history[:, 0], history[:, 1]
+        return float(np.sum(0.5 * (y[1:] + y[:-1]) * np.diff(t)))
+
+    def _columns(self, misResult, variables):
+        '''
+        Returns the list of (segment data, column indices) of the selected
+        segments, see history.
+        '''
+        if variables is None:
+            if self.variables is None:
+                raise ValueError('no variables given to the resultReader')
+            variables = self.variables
+        data = self._segmentData(misResult)
+        cols = np.array([self.index(misResult, variable) for variable in variables],
+                        dtype=int)
+        if len(cols) and np.max(cols) >= data[0].shape[1]:
+            raise resultError('mission result has %d variables, index %d requested'
+                              % (data[0].shape[1], np.max(cols)))
+        return [(d, cols) for d in data]
+
+    def _segmentData(self, misResult):
+        '''
+        Returns the data of the selected segments, read once per result.
+        '''
+        if misResult is not None and misResult is self._lastResult:
+            return self._lastData
+        if misResult is None:
+            raise resultError('no mission result')
+        segList = misResult.getSegmentList()
+        if len(segList) == 0:
+            raise resultError('mission result has no segments, the computation failed')
+        if self.segments is None:
+            selected = segList
+        else:
+            try:
+                selected = [segList[i] for i in self.segments]
+            except IndexError:
+                raise resultError('mission result has %d segments, requested %s'
+                                  % (len(segList), self.segments))
+        data = []
+        for seg in selected:
+            d = np.asarray(seg.getData(), dtype=float)
+            if d.ndim != 2 or len(d) == 0:
+                raise resultError('mission result segment has no data')
+            data.append(d)
+        self._lastResult = misResult
+        self._lastData = data
+        return data
+
+def _funcName(func):
+    '''Helper function for evaluationCache and optimizationCheckpoint.
+    Returns the full name of a function, which is the same in every process.
+    Methods are identified by the repr of their instance, e.g. of a
+    resultReader.
+
+    Raises ValueError for lambdas, local functions, functools.partial and
+    methods of instances whose repr contains their address.
+    '''
+    name = getattr(func, '__qualname__', None)
+    if name is None or '<lambda>' in name or '<locals>' in name:
+        raise ValueError('%r has no stable name, a cache file or a checkpoint requires '
+                         'module level functions' % (func,))
+    name = getattr(func, '__module__', '')+'.'+name
+    if hasattr(func, '__self__') and not isinstance(func.__self__, type):
+        instance = repr(func.__self__)
+        if ' at 0x' in instance:
+            raise ValueError('%s of %s has no stable name, a cache file or a checkpoint '
+                             'requires a repr of the instance without its address'
+                             % (name, instance))
+        name += '[%s]' % instance
+    return name
+
+def _fileHash(path):
+    '''Helper function for evaluationCache. Returns the SHA-1 hash of a file.
+
+    The hash is only computed again if the size or modification time of the
+    file changed.
+    '''
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _hashes:
+        with open(path, 'rb') as f:
+            _hashes[key] = hashlib.sha1(f.read()).hexdigest()
+    return _hashes[key]
+
+class missionTemplate(object):
+    '''
+    Parsed mission file, which is patched in place for every evaluation.
+
+    Only the fields whose value changed since the last evaluation are
+    updated. This requires the functions of the segment parameters to set a
+    field to a value (as updateEndCondition and updateClimbAngle do), and all
+    evaluations with one template to use the same segment parameters, see
+    _getTemplate.
+
+    Arguments
+    ---------
+    mispath : str
+        path to the APP6 .mis file
+    '''
+    def __init__(self, mispath):
+        self.misFile = Files.MissionComputationFile.fromFile(mispath)
+        self.segList = self.misFile.getSegmentList()
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def write(self, x, segParList, modpath, timing=None):
+        '''
+        Writes the mission with the parameter vector *x* to *modpath*.
+
+        Arguments
+        ---------
+        x : ndarray
+            parameter vector
+        segParList : list[segmentParameter]
+            list of segmentParameter class instances
+        modpath : str
+            path of the mission file to write
+        timing : dict
+            if given, the time of the phases patch and write are stored in it
+        '''
+        with self._lock:
+            t0 = time.time()
+            #loop through all segments and update changed parameter
+            for k, (p, xval) in enumerate(zip(segParList, x)):
+                if self._values.get(k) != xval:
+                    seg = self.segList[p.segIdx]
+                    p(seg, xval) #updates segment
+                    self._values[k] = xval
+            t1 = time.time()
+
+            #save modified mission file
+            self.misFile.saveToFile(modpath, overwrite=True)
+            t2 = time.time()
+
+        if timing is not None:
+            timing['patch'] = t1 - t0
+            timing['write'] = t2 - t1
+
+def _getTemplate(mispath, segParList, timing=None):
+    '''Helper function for optimizeMission. Returns the missionTemplate of
+    this process for a mission file and segment parameters, which is created
+    if necessary. The functions of the segment parameters are identified by
+    the function objects.
+    '''
+    key = (_fileHash(mispath), tuple((p.segIdx, p.startValue, p.func) for p in segParList))
+    t0 = time.time()
+    if key not in _templates:
+        _templates[key] = missionTemplate(mispath)
+    if timing is not None:
+        timing['parse'] = time.time() - t0
+    return _templates[key]
+
+def _writeMis(x, mispath, segParList, modpath, timing=None):
     '''Helper function for optimizeMission.  Don't call directely.
+
+    Writes the mission with the parameter vector *x* to *modpath*.
     '''
-    #read mission file
-    suffix = '_optTmp'
-    filepath, ext = os.path.splitext(mispath)
-    modpath = filepath+suffix+ext
-    misFile = Files.MissionComputationFile.fromFile(mispath)
-    segList = misFile.getSegmentList()
+    template = _getTemplate(mispath, segParList, timing)
+    template.write(x, segParList, modpath, timing)
 
-    #loop through all segments and update parameter
-    for p, xval in zip(segParList, x):
-        seg = segList[p.segIdx]
-        p(seg, xval) #updates segment
+def _setNorms(misfile, objectives):
+    '''Helper function for the optimize functions.  Don't call directely.
 
-    #save modified mission file
-    misFile.saveToFile(modpath, overwrite=True)
+    Computes the mission file once and sets the norms of the *objectives*
+    which are not set. The mission is not computed if all norms are set.
+    '''
+    if all(obj.value is not None for obj in objectives):
+        return
+    misCmp0 = Mission.MissionComputation()
+    misCmp0.run(misfile)
+    for obj in objectives:
+        obj.setNorm(misCmp0.result)
+
+def _saveOptimum(x, mispath, segParList, workdir, rank=None):
+    '''Helper function for the optimize functions.  Don't call directely.
+
+    Writes the mission with the parameter vector *x*, which has been computed
+    already, to the path of the optimum *rank* of *workdir* and returns the
+    path.
+    '''
+    scratch = workdir.newFile()
+    try:
+        _writeMis(x, mispath, segParList, scratch)
+        return workdir.saveOptimum(scratch, rank)
+    finally:
+        workdir.release(scratch)
+
+def _runMis(x, mispath, segParList, modpath, timing=None):
+    '''Helper function for optimizeMission.  Don't call directely.
+
+    Writes the mission with the parameter vector *x* to *modpath*, runs it
+    and returns the result.
+    '''
+    _writeMis(x, mispath, segParList, modpath, timing)
 
     #run modified mission file
+    t0 = time.time()
     misCmp = Mission.MissionComputation()
     misCmp.run(modpath)
+    if timing is not None:
+        timing['run'] = time.time() - t0
+    return misCmp.result
+
+def _evaluateTask(args):
+    '''Helper function for missionEvaluator, executed in the calling or in
+    a worker process. Don't call directely.
+
+    Every evaluation writes its mission to its own scratch file. Returns
+    the list [objective value, constraint values] and the time of each phase.
+    '''
+    x, mispath, segParList, misObjective, workdir, constraints = args
+    modpath = workdir.newFile()
+    timing = {}
+    try:
+        result = _runMis(x, mispath, segParList, modpath, timing)
+        t0 = time.time()
+        value = [float(misObjective(result))]
+        value += [float(constraint(result)) for constraint in constraints]
+        timing['objective'] = time.time() - t0
+    finally:
+        workdir.release(modpath)
+    return value, timing
+
+def _objectiveValues(result, objectives):
+    '''Helper function for optimizeMissionPareto. Returns the values of the
+    objective variables (not normalized) of a mission result. Objectives
+    using the same resultReader read the result once.
+    '''
+    return [o.func(result, o.variable) for o in objectives]
+
+def _paretoTask(args):
+    '''Helper function for optimizeMissionPareto, executed in the calling or
+    in a worker process. Don't call directely.
+
+    Computes the mission once and returns the normalized values of all
+    objectives.
+    '''
+    x, mispath, segParList, objectives, workdir = args
+    modpath = workdir.newFile()
+    try:
+        result = _runMis(x, mispath, segParList, modpath)
+        values = _objectiveValues(result, objectives)
+    finally:
+        workdir.release(modpath)
+    return [float(obj.normalize(value)) for obj, value in zip(objectives, values)]
+
+class _knownBasin(Exception):
+    '''Raised by the callback of _localSearchTask to stop a local
+    optimization in the basin of a known optimum.
+    '''
+
+def _localSearchTask(args):
+    '''Helper function for optimizeMissionGlobal, executed in the calling or
+    in a worker process. Don't call directely.
 
-    #compute objective function and return result
-    retVal = misObjective(misCmp.result)
-    return retVal
+    Runs a local optimization, which is stopped if an iterate comes within
+    basinTol of a known optimum. Successful optimizations add their optimum
+    to the known optima.
+    '''
+    k, x0, misfile, segParList, misObjective, method, tol, workdir, known, basinTol = args
+
+    def checkBasin(run, xk):
+        for xopt in list(known):
+            if np.max(np.abs(np.asarray(xk) - xopt)) < basinTol:
+                raise _knownBasin()
+
+    run = optimizationRun(callbacks=[checkBasin])
+    evaluator = missionEvaluator(misfile, segParList, misObjective, workdir=workdir, run=run)
+    kwargs = {}
+    if method in _boundedMethods and evaluator.bounded:
+        kwargs['bounds'] = [p.bounds() for p in segParList]
+    res = optimize.OptimizeResult(start=k, x0=np.array(x0), stopped=False)
+    try:
+        opt = optimize.minimize(evaluator, x0=x0, method=method, tol=tol,
+                                callback=run.iteration, **kwargs)
+        res.update(x=np.asarray(opt['x']), fun=float(opt['fun']),
+                   success=bool(opt['success']), message=opt['message'])
+    except _knownBasin:
+        #the iterate has been evaluated already
+        x = np.asarray(run.iterations[-1])
+        res.update(x=x, fun=float(evaluator(x)), success=False, stopped=True,
+                   message='Stopped in the basin of a known optimum.')
+    finally:
+        evaluator.close()
+    res.update(nfev=len(run.evaluations), nit=len(run.iterations))
+    if res['success'] and np.isfinite(res['fun']):
+        known.append(res['x'])
+    return res
+
+def _startBounds(segPar):
+    '''Helper function for optimizeMissionGlobal. Returns the bounds of the
+    start points of a segment parameter, its bounds where given and
+    _defaultStartBounds otherwise.
+    '''
+    lower, upper = segPar.bounds()
+    if lower is None:
+        lower = _defaultStartBounds[0] if upper is None else min(_defaultStartBounds[0], upper)
+    if upper is None:
+        upper = max(_defaultStartBounds[1], lower)
+    return lower, upper
+
+def _rankOptima(results, basinTol):
+    '''Helper function for optimizeMissionGlobal. Merges the optima of the
+    local optimizations within basinTol of each other, and ranks them by
+    their objective value.
+    '''
+    optima = []
+    converged = [r for r in results if r['success'] and np.isfinite(r['fun'])]
+    for r in sorted(converged, key=lambda r: r['fun']):
+        for opt in optima:
+            if np.max(np.abs(r['x'] - opt['x'])) < basinTol:
+                opt['starts'].append(r['start'])
+                break
+        else:
+            optima.append(optimize.OptimizeResult(x=r['x'], fun=r['fun'], starts=[r['start']]))
+    #assign the stopped optimizations to the closest optimum
+    for r in results:
+        if r['stopped'] and optima:
+            dist = [np.max(np.abs(r['x'] - opt['x'])) for opt in optima]
+            optima[int(np.argmin(dist))]['starts'].append(r['start'])
+    for opt in optima:
+        opt['starts'].sort()
+    return optima
+
+def _surrogateInfill(surface, X, bounds, xbest, batchSize, tol, rng):
+    '''Helper function for optimizeMissionSurrogate. Returns the infill
+    points of the next iteration within bounds, and the minimum of the
+    response surface.
+
+    The response surface is minimized from the best point and from random
+    points. The infill points are the minima which are further than tol from
+    all computed points, completed with random points far from all computed
+    points, e.g. if the minimum of the response surface is the best point.
+    '''
+    n = len(bounds)
+    starts = np.vstack([xbest, rng.uniform(bounds[:, 0], bounds[:, 1], (2*batchSize + 2, n))])
+    minima = []
+    for start in starts:
+        opt = optimize.minimize(surface, start, method='L-BFGS-B', bounds=bounds)
+        minima.append((float(opt['fun']), opt['x']))
+    minima.sort(key=lambda m: m[0])
+
+    def distance(x, points):
+        return np.min(np.max(np.abs(np.asarray(points) - x), axis=1))
+
+    points = []
+    for _, x in minima:
+        if len(points) == batchSize:
+            break
+        if distance(x, list(X) + points) >= tol:
+            points.append(x)
+    while len(points) < batchSize:
+        #exploration point, the farthest of random points
+        candidates = rng.uniform(bounds[:, 0], bounds[:, 1], (100, n))
+        dist = [distance(x, list(X) + points) for x in candidates]
+        points.append(candidates[int(np.argmax(dist))])
+    return points, minima[0][1]
+
+def _sweepTable(segParList, design, variables, names=None, filename=None):
+    '''Helper function for sweepMission. Returns the table of a sweep, which
+    is loaded from filename if it exists.
+    '''
+    if names is None:
+        names = ['par%d' % i for i in range(len(segParList))]
+    design = np.atleast_2d(np.asarray(design, dtype=float))
+    if design.shape[1] != len(segParList) or len(names) != len(segParList):
+        raise ValueError('design and names must have one column per segment parameter')
+
+    dtype = ([(name, float) for name in names] + [(var, float) for var in variables] +
+             [('failed', bool), ('done', bool), ('time', float)])
+    if filename is not None and os.path.exists(filename):
+        table = np.load(filename)
+        if (table.dtype != np.dtype(dtype) or len(table) != len(design) or
+                not all(np.array_equal(table[name], design[:, i])
+                        for i, name in enumerate(names))):
+            raise ValueError('%s has been computed for a different design' % filename)
+        return table
+    table = np.zeros(len(design), dtype=dtype)
+    for i, name in enumerate(names):
+        table[name] = design[:, i]
+    for var in variables:
+        table[var] = np.nan
+    return table
+
+def _sweepTasks(misfile, segParList, table, variables, func, workdir):
+    '''Helper function for sweepMission. Returns the arguments of _sweepTask
+    for the design points which are not done.
+    '''
+    if func is None:
+        func = resFunctionMinimizeEndValue
+    startValues = np.array([p.startValue for p in segParList], dtype=float)
+    design = np.column_stack([table[name] for name in table.dtype.names[:len(segParList)]])
+    return [(i, design[i]/startValues, misfile, segParList, variables, func, workdir)
+            for i in np.flatnonzero(~table['done'])]
+
+def _storeSweepResult(table, variables, result):
+    '''Helper function for sweepMission. Stores a result of _sweepTask in the
+    table.
+    '''
+    i, values, duration = result
+    for var, value in zip(variables, values):
+        table[var][i] = value
+    table['failed'][i] = not np.all(np.isfinite(values))
+    table['done'][i] = True
+    table['time'][i] = duration
+
+def _sweepTask(args):
+    '''Helper function for sweepMission, executed in the calling or in a
+    worker process. Don't call directely.
+
+    Computes the mission of a design point in its own scratch file. Returns
+    the index of the design point, the values of the variables and the
+    computing time.
+    '''
+    i, x, mispath, segParList, variables, func, workdir = args
+    modpath = workdir.newFile()
+    t0 = time.time()
+    try:
+        result = _runMis(x, mispath, segParList, modpath)
+        values = [float(func(result, var)) for var in variables]
+    finally:
+        workdir.release(modpath)
+    return i, values, time.time() - t0
+
+def _saveArray(filename, array):
+    '''Helper function for sweepMission. Saves an array as .npy file,
+    replacing the file atomically.
+    '''
+    path = os.path.dirname(os.path.abspath(filename))
+    fd, tmpname = tempfile.mkstemp(suffix='.npy', dir=path)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmpname, filename)
+    except BaseException:
+        os.remove(tmpname)
+        raise
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Stand-in for the mission file and mission computation of pyAPP6, to test
+MissionOptimization and AsyncMission without APP.
+
+A mission file is a JSON list with the end values and climb angles of the
+segments. The computed mission has a single result segment with the
+variables in *variables*, which are smooth functions of the end values.
+MissionComputation counts the computations, and the computations can be
+held with MissionComputation.gate to test concurrent evaluations.
+
+Examples
+--------
+Use the stand-in instead of APP::
+
+    with mock.patch.multiple(MissionOptimization, Files=MockAPP, Mission=MockAPP):
+        MockAPP.writeMission('mission.mis', [8000.0, 0.7, 160.0])
+        res = optimizeMission('mission.mis', segParList, objective)
+
+@author: alr
+"""
+#pylint: disable-msg=C0103
+import json
+import os
+import threading
+
+import numpy as np
+
+variables = ['Time', 'Distance', 'Fuel Mass']
+
+#end values of the optimal mission
+optimum = [9000.0, 0.78, 150.0]
+
+class fakeValue(object):
+    def __init__(self, xx):
+        self.xx = xx
+
+class fakeFlightData(object):
+    def __init__(self, climb):
+        self.climb = fakeValue(climb)
+
+class fakeSegment(object):
+    def __init__(self, endValue, climb):
+        self.endValue1 = fakeValue(endValue)
+        self.segFd = fakeFlightData(climb)
+
+class MissionComputationFile(object):
+    def __init__(self, segments):
+        self.segments = [fakeSegment(end, climb) for end, climb in segments]
+
+    @classmethod
+    def fromFile(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def getSegmentList(self):
+        return self.segments
+
+    def saveToFile(self, path, overwrite=False):
+        if os.path.exists(path) and not overwrite:
+            raise IOError('file exists')
+        with open(path, 'w') as f:
+            json.dump([[seg.endValue1.xx, seg.segFd.climb.xx] for seg in self.segments], f)
+
+class fakeResultSegment(object):
+    def __init__(self, data):
+        self.data = data
+
+    def getData(self):
+        return self.data
+
+class fakeResult(object):
+    def __init__(self, segments):
+        self.segments = segments
+
+    def getVariableIndex(self, variable):
+        return variables.index(variable)
+
+    def getSegmentList(self):
+        return self.segments
+
+class MissionComputation(object):
+    '''
+    Computes a mission with one result segment of 11 time steps. A mission
+    with a negative end value fails and has no result segments.
+
+    *runs* counts the computations, *running* the computations in progress
+    and *maxRunning* the maximum of *running*. If *gate* is a
+    threading.Event, every computation waits until it is set.
+    '''
+    runs = 0
+    running = 0
+    maxRunning = 0
+    gate = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.result = None
+
+    def run(self, path):
+        cls = MissionComputation
+        with cls._lock:
+            cls.runs += 1
+            cls.running += 1
+            cls.maxRunning = max(cls.maxRunning, cls.running)
+        try:
+            if cls.gate is not None and not cls.gate.wait(10.0):
+                raise RuntimeError('MissionComputation.gate was not set')
+            self._compute(path)
+        finally:
+            with cls._lock:
+                cls.running -= 1
+
+    def _compute(self, path):
+        with open(path) as f:
+            segments = json.load(f)
+        end = np.array([seg[0] for seg in segments], dtype=float)
+        if np.any(end < 0.0):
+            self.result = fakeResult([])
+            return
+        dev = end / np.array(optimum) - 1.0
+        fuel = 1000.0 * (1.0 + np.sum(dev**2))
+        missionTime = 3600.0 * (1.0 + np.sum((dev - 0.1)**2))
+        t = np.linspace(0.0, 1.0, 11)
+        data = np.vstack([missionTime*t, 1e6*t, fuel*t]).T
+        self.result = fakeResult([fakeResultSegment(data)])
+
+def writeMission(path, endValues):
+    '''
+    Writes a mission file with the given segment end values.
+    '''
+    MissionComputationFile([[end, 0.0] for end in endValues]).saveToFile(path, overwrite=True)
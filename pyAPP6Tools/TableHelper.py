@@ -6,10 +6,18 @@ Created on Tue Feb 23 16:07:01 2016
 """
 #pylint: disable-msg=C0103
 
+import hashlib
+import itertools
+import os
+import shutil
+import tempfile
+
 import numpy as np
 from pyAPP6.Files import X2Table
 
-def addArraysToX3Table(a, b, c, d, x3table_output, clear_table=True):
+_restructuredDataVersion = 1
+
+def addArraysToX3Table(a, b, c, d, x3table_output, clear_table=True, cachefile=None):
     '''
     Reformats and adds the arrays a, b, c and d to a pyAPP X3Table
     
@@ -34,19 +42,176 @@ def addArraysToX3Table(a, b, c, d, x3table_output, clear_table=True):
         X3Table to fill with a, b, c and d
     clear_table : bool
         if True, the x3table_output is cleared (default)
+    cachefile : str
+        optional .npz file to cache the restructured data in, see
+        cachedRestructureArrayData
 
     '''
     if clear_table:
         x3table_output.clear()
 
-    alist = restructureArrayData(a, b, c, d)
+    if cachefile is None:
+        alist = restructureArrayData(a, b, c, d)
+    else:
+        alist = cachedRestructureArrayData(a, b, c, d, cachefile)
 
+    _insertNestedList(alist, x3table_output)
+
+def _insertNestedList(alist, x3table_output):
+    '''
+    Inserts a nested list [a, [b, [c, d]]] into a pyAPP X3Table.
+    '''
     for alt, a_table in alist:
         m_t_ff_table = X2Table(embedded=True)
         x3table_output.insertTable(alt, m_t_ff_table)
         for m, m_table in a_table:
             m_t_ff_table.insertTable(m, m_table)
 
+def addChunksToX3Table(chunks, x3table_output, clear_table=True, tmpdir=None):
+    '''
+    Streaming version of addArraysToX3Table for engine decks which do not
+    fit into memory.
+
+    The chunks are grouped by a (e.g. altitude) in temporary files, and the
+    X3Table is filled one a value at a time, see restructureChunks. The peak
+    memory scales with the largest a slice, not with the size of the deck.
+
+    Arguments
+    ---------
+    chunks : iterable
+        iterable of tuples (a, b, c, d) of numpy arrays, e.g. from
+        iterCSVChunks or iterNpyChunks
+    x3table_output : pyAPP6.Files.X3Table
+        X3Table to fill with the data
+    clear_table : bool
+        if True, the x3table_output is cleared (default)
+    tmpdir : str
+        directory for the temporary files, see tempfile.mkdtemp
+
+    Examples
+    --------
+    Convert a large GasTurb export::
+
+        addChunksToX3Table(iterCSVChunks('deck.csv', skiprows=1), fuelFlowTable)
+    '''
+    if clear_table:
+        x3table_output.clear()
+
+    _insertNestedList(restructureChunks(chunks, tmpdir=tmpdir), x3table_output)
+
+def restructureChunks(chunks, tmpdir=None):
+    '''
+    Streaming version of restructureArrayData.
+
+    The rows of all chunks are appended to one temporary binary file per a
+    value. Afterwards, the files are read one at a time in the order of a,
+    and the entries [a, [b, [c, d]]] of the nested list are yielded. The
+    temporary files are removed.
+
+    Arguments
+    ---------
+    chunks : iterable
+        iterable of tuples (a, b, c, d) of numpy arrays of shape (n,)
+    tmpdir : str
+        directory for the temporary files, see tempfile.mkdtemp
+
+    Raises
+    ------
+    ValueError
+        If the arrays of a chunk are not of equal length
+
+    Returns
+    -------
+    generator
+        yields lists [a, [b, [c, d]]], sorted by a
+    '''
+    spooldir = tempfile.mkdtemp(prefix='x3table_', dir=tmpdir)
+    try:
+        files = {} #a value -> path of its temporary file
+        for a, b, c, d in chunks:
+            length = len(a)
+            if any(len(lst) != length for lst in [b, c, d]):
+                raise ValueError('input arrays must have same length')
+
+            #append the rows (b,c,d) of every a value to its file
+            order = np.argsort(a, kind='stable')
+            a = np.asarray(a, dtype=float)[order]
+            rows = np.column_stack((b, c, d)).astype(float)[order]
+            start = np.flatnonzero(np.append(True, a[1:] != a[:-1]))
+            end = np.append(start[1:], length)
+            for lo, hi in zip(start, end):
+                element_a = a[lo]
+                if element_a not in files:
+                    files[element_a] = os.path.join(spooldir, '%d.bin' % len(files))
+                with open(files[element_a], 'ab') as f:
+                    rows[lo:hi].tofile(f)
+
+        for element_a in sorted(files):
+            rows = np.fromfile(files[element_a]).reshape(-1, 3)
+            os.remove(files[element_a])
+            a = np.full(len(rows), element_a)
+            for entry in restructureArrayData(a, rows[:, 0], rows[:, 1], rows[:, 2]):
+                yield entry
+    finally:
+        shutil.rmtree(spooldir, ignore_errors=True)
+
+def iterCSVChunks(filename, chunksize=100000, columns=(0, 1, 2, 3), delimiter=',',
+                  skiprows=0):
+    '''
+    Reads a CSV file in chunks, e.g. for restructureChunks.
+
+    Arguments
+    ---------
+    filename : str
+        path of the CSV file
+    chunksize : int
+        number of rows per chunk
+    columns : tuple
+        indices of the columns (a, b, c, d)
+    delimiter : str
+        column delimiter
+    skiprows : int
+        number of header rows to skip
+
+    Returns
+    -------
+    generator
+        yields tuples (a, b, c, d) of numpy arrays
+    '''
+    with open(filename) as f:
+        for _ in range(skiprows):
+            next(f, None)
+        while True:
+            lines = list(itertools.islice(f, chunksize))
+            if not lines:
+                break
+            data = np.loadtxt(lines, delimiter=delimiter, usecols=columns, ndmin=2)
+            yield data[:, 0], data[:, 1], data[:, 2], data[:, 3]
+
+def iterNpyChunks(filename, chunksize=1000000, columns=(0, 1, 2, 3)):
+    '''
+    Reads a .npy file with an array of shape (N,M) in chunks, using a memory
+    map, e.g. for restructureChunks.
+
+    Arguments
+    ---------
+    filename : str
+        path of the .npy file
+    chunksize : int
+        number of rows per chunk
+    columns : tuple
+        indices of the columns (a, b, c, d)
+
+    Returns
+    -------
+    generator
+        yields tuples (a, b, c, d) of numpy arrays
+    '''
+    data = np.load(filename, mmap_mode='r')
+    for start in range(0, len(data), chunksize):
+        chunk = np.array(data[start:start+chunksize][:, list(columns)], dtype=float)
+        yield chunk[:, 0], chunk[:, 1], chunk[:, 2], chunk[:, 3]
+
 def restructureArrayData(a, b, c, d):
     '''
     Helper function to convert data.
@@ -77,34 +242,45 @@ def restructureArrayData(a, b, c, d):
     Returns
     -------
     list
-        nested list with shape [a, [b, [c, d]]]
+        nested list with shape [a, [b, [c, d]]]. The (c, d) arrays are views
+        of a single array of shape (N,2).
     '''
 
     length = len(a)
     if any(len(lst) != length for lst in [b, c, d]):
         raise ValueError('input arrays must have same length')
 
-    result = [] #resulting list with content (a,(b,(c,d)))
+    #sort by a, then b, then c. All rows with equal a and b are contiguous
+    #afterwards, and the c values within them are sorted.
+    order = np.lexsort((c, b, a))
+    a = np.asarray(a)[order]
+    b = np.asarray(b)[order]
+    t_ff = np.column_stack((np.asarray(c)[order], np.asarray(d)[order]))
 
-    unique_a = np.unique(a) #find all unique a values (e.g. altitudes)
-    for element_a in unique_a:
-        #extract all values at altitude *alt*
-        b_tmp = b[a == element_a]
-        c_tmp = c[a == element_a]
-        d_tmp = d[a == element_a]
+    #rows where a new a value (e.g. altitude) or a new (a,b) group starts.
+    #As the arrays are sorted, no further np.unique is needed.
+    new_a = np.ones(length, dtype=bool)
+    new_a[1:] = a[1:] != a[:-1]
+    new_ab = new_a.copy()
+    new_ab[1:] |= b[1:] != b[:-1]
+    start_a = np.flatnonzero(new_a)
+    unique_a = a[start_a]
+    start_ab = np.flatnonzero(new_ab)
+    bounds_ab = np.append(start_ab, length)
+    #index of the first (a,b) group of every a value
+    first_ab = np.append(np.searchsorted(start_ab, start_a), len(start_ab))
 
+    result = [] #resulting list with content (a,(b,(c,d)))
+    for ia, element_a in enumerate(unique_a):
         #create and add sublist with content (m,(T,FF))
         m_list = []
         result.append([element_a, m_list])
 
         #loop through b (mach numbers) at values for a (altitude)
-        for m in np.unique(b_tmp):
-            #extract all values at altitude *alt* and mach number *m*
-            ff_m = d_tmp[b_tmp == m]
-            t_m = c_tmp[b_tmp == m]
-            t_ff_array = np.vstack([t_m, ff_m]).T
-            t_ff_array = t_ff_array[np.argsort(t_ff_array[:, 0])] #sorted numpy array with content (T,FF)
-            m_list.append([m, t_ff_array])
+        for iab in range(first_ab[ia], first_ab[ia+1]):
+            lo, hi = bounds_ab[iab], bounds_ab[iab+1]
+            #sorted numpy array with content (T,FF)
+            m_list.append([b[lo], t_ff[lo:hi]])
 
     return result
 
@@ -134,26 +310,411 @@ def convertX3TableToArrays(x3table):
         a tuple (a,b,c,d) containing numpy arrays with equal length
     '''
 
-    a_list = [] #Alt
-    b_list = [] #Mach
-    c_list = [] #Thrust
-    d_list = [] #Fuel Flow
+    #first pass: count the rows to allocate the output arrays once
+    length = 0
+    for tab_x2 in x3table.table:
+        for tab_x1 in tab_x2.table:
+            length += len(tab_x1)
 
+    a = np.empty(length) #Alt
+    b = np.empty(length) #Mach
+    c = np.empty(length) #Thrust
+    d = np.empty(length) #Fuel Flow
+
+    #second pass: fill the arrays by slice assignment
+    start = 0
     for val_a, tab_x2 in zip(x3table.value, x3table.table):
         for val_b, tab_x1 in zip(tab_x2.value, tab_x2.table):
-            thrust = tab_x1[:, 0]
-            ff = tab_x1[:, 1]
-            alt = [val_a] * len(thrust)
-            Mach = [val_b] * len(thrust)
-            a_list.extend(alt)
-            b_list.extend(Mach)
-            c_list.extend(thrust)
-            d_list.extend(ff)
-
-    #convert to numpy arrays (creates copy)
-    a = np.array(a_list)
-    b = np.array(b_list)
-    c = np.array(c_list)
-    d = np.array(d_list)
+            end = start + len(tab_x1)
+            a[start:end] = val_a
+            b[start:end] = val_b
+            c[start:end] = tab_x1[:, 0]
+            d[start:end] = tab_x1[:, 1]
+            start = end
 
     return a, b, c, d
+
+def flattenNestedList(alist):
+    '''
+    Converts a nested list [a, [b, [c, d]]] as returned by restructureArrayData
+    into flat arrays with offset indices.
+
+    The b values of the i-th a value are b_values[a_offsets[i]:a_offsets[i+1]],
+    and the (c, d) rows of the j-th b value are cd[b_offsets[j]:b_offsets[j+1]].
+
+    Arguments
+    ---------
+    alist : list
+        nested list with shape [a, [b, [c, d]]]
+
+    Returns
+    -------
+    tuple
+        a tuple (a_values, a_offsets, b_values, b_offsets, cd) of numpy arrays,
+        cd has the shape (N,2)
+    '''
+    a_values = np.array([element_a for element_a, _ in alist], dtype=float)
+    b_values = np.array([m for _, m_list in alist for m, _ in m_list], dtype=float)
+    a_offsets = np.zeros(len(alist) + 1, dtype=np.int64)
+    a_offsets[1:] = np.cumsum([len(m_list) for _, m_list in alist])
+    tables = [t_ff for _, m_list in alist for _, t_ff in m_list]
+    b_offsets = np.zeros(len(tables) + 1, dtype=np.int64)
+    b_offsets[1:] = np.cumsum([len(t_ff) for t_ff in tables])
+    if tables:
+        cd = np.concatenate(tables).astype(float).reshape(-1, 2)
+    else:
+        cd = np.empty((0, 2))
+    return a_values, a_offsets, b_values, b_offsets, cd
+
+def unflattenNestedList(a_values, a_offsets, b_values, b_offsets, cd):
+    '''
+    Converts flat arrays with offset indices, see flattenNestedList, back into
+    a nested list [a, [b, [c, d]]]. The (c, d) arrays are views of *cd*.
+
+    Arguments
+    ---------
+    a_values : ndarray
+        numpy array of shape (Na,)
+    a_offsets : ndarray
+        numpy array of shape (Na+1,)
+    b_values : ndarray
+        numpy array of shape (Nb,)
+    b_offsets : ndarray
+        numpy array of shape (Nb+1,)
+    cd : ndarray
+        numpy array of shape (N,2)
+
+    Returns
+    -------
+    list
+        nested list with shape [a, [b, [c, d]]]
+    '''
+    result = []
+    for ia, element_a in enumerate(a_values):
+        m_list = [[b_values[ib], cd[b_offsets[ib]:b_offsets[ib+1]]]
+                  for ib in range(a_offsets[ia], a_offsets[ia+1])]
+        result.append([element_a, m_list])
+    return result
+
+def arrayHash(*arrays):
+    '''
+    Computes a content hash of numpy arrays, e.g. of the source arrays
+    (a, b, c, d) of an engine deck.
+
+    Arguments
+    ---------
+    arrays : ndarray
+        numpy arrays, converted to float
+
+    Returns
+    -------
+    str
+        SHA-1 hex digest of the shapes and values of the arrays
+    '''
+    sha = hashlib.sha1()
+    for array in arrays:
+        array = np.ascontiguousarray(array, dtype=np.float64)
+        sha.update(str(array.shape).encode('ascii'))
+        sha.update(array.tobytes())
+    return sha.hexdigest()
+
+def saveRestructuredData(filename, alist, sourceHash=''):
+    '''
+    Saves a nested list [a, [b, [c, d]]] as returned by restructureArrayData
+    to a binary .npz file with the flat arrays of flattenNestedList.
+
+    Loading the file with loadRestructuredData is much faster than the
+    conversion of the source data, and the stored hash of the source data
+    (see arrayHash) allows to detect stale files, see cachedRestructureArrayData.
+
+    Arguments
+    ---------
+    filename : str
+        path of the output file, should end with .npz
+    alist : list
+        nested list with shape [a, [b, [c, d]]]
+    sourceHash : str
+        content hash of the source data
+    '''
+    a_values, a_offsets, b_values, b_offsets, cd = flattenNestedList(alist)
+    with open(filename, 'wb') as f:
+        np.savez(f, a_values=a_values, a_offsets=a_offsets,
+                 b_values=b_values, b_offsets=b_offsets, cd=cd,
+                 source_hash=np.array(sourceHash),
+                 version=np.array(_restructuredDataVersion))
+
+def loadRestructuredArrays(filename):
+    '''
+    Loads the flat arrays of a file written by saveRestructuredData.
+
+    Arguments
+    ---------
+    filename : str
+        path of the .npz file
+
+    Returns
+    -------
+    tuple
+        a tuple ((a_values, a_offsets, b_values, b_offsets, cd), sourceHash),
+        see flattenNestedList
+
+    Raises
+    ------
+    ValueError
+        if the file has an unknown format version
+    '''
+    with np.load(filename) as data:
+        if int(data['version']) != _restructuredDataVersion:
+            raise ValueError('%s has an unknown format version %s' % (filename, data['version']))
+        arrays = tuple(data[name] for name in
+                       ('a_values', 'a_offsets', 'b_values', 'b_offsets', 'cd'))
+        sourceHash = str(data['source_hash'])
+    return arrays, sourceHash
+
+def loadRestructuredData(filename):
+    '''
+    Loads a nested list [a, [b, [c, d]]] from a file written by
+    saveRestructuredData.
+
+    Arguments
+    ---------
+    filename : str
+        path of the .npz file
+
+    Returns
+    -------
+    list
+        nested list with shape [a, [b, [c, d]]], see restructureArrayData
+    '''
+    arrays, _ = loadRestructuredArrays(filename)
+    return unflattenNestedList(*arrays)
+
+def loadX3Table(filename, x3table_output, clear_table=True):
+    '''
+    Fills a pyAPP X3Table from a file written by saveRestructuredData.
+
+    Arguments
+    ---------
+    filename : str
+        path of the .npz file
+    x3table_output : pyAPP6.Files.X3Table
+        X3Table to fill
+    clear_table : bool
+        if True, the x3table_output is cleared (default)
+    '''
+    if clear_table:
+        x3table_output.clear()
+
+    _insertNestedList(loadRestructuredData(filename), x3table_output)
+
+def cachedRestructureArrayData(a, b, c, d, cachefile):
+    '''
+    Cached version of restructureArrayData.
+
+    If *cachefile* exists and was written for the same source data, the
+    nested list is loaded from it. Otherwise the data is restructured and
+    the cachefile is (re)written.
+
+    Arguments
+    ---------
+    a, b, c, d : ndarray
+        numpy arrays of shape (N,), see restructureArrayData
+    cachefile : str
+        path of the .npz cache file
+
+    Returns
+    -------
+    list
+        nested list with shape [a, [b, [c, d]]]
+    '''
+    sourceHash = arrayHash(a, b, c, d)
+    if os.path.exists(cachefile):
+        try:
+            arrays, cachedHash = loadRestructuredArrays(cachefile)
+        except (IOError, OSError, ValueError, KeyError):
+            cachedHash = None
+        if cachedHash == sourceHash:
+            return unflattenNestedList(*arrays)
+
+    alist = restructureArrayData(a, b, c, d)
+    saveRestructuredData(cachefile, alist, sourceHash)
+    return alist
+
+class x3TableInterpolator(object):
+    '''
+    Fast trilinear interpolation of X3Table data, e.g. the fuel flow at
+    (altitude, Mach, thrust).
+
+    The nested table is stored as flat arrays with offset indices (see
+    flattenNestedList), and all query points are evaluated at once: the
+    table values enclosing every point are found with one searchsorted per
+    axis over all segments, the d values are interpolated linearly in c at the two enclosing b
+    values of the two enclosing a values, and then linearly in b and a.
+
+    Arguments
+    ---------
+    a_values, a_offsets, b_values, b_offsets, cd : ndarray
+        flat table arrays, see flattenNestedList
+    bounds : str or tuple
+        policy for points outside of the table, either one for all axes or a
+        tuple of three for the axes (a, b, c):
+
+        - 'clamp': use the value at the boundary of the table (default)
+        - 'extrapolate': extrapolate linearly
+        - 'nan': return np.nan
+        - 'raise': raise a ValueError
+
+    Examples
+    --------
+    Interpolate the fuel flow of an APP fuel flow table::
+
+        interp = x3TableInterpolator.fromX3Table(fuelFlowTable, bounds='nan')
+        ff = interp(alt, Mach, thrust)
+    '''
+
+    _policies = ['clamp', 'extrapolate', 'nan', 'raise']
+
+    def __init__(self, a_values, a_offsets, b_values, b_offsets, cd, bounds='clamp'):
+        self.a_values = np.ascontiguousarray(a_values, dtype=float)
+        self.a_offsets = np.ascontiguousarray(a_offsets, dtype=np.int64)
+        self.b_values = np.ascontiguousarray(b_values, dtype=float)
+        self.b_offsets = np.ascontiguousarray(b_offsets, dtype=np.int64)
+        cd = np.asarray(cd, dtype=float)
+        self.c = np.ascontiguousarray(cd[:, 0])
+        self.d = np.ascontiguousarray(cd[:, 1])
+        if len(self.a_values) == 0:
+            raise ValueError('table is empty')
+
+        #search keys (segment index, value) of the axes, see _bracket
+        self._a_keys = self.a_values.astype(complex)*1j
+        self._b_keys = (np.repeat(np.arange(len(self.a_values)), np.diff(self.a_offsets)) +
+                        1j*self.b_values)
+        self._c_keys = (np.repeat(np.arange(len(self.b_values)), np.diff(self.b_offsets)) +
+                        1j*self.c)
+
+        if isinstance(bounds, str):
+            bounds = (bounds,)*3
+        if len(bounds) != 3 or any(policy not in self._policies for policy in bounds):
+            raise ValueError('bounds must be one or three of %s' % ', '.join(self._policies))
+        self.bounds = tuple(bounds)
+
+    @classmethod
+    def fromNestedList(cls, alist, bounds='clamp'):
+        '''
+        Creates an interpolator from a nested list [a, [b, [c, d]]], see
+        restructureArrayData.
+        '''
+        return cls(*flattenNestedList(alist), bounds=bounds)
+
+    @classmethod
+    def fromFile(cls, filename, bounds='clamp'):
+        '''
+        Creates an interpolator from a file written by saveRestructuredData.
+        '''
+        arrays, _ = loadRestructuredArrays(filename)
+        return cls(*arrays, bounds=bounds)
+
+    @classmethod
+    def fromArrays(cls, a, b, c, d, bounds='clamp'):
+        '''
+        Creates an interpolator from the arrays (a, b, c, d), see
+        restructureArrayData.
+        '''
+        return cls.fromNestedList(restructureArrayData(a, b, c, d), bounds=bounds)
+
+    @classmethod
+    def fromX3Table(cls, x3table, bounds='clamp'):
+        '''
+        Creates an interpolator from a pyAPP6.Files.X3Table.
+        '''
+        alist = [[val_a, list(zip(tab_x2.value, tab_x2.table))]
+                 for val_a, tab_x2 in zip(x3table.value, x3table.table)]
+        return cls.fromNestedList(alist, bounds=bounds)
+
+    def __call__(self, a, b, c):
+        '''
+        Interpolates the table. The arguments are broadcast against each other.
+
+        Arguments
+        ---------
+        a : array_like
+            a values (e.g. altitudes)
+        b : array_like
+            b values (e.g. Mach numbers)
+        c : array_like
+            c values (e.g. thrust values)
+
+        Raises
+        ------
+        ValueError
+            If a point is outside of the table and the policy is 'raise'
+
+        Returns
+        -------
+        ndarray
+            interpolated d values (e.g. fuel flow)
+        '''
+        a, b, c = np.broadcast_arrays(np.asarray(a, dtype=float),
+                                      np.asarray(b, dtype=float),
+                                      np.asarray(c, dtype=float))
+        shape = a.shape
+        a, b, c = a.ravel(), b.ravel(), c.ravel()
+        invalid = np.zeros(a.shape, dtype=bool)
+
+        zeros = np.zeros(a.shape, dtype=np.int64)
+        ia, wa = self._bracket(self.a_values, self._a_keys, zeros,
+                               zeros, zeros + len(self.a_values), a, 0, 1.0, invalid)
+
+        result = 0.0
+        for ka, weight_a in [(ia, 1.0 - wa), (ia + 1, wa)]:
+            ka = np.minimum(ka, len(self.a_values) - 1)
+            ib, wb = self._bracket(self.b_values, self._b_keys, ka,
+                                   self.a_offsets[ka], self.a_offsets[ka+1], b, 1,
+                                   weight_a, invalid)
+            for kb, weight_b in [(ib, 1.0 - wb), (ib + 1, wb)]:
+                kb = np.minimum(kb, self.a_offsets[ka+1] - 1)
+                ic, wc = self._bracket(self.c, self._c_keys, kb,
+                                       self.b_offsets[kb], self.b_offsets[kb+1], c, 2,
+                                       weight_a * weight_b, invalid)
+                kc = np.minimum(ic + 1, self.b_offsets[kb+1] - 1)
+                d = self.d[ic] + wc * (self.d[kc] - self.d[ic])
+                result = result + weight_a * weight_b * d
+
+        result = np.array(result, dtype=float)
+        result[invalid] = np.nan
+        return result.reshape(shape)
+
+    def _bracket(self, values, keys, segment, lo, hi, q, axis, weight, invalid):
+        '''
+        Finds the values of the sorted values[lo:hi] enclosing q, for
+        arrays of segment indices, lo, hi and q, and applies the bounds
+        policy of *axis*. *weight* is the interpolation weight of the
+        segments: segments without weight, e.g. the upper neighbour of a
+        point on a grid value, do not contribute and are never out of range.
+
+        Returns the index i of the lower value and the weight of the upper
+        value. For segments with a single value, the weight is 0.
+        '''
+        #largest i in [lo, hi-2] with values[i] <= q. The segments are
+        #searched at once with complex keys (segment, value), which numpy
+        #sorts lexicographically.
+        i = np.searchsorted(keys, segment + 1j*q, side='right') - 1
+        i = np.clip(i, lo, np.maximum(hi - 2, lo))
+
+        single = hi - lo < 2
+        j = np.where(single, i, i + 1)
+        v0 = values[i]
+        dv = values[j] - v0
+        w = np.zeros(q.shape)
+        np.divide(q - v0, dv, out=w, where=dv != 0)
+
+        outside = ((w < 0.0) | (w > 1.0) | (single & (q != v0))) & (weight != 0.0)
+        policy = self.bounds[axis]
+        if policy == 'clamp':
+            np.clip(w, 0.0, 1.0, out=w)
+        elif policy == 'nan':
+            invalid |= outside
+            np.clip(w, 0.0, 1.0, out=w)
+        elif policy == 'raise' and np.any(outside):
+            raise ValueError('values out of table range on axis %d' % axis)
+        return i, w
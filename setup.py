@@ -5,29 +5,21 @@ try:
 except ImportError:
     from distutils.core import setup
 
-try:
-    import numpy
-except ImportError:
-    print 'numpy has to be installed first'
-    exit()
-
-try:
-    import scipy
-except ImportError:
-    print 'scipy has to be installed first'
-    exit()
-    
 with open('README.rst') as readme_file:
     readme = readme_file.read()
 
 with open('CHANGELOG.rst') as history_file:
     history = history_file.read()
 
+#scipy 1.7 for scipy.stats.qmc and RBFInterpolator, 1.11 for COBYLA with bounds
 requirements = [
+    'numpy>=1.20',
+    'scipy>=1.11',
 ]
 
 test_requirements = [
-    # TODO: put package test requirements here
+    'pytest',
+    'mock',
 ]
 
 setup(
@@ -46,6 +38,7 @@ setup(
     package_data={},         
     include_package_data=True,
     install_requires=requirements,
+    python_requires='>=3.9',
     zip_safe=False,
     keywords='pyAPP6Tools',
     test_suite='tests',
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the airspeed conversions
+
+@author: alr
+"""
+#pylint: disable-msg=C0103
+import unittest
+
+import numpy as np
+
+from pyAPP6Tools import Airspeed, Atmosphere
+
+class TestAirspeed(unittest.TestCase):
+
+    def test_sealevel(self):
+        #at sea level in the standard atmosphere, CAS = EAS = TAS
+        conv = Airspeed.airspeedConverter(0.0)
+        for speedType in ['cas', 'eas']:
+            self.assertAlmostEqual(conv.convert(150.0, 'tas', speedType), 150.0, places=9)
+        self.assertAlmostEqual(conv.convert(1.0, 'mach', 'tas'), Airspeed.a0)
+
+    def test_CASFromMach(self):
+        #Mach 0.8 at 10000 m corresponds to about 286 kt CAS
+        cas = Airspeed.convertAirspeed(0.8, 'mach', 'cas', 10000.0)
+        self.assertAlmostEqual(cas / 0.514444, 285.7, delta=0.1)
+
+    def test_EASFromTAS(self):
+        temp, p, dens, mu, a = Atmosphere.getAirState(5000.0, 10.0)
+        eas = Airspeed.convertAirspeed(200.0, 'tas', 'eas', 5000.0, 10.0)
+        self.assertAlmostEqual(eas, 200.0 * np.sqrt(dens / Airspeed.rho0))
+
+    def test_roundTrip(self):
+        alt = np.linspace(0.0, 20000.0, 5)[:, None]
+        dT = np.array([-20.0, 0.0, 20.0])
+        conv = Airspeed.airspeedConverter(alt, dT)
+        mach = np.linspace(0.1, 2.5, 15).reshape(5, 3)
+        for speedType in Airspeed.speedTypes:
+            speed = conv.convert(mach, 'mach', speedType)
+            self.assertEqual(speed.shape, (5, 3))
+            self.assertTrue(np.allclose(conv.convert(speed, speedType, 'mach'), mach,
+                                        rtol=1e-12, atol=0.0))
+
+    def test_machFromImpactPressure(self):
+        mach = np.array([0.0, 0.5, 1.0, 1.5, 3.0])
+        qc = Airspeed.impactPressure(mach, 20000.0)
+        self.assertTrue(np.allclose(Airspeed.machFromImpactPressure(qc, 20000.0), mach,
+                                    rtol=1e-12, atol=1e-12))
+        #Rayleigh pitot formula at Mach 2
+        self.assertAlmostEqual(Airspeed.impactPressure(2.0, 1.0) + 1.0, 5.6404, places=4)
+
+    def test_table(self):
+        table = Atmosphere.airStateTable(dAlt=1000.0, d_dT=5.0)
+        conv = Airspeed.airspeedConverter([1000.0, 9000.0], 5.0, table=table)
+        ref = Airspeed.convertAirspeed(0.7, 'mach', 'cas', [1000.0, 9000.0], 5.0)
+        self.assertTrue(np.allclose(conv.convert(0.7, 'mach', 'cas'), ref, rtol=1e-6))
+
+    def test_unknownType(self):
+        with self.assertRaises(ValueError):
+            Airspeed.convertAirspeed(100.0, 'ias', 'tas', 0.0)
+
+    def test_negativeImpactPressure(self):
+        with self.assertRaises(ValueError):
+            Airspeed.machFromImpactPressure(-1.0, 1e5)
+
+if __name__ == '__main__':
+    unittest.main()
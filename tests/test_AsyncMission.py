@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of AsyncMission, using the APP stand-in MockAPP
+
+@author: alr
+"""
+#pylint: disable-msg=C0103
+import asyncio
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import mock
+
+import numpy as np
+
+#use mock to removed missing dependency from MissionOptimization
+sys.modules.setdefault('pyAPP6', mock.Mock())
+
+from pyAPP6Tools import AsyncMission, MissionOptimization, MockAPP
+from pyAPP6Tools.MissionOptimization import segmentParameter, missionObjective, \
+    resFunctionMinimizeEndValue, updateEndCondition
+
+class TestAsyncMission(unittest.TestCase):
+
+    def setUp(self):
+        self.patcher = mock.patch.multiple(MissionOptimization,
+                                           Files=MockAPP, Mission=MockAPP)
+        self.patcher.start()
+        MissionOptimization._templates.clear()
+        self.tmpdir = tempfile.mkdtemp()
+        self.misfile = os.path.join(self.tmpdir, 'mission.mis')
+        MockAPP.writeMission(self.misfile, [8000.0, 0.7, 160.0])
+        self.segParList = [segmentParameter(0, 8000.0, updateEndCondition),
+                           segmentParameter(1, 0.7, updateEndCondition),
+                           segmentParameter(2, 160.0, updateEndCondition)]
+        self.objective = missionObjective('Fuel Mass', resFunctionMinimizeEndValue, mode='min')
+        self.executor = ThreadPoolExecutor(max_workers=4)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        MockAPP.MissionComputation.gate = None
+        self.patcher.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def _evaluator(self, maxConcurrent=4):
+        return AsyncMission.asyncMissionEvaluator(self.misfile, self.segParList, self.objective,
+                                                  maxConcurrent=maxConcurrent,
+                                                  executor=self.executor)
+
+    async def _running(self, n):
+        #waits until n mission computations are in progress
+        while MockAPP.MissionComputation.running < n:
+            await asyncio.sleep(0.001)
+
+    def test_evaluate(self):
+        async def main():
+            async with self._evaluator() as evaluator:
+                await evaluator.start()
+                runs = MockAPP.MissionComputation.runs
+                values = await evaluator.evaluateBatch([np.ones(3), 1.1*np.ones(3), np.ones(3)])
+                value = await evaluator.evaluate(np.ones(3))
+                return values, value, MockAPP.MissionComputation.runs - runs
+        values, value, runs = asyncio.run(main())
+        self.assertEqual(values[0], 1.0)
+        self.assertEqual(values[2], 1.0)
+        self.assertGreater(values[1], 1.0)
+        self.assertEqual(value, 1.0)
+        self.assertEqual(runs, 2)
+        self.assertEqual(os.listdir(self.tmpdir), ['mission.mis'])
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == 'fork',
+                         'the process pool workers inherit the MockAPP patch only with fork')
+    def test_evaluate_defaultExecutor(self):
+        async def main():
+            async with AsyncMission.asyncMissionEvaluator(self.misfile, self.segParList,
+                                                          self.objective,
+                                                          maxConcurrent=2) as evaluator:
+                await evaluator.start()
+                values = await evaluator.evaluateBatch([np.ones(3), 1.1*np.ones(3)])
+                return values, evaluator.evaluator.cache.misses
+        values, misses = asyncio.run(main())
+        self.assertEqual(values[0], 1.0)
+        self.assertGreater(values[1], 1.0)
+        self.assertEqual(misses, 2)
+        self.assertEqual(os.listdir(self.tmpdir), ['mission.mis'])
+
+    def test_evaluate_semaphore(self):
+        async def main():
+            async with self._evaluator(maxConcurrent=2) as evaluator:
+                await evaluator.start()
+                MockAPP.MissionComputation.gate = threading.Event()
+                MockAPP.MissionComputation.maxRunning = 0
+                runs = MockAPP.MissionComputation.runs
+                batch = asyncio.ensure_future(evaluator.evaluateBatch(
+                    [(1.0 + 0.1*i)*np.ones(3) for i in range(4)]))
+                await self._running(2)
+                MockAPP.MissionComputation.gate.set()
+                await batch
+                return MockAPP.MissionComputation.runs - runs
+        self.assertEqual(asyncio.run(main()), 4)
+        self.assertEqual(MockAPP.MissionComputation.maxRunning, 2)
+
+    def test_evaluate_cancel(self):
+        async def main():
+            async with self._evaluator(maxConcurrent=1) as evaluator:
+                await evaluator.start()
+                MockAPP.MissionComputation.gate = threading.Event()
+                runs = MockAPP.MissionComputation.runs
+                first = asyncio.ensure_future(evaluator.evaluate(np.ones(3)))
+                second = asyncio.ensure_future(evaluator.evaluate(1.1*np.ones(3)))
+                await self._running(1)
+                #the second evaluation waits for the semaphore
+                second.cancel()
+                MockAPP.MissionComputation.gate.set()
+                value = await first
+                with self.assertRaises(asyncio.CancelledError):
+                    await second
+                return value, MockAPP.MissionComputation.runs - runs, evaluator.evaluator.cache
+        value, runs, cache = asyncio.run(main())
+        self.assertEqual(value, 1.0)
+        self.assertEqual(runs, 1)
+        key = cache.key(1.1*np.ones(3), self.misfile, self.segParList, self.objective)
+        self.assertIsNone(cache.get(key))
+
+    def test_sweepMissionAsync(self):
+        design = MissionOptimization.gridDesign([8000.0, 9000.0], [0.7, 0.78], [150.0])
+        table = asyncio.run(AsyncMission.sweepMissionAsync(
+            self.misfile, self.segParList, design, ['Fuel Mass'], executor=self.executor))
+        reference = MissionOptimization.sweepMission(self.misfile, self.segParList, design,
+                                                     ['Fuel Mass'])
+        self.assertTrue(np.all(table['done']))
+        self.assertTrue(np.array_equal(table['Fuel Mass'], reference['Fuel Mass']))
+
+    def test_sweepMissionAsync_failure(self):
+        def endValue(misResult, variable):
+            if not misResult.getSegmentList():
+                raise MissionOptimization.resultError('failed mission')
+            return resFunctionMinimizeEndValue(misResult, variable)
+        design = MissionOptimization.gridDesign([-1.0, 8000.0, 9000.0, 10000.0], [0.7], [150.0])
+        async def main():
+            runs = MockAPP.MissionComputation.runs
+            with self.assertRaises(MissionOptimization.resultError):
+                await AsyncMission.sweepMissionAsync(self.misfile, self.segParList, design,
+                                                     ['Fuel Mass'], func=endValue,
+                                                     maxConcurrent=1, executor=self.executor)
+            #the other design points have been cancelled
+            self.assertEqual(asyncio.all_tasks(), {asyncio.current_task()})
+            return MockAPP.MissionComputation.runs - runs
+        #at most the next design point has started when the sweep fails
+        self.assertLessEqual(asyncio.run(main()), 2)
+
+    def test_optimizeMissionAsync(self):
+        MockAPP.MissionComputation.maxRunning = 0
+        run = MissionOptimization.optimizationRun(callbacks=[])
+        async def main():
+            async with self._evaluator(maxConcurrent=2) as evaluator:
+                return await AsyncMission.optimizeMissionAsync(
+                    self.misfile, self.segParList, self.objective, evaluator=evaluator, run=run)
+        res = asyncio.run(main())
+        self.assertTrue(res['success'])
+        self.assertTrue(np.allclose(res['x'], MockAPP.optimum / np.array([8000.0, 0.7, 160.0]),
+                                    rtol=1e-2))
+        self.assertEqual(run.callbacks, [])
+        self.assertLessEqual(MockAPP.MissionComputation.maxRunning, 2)
+
+    def test_optimizeMissionAsync_sharedEvaluator(self):
+        MockAPP.MissionComputation.maxRunning = 0
+        objective = missionObjective('Time', resFunctionMinimizeEndValue, mode='min')
+        async def main():
+            async with self._evaluator(maxConcurrent=1) as evaluator:
+                return await asyncio.gather(
+                    AsyncMission.optimizeMissionAsync(self.misfile, self.segParList,
+                                                      self.objective, evaluator=evaluator,
+                                                      writeOptimum=False),
+                    AsyncMission.optimizeMissionAsync(self.misfile, self.segParList,
+                                                      objective, evaluator=evaluator,
+                                                      writeOptimum=False))
+        results = asyncio.run(main())
+        self.assertTrue(all(res['success'] for res in results))
+        self.assertEqual(MockAPP.MissionComputation.maxRunning, 1)
+
+    def test_optimizeMissionAsync_cancel(self):
+        run = MissionOptimization.optimizationRun(callbacks=[])
+        async def main():
+            async with self._evaluator(maxConcurrent=1) as evaluator:
+                await evaluator.start()
+                MockAPP.MissionComputation.gate = threading.Event()
+                task = asyncio.ensure_future(AsyncMission.optimizeMissionAsync(
+                    self.misfile, self.segParList, self.objective, evaluator=evaluator,
+                    run=run))
+                await self._running(1)
+                task.cancel()
+                #the optimization ends while the mission computation is held
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+                running = MockAPP.MissionComputation.running
+                MockAPP.MissionComputation.gate.set()
+                return running
+        self.assertEqual(asyncio.run(main()), 1)
+        self.assertEqual(run.evaluations, [])
+        self.executor.shutdown()
+        self.assertEqual(os.listdir(self.tmpdir), ['mission.mis'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,8 +4,13 @@ Created on Tue Mar 01 18:38:20 2016
 
 @author: alr
 """
+import os
+import shutil
+import tempfile
 import unittest
 
+import numpy as np
+
 from pyAPP6Tools import Atmosphere
 
 class TestAtmosphere(unittest.TestCase):
@@ -55,3 +60,113 @@ class TestAtmosphere(unittest.TestCase):
 
     def test_getAirstate_extrapolateLower(self):
         self.assertEqual(len(Atmosphere.getAirState(Atmosphere.Hi[0]-10.0, 0.0)), 5)
+
+    def test_getAirStateArray_matchesScalar(self):
+        alt = np.concatenate([np.linspace(Atmosphere.minH, Atmosphere.maxH, 201),
+                              np.array(Atmosphere.Hi)])
+        for dT in [0.0, 10.0, -35.0]:
+            res = Atmosphere.getAirStateArray(alt, dT)
+            for i, h in enumerate(alt):
+                ref = Atmosphere.getAirState(float(h), dT)
+                #numpy's power and the scalar ** may differ in the last bit
+                for val_array, val_ref in zip(res, ref):
+                    self.assertAlmostEqual(val_array[i] / val_ref, 1.0, delta=1e-14)
+
+    def test_getAirStateArray_broadcast(self):
+        res = Atmosphere.getAirStateArray(np.zeros((3, 1)), np.array([0.0, 5.0]))
+        self.assertEqual(len(res), 5)
+        self.assertEqual(res[0].shape, (3, 2))
+
+    def test_getPressureAltArray_matchesScalar(self):
+        Hp = Atmosphere.getPressureAltArray([-20.0, 20000.0], [10.0, 10.0])
+        self.assertAlmostEqual(Hp[0], Atmosphere.getPressureAlt(-20.0, 10.0), delta=1e-9)
+        self.assertAlmostEqual(Hp[1], Atmosphere.getPressureAlt(20000.0, 10.0), delta=1e-9)
+
+    def test_getPressureAltArray_scalarInput(self):
+        self.assertAlmostEqual(Atmosphere.getPressureAltArray(20000.0, 10.0),
+                               Atmosphere.getPressureAlt(20000.0, 10.0), delta=1e-9)
+
+    def test_PressureAltitudeArray_AltBoundary(self):
+        with self.assertRaises(ValueError):
+            Atmosphere.getPressureAltArray([0.0, Atmosphere.maxH+10.0], 0.0)
+
+    def test_PressureAltitudeArray_TempBoundary(self):
+        with self.assertRaises(ValueError):
+            Atmosphere.getPressureAltArray(0.0, [0.0, Atmosphere.min_dT-5.0])
+
+    def test_solvePressureAlt_matchesFixedPoint(self):
+        Hp, iterations, converged = Atmosphere.solvePressureAlt([-20.0, 20000.0], 10.0)
+        self.assertTrue(np.all(converged))
+        self.assertAlmostEqual(Hp[0], Atmosphere.getPressureAlt(-20.0, 10.0), delta=1.0)
+        self.assertAlmostEqual(Hp[1], Atmosphere.getPressureAlt(20000.0, 10.0), delta=1.0)
+
+    def test_solvePressureAlt_residual(self):
+        alt = np.linspace(Atmosphere.minH, Atmosphere.maxH, 1001)
+        dT = -40.0
+        Hp, iterations, converged = Atmosphere.solvePressureAlt(alt, dT, tol=1e-9)
+        self.assertTrue(np.all(converged))
+        idx = Atmosphere._getIndexArray(Hp)
+        p = Atmosphere._pressureArray(Hp, Atmosphere._temperatureArray(Hp, 0.0, idx), idx)
+        residual = Hp - alt - Atmosphere.R/Atmosphere.G*dT*np.log(p/Atmosphere.pi[0])
+        self.assertLess(np.max(np.abs(residual)), 1e-6)
+
+    def test_solvePressureAlt_SLS(self):
+        Hp, iterations, converged = Atmosphere.solvePressureAlt(0.0, 0.0)
+        self.assertEqual(Hp, 0.0)
+        self.assertEqual(iterations, 0)
+        self.assertTrue(converged)
+
+    def test_solvePressureAlt_notConverged(self):
+        Hp, iterations, converged = Atmosphere.solvePressureAlt(20000.0, 10.0, maxiter=1)
+        self.assertFalse(converged)
+        self.assertEqual(iterations, 1)
+
+    def test_getAirStateDerivativesArray_values(self):
+        alt = np.linspace(Atmosphere.minH, Atmosphere.maxH, 101)
+        values = Atmosphere.getAirStateDerivativesArray(alt, 10.0)[0]
+        for val, ref in zip(values, Atmosphere.getAirStateArray(alt, 10.0)):
+            self.assertTrue(np.array_equal(val, ref))
+
+    def test_getAirStateDerivativesArray_finiteDifferences(self):
+        #points in the middle of the layers, away from the kinks at Hi
+        alt = np.array([5000.0, 15000.0, 26000.0, 40000.0, 49000.0, 60000.0, 75000.0])
+        dT = np.array([-30.0, -10.0, 0.0, 5.0, 10.0, 20.0, 40.0])
+
+        def airState(alt, dT):
+            Hp = Atmosphere.solvePressureAlt(alt, dT, tol=1e-10)[0]
+            return Atmosphere._airStateArray(Hp, dT)
+
+        Hp = Atmosphere.solvePressureAlt(alt, dT, tol=1e-10)[0]
+        values, d_dalt, d_ddT = Atmosphere._airStateDerivativesArray(Hp, dT)
+        for deriv, dalt, ddT in [(d_dalt, 1e-2, 0.0), (d_ddT, 0.0, 1e-4)]:
+            hi = airState(alt + dalt, dT + ddT)
+            lo = airState(alt - dalt, dT - ddT)
+            for k in range(5):
+                fd = (hi[k] - lo[k]) / (2.0 * (dalt + ddT))
+                self.assertTrue(np.allclose(deriv[k], fd, rtol=1e-5, atol=1e-12))
+
+    def test_getAirStateDerivativesArray_hydrostatic(self):
+        values, d_dalt, d_ddT = Atmosphere.getAirStateDerivativesArray([0.0, 30000.0], -20.0)
+        self.assertTrue(np.allclose(d_dalt[1], -values[2] * Atmosphere.G))
+        #in the troposphere at dT = 0, the temperature follows the lapse rate
+        values, d_dalt, d_ddT = Atmosphere.getAirStateDerivativesArray(1000.0, 0.0)
+        self.assertAlmostEqual(d_dalt[0], Atmosphere.Li[0])
+        self.assertAlmostEqual(d_ddT[0], 1.0 + Atmosphere.Li[0]*Atmosphere.R/Atmosphere.G *
+                               np.log(values[1]/Atmosphere.pi[0]))
+
+    def test_airStateTable_errorBound(self):
+        table = Atmosphere.airStateTable()
+        self.assertLess(table.checkError(n=20000), Atmosphere.airStateTable.maxRelError)
+
+    def test_airStateTable_cachefile(self):
+        cachefile = os.path.join(tempfile.mkdtemp(), 'isa_table.npy')
+        table = Atmosphere.airStateTable(dAlt=1000.0, d_dT=5.0, cachefile=cachefile)
+        self.assertTrue(os.path.exists(cachefile))
+        table_cached = Atmosphere.airStateTable(dAlt=1000.0, d_dT=5.0, cachefile=cachefile)
+        self.assertTrue(np.array_equal(table.table, table_cached.table))
+        shutil.rmtree(os.path.dirname(cachefile))
+
+    def test_airStateTable_Boundary(self):
+        table = Atmosphere.airStateTable(dAlt=1000.0, d_dT=5.0)
+        with self.assertRaises(ValueError):
+            table.getAirState(Atmosphere.maxH+10.0, 0.0)
@@ -0,0 +1,636 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of MissionOptimization, using the APP stand-in MockAPP
+
+@author: alr
+"""
+#pylint: disable-msg=C0103
+import functools
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import unittest
+import mock
+
+import numpy as np
+
+#use mock to removed missing dependency from MissionOptimization
+sys.modules.setdefault('pyAPP6', mock.Mock())
+
+from pyAPP6Tools import MissionOptimization
+from pyAPP6Tools.MissionOptimization import segmentParameter, missionObjective, \
+    resFunctionMinimizeEndValue, updateEndCondition
+from pyAPP6Tools import MockAPP
+
+class TestMissionOptimization(unittest.TestCase):
+
+    def setUp(self):
+        self.patcher = mock.patch.multiple(MissionOptimization,
+                                           Files=MockAPP, Mission=MockAPP)
+        self.patcher.start()
+        MissionOptimization._templates.clear()
+        self.tmpdir = tempfile.mkdtemp()
+        self.misfile = os.path.join(self.tmpdir, 'mission.mis')
+        MockAPP.writeMission(self.misfile, [8000.0, 0.7, 160.0])
+        self.segParList = [segmentParameter(0, 8000.0, updateEndCondition),
+                           segmentParameter(1, 0.7, updateEndCondition),
+                           segmentParameter(2, 160.0, updateEndCondition)]
+        self.objective = missionObjective('Fuel Mass', resFunctionMinimizeEndValue, mode='min')
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def test_optimizeMission(self):
+        res = MissionOptimization.optimizeMission(self.misfile, self.segParList, self.objective)
+        self.assertTrue(res['success'])
+        x = res['x'] * np.array([p.startValue for p in self.segParList])
+        self.assertTrue(np.allclose(x, MockAPP.optimum, rtol=1e-2))
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, 'mission_optTmp.mis')))
+
+    def test_optimizeMission_parallelEqualsSerial(self):
+        objective = missionObjective('Fuel Mass', resFunctionMinimizeEndValue, mode='min')
+        res_serial = MissionOptimization.optimizeMission(self.misfile, self.segParList,
+                                                         self.objective)
+        res_parallel = MissionOptimization.optimizeMission(self.misfile, self.segParList,
+                                                           objective, workers=2)
+        self.assertTrue(np.array_equal(res_serial['x'], res_parallel['x']))
+        self.assertEqual(res_serial['nfev'], res_parallel['nfev'])
+
+    def test_optimizeMission_parallelGradient(self):
+        res = MissionOptimization.optimizeMission(self.misfile, self.segParList,
+                                                  self.objective, method='BFGS', workers=2)
+        x = res['x'] * np.array([p.startValue for p in self.segParList])
+        self.assertTrue(np.allclose(x, MockAPP.optimum, rtol=1e-2))
+
+    def test_gradient_schemes(self):
+        self.objective.setNorm(self._baseResult())
+        self.segParList[0] = segmentParameter(0, 8000.0, updateEndCondition, step=10.0)
+        evaluator = MissionOptimization.missionEvaluator(self.misfile, self.segParList,
+                                                         self.objective)
+        self.assertAlmostEqual(evaluator.steps[0], 10.0/8000.0)
+        self.assertTrue(np.all(evaluator.steps[1:] == 1e-4))
+        x = np.array([1.05, 1.1, 0.95])
+        #the base point of forward differences is taken from the cache
+        evaluator(x)
+        runs = MockAPP.MissionComputation.runs
+        g_forward = evaluator.gradient(x)
+        self.assertEqual(MockAPP.MissionComputation.runs, runs + 3)
+
+        central = MissionOptimization.missionEvaluator(self.misfile, self.segParList,
+                                                       self.objective, gradient='central')
+        runs = MockAPP.MissionComputation.runs
+        g_central = central.gradient(x)
+        self.assertEqual(MockAPP.MissionComputation.runs, runs + 6)
+        self.assertTrue(np.allclose(g_forward, g_central, rtol=1e-2))
+        self.assertRaises(ValueError, MissionOptimization.missionEvaluator, self.misfile,
+                          self.segParList, self.objective, gradient='complex')
+
+    def test_gradient_bounds(self):
+        self.objective.setNorm(self._baseResult())
+        self.segParList[0] = segmentParameter(0, 8000.0, updateEndCondition, 6000.0, 8000.0)
+        evaluator = MissionOptimization.missionEvaluator(self.misfile, self.segParList,
+                                                         self.objective, gradient='central')
+        evaluator.gradient(np.ones(3))
+        self.assertEqual(evaluator.screened, 0)
+
+    def test_optimizeMission_centralGradient(self):
+        self.segParList = [segmentParameter(0, 8000.0, updateEndCondition, step=1.0),
+                           segmentParameter(1, 0.7, updateEndCondition, step=1e-4),
+                           segmentParameter(2, 160.0, updateEndCondition, step=0.02)]
+        for workers in [1, 2]:
+            objective = missionObjective('Fuel Mass', resFunctionMinimizeEndValue, mode='min')
+            res = MissionOptimization.optimizeMission(self.misfile, self.segParList, objective,
+                                                      method='BFGS', gradient='central',
+                                                      workers=workers)
+            x = res['x'] * np.array([p.startValue for p in self.segParList])
+            self.assertTrue(np.allclose(x, MockAPP.optimum, rtol=1e-2))
+        self.assertRaises(ValueError, MissionOptimization.optimizeMission, self.misfile,
+                          self.segParList, self.objective, gradient='central')
+
+    def test_optimizeMission_gradientCacheResolution(self):
+        #the default step of 1e-4 is less than 1000 times the resolution of 6 decimals
+        cache = MissionOptimization.evaluationCache(decimals=6)
+        self.assertRaises(ValueError, MissionOptimization.optimizeMission, self.misfile,
+                          self.segParList, self.objective, method='BFGS', gradient='forward',
+                          cache=cache)
+        self.segParList = [segmentParameter(0, 8000.0, updateEndCondition, step=10.0),
+                           segmentParameter(1, 0.7, updateEndCondition, step=1e-3),
+                           segmentParameter(2, 160.0, updateEndCondition, step=0.2)]
+        res = MissionOptimization.optimizeMission(self.misfile, self.segParList, self.objective,
+                                                  method='BFGS', gradient='forward',
+                                                  cache=cache)
+        self.assertGreater(res['nit'], 0)
+        x = res['x'] * np.array([p.startValue for p in self.segParList])
+        self.assertTrue(np.allclose(x, MockAPP.optimum, rtol=1e-2))
+
+    def test_evaluateBatch_noTemporaryFilesLeft(self):
+        self.objective.setNorm(self._baseResult())
+        evaluator = MissionOptimization.missionEvaluator(self.misfile, self.segParList,
+                                                         self.objective, workers=2)
+        try:
+            values = evaluator.evaluateBatch([np.ones(3), 1.1*np.ones(3)])
+        finally:
+            evaluator.close()
+        self.assertEqual(values[0], 1.0)
+        self.assertEqual(os.listdir(self.tmpdir), ['mission.mis'])
+
+    def test_resFunctionMinimizeEndValue_failedMission(self):
+        misCmp = MockAPP.MissionComputation()
+        MockAPP.writeMission(self.misfile, [-1.0, 0.7, 160.0])
+        misCmp.run(self.misfile)
+        with self.assertWarnsRegex(MissionOptimization.resultWarning, 'computation failed'):
+            self.assertTrue(np.isnan(resFunctionMinimizeEndValue(misCmp.result, 'Fuel Mass')))
+
+    def test_resultReader_history(self):
+        segments = [MockAPP.fakeResultSegment(np.arange(6.0).reshape(2, 3)),
+                    MockAPP.fakeResultSegment(np.arange(6.0, 15.0).reshape(3, 3))]
+        result = mock.Mock(wraps=MockAPP.fakeResult(segments))
+        reader = MissionOptimization.resultReader(['Fuel Mass', 'Time'])
+        history = reader.history(result)
+        self.assertTrue(np.array_equal(history, [[2, 0], [5, 3], [8, 6], [11, 9], [14, 12]]))
+        self.assertTrue(np.array_equal(reader.endValues(result), [14.0, 12.0]))
+        #the indices are resolved once, and a result is read once
+        reader.history(MockAPP.fakeResult(segments))
+        self.assertEqual(result.getVariableIndex.call_count, 2)
+        self.assertEqual(result.getSegmentList.call_count, 1)
+        last = MissionOptimization.resultReader(['Time'], segments=[0])
+        self.assertTrue(np.array_equal(last.history(result), [[0.0], [3.0]]))
+
+    def test_resultReader_integral(self):
+        reader = MissionOptimization.resultReader(['Time', 'Fuel Mass'])
+        result = self._baseResult()
+        fuel = reader.endValue(result, 'Fuel Mass')
+        time = reader.endValue(result, 'Time')
+        self.assertAlmostEqual(reader.integral(result, 'Fuel Mass'), 0.5*fuel*time)
+        #reader functions are used like resFunctionMinimizeEndValue, also in worker processes
+        objective = missionObjective('Fuel Mass', reader.integral, mode='min')
+        res = MissionOptimization.optimizeMission(self.misfile, self.segParList, objective,
+                                                  workers=2)
+        self.assertTrue(res['success'])
+
+    def test_resultReader_failures(self):
+        reader = MissionOptimization.resultReader(['Fuel Mass'], segments=[2])
+        with self.assertRaisesRegex(MissionOptimization.resultError, 'has 1 segments'):
+            reader.history(self._baseResult())
+        reader = MissionOptimization.resultReader(['Mach'])
+        with self.assertRaisesRegex(MissionOptimization.resultError, "unknown result variable 'Mach'"):
+            reader.history(self._baseResult())
+        with self.assertWarnsRegex(MissionOptimization.resultWarning, 'unknown result variable'):
+            self.assertTrue(np.isnan(reader.endValue(self._baseResult(), 'Mach')))
+        reader = MissionOptimization.resultReader(['Fuel Mass'])
+        with self.assertWarnsRegex(MissionOptimization.resultWarning,
+                                   "unknown result variable 'Altitude'"):
+            self.assertTrue(np.isnan(reader.integral(self._baseResult(), 'Fuel Mass',
+                                                     timeVariable='Altitude')))
+
+    def test_resultReader_readOnce(self):
+        base = self._baseResult()
+        result = mock.Mock(wraps=base)
+        reader = MissionOptimization.resultReader(segments=[-1])
+        time = reader.endValue(result, 'Time')
+        fuel = reader.endValue(result, 'Fuel Mass')
+        self.assertEqual([time, fuel], list(base.getSegmentList()[-1].getData()[-1, [0, 2]]))
+        self.assertEqual(result.getSegmentList.call_count, 1)
+        #the indices are resolved for the first result of the study only
+        other = mock.Mock(wraps=self._baseResult())
+        reader.endValue(other, 'Time')
+        self.assertEqual(other.getVariableIndex.call_count, 0)
+        #another study resolves them again
+        MissionOptimization.resultReader(segments=[-1]).endValue(other, 'Time')
+        self.assertEqual(other.getVariableIndex.call_count, 1)
+        self.assertEqual(resFunctionMinimizeEndValue(other, 'Time'), time)
+        self.assertEqual(other.getVariableIndex.call_count, 2)
+
+    def test_resultReader_pickle(self):
+        reader = MissionOptimization.resultReader(['Time'], segments=[0])
+        reader.history(self._baseResult())
+        #the copy of a worker process keeps the resolved indices
+        copy = pickle.loads(pickle.dumps(reader))
+        result = mock.Mock(wraps=self._baseResult())
+        self.assertTrue(np.array_equal(copy.history(result), reader.history(result)))
+        self.assertEqual(result.getVariableIndex.call_count, 0)
+        self.assertEqual(repr(copy), repr(reader))
+
+    def test_evaluationCache_keyDependsOnFunction(self):
+        self.objective.setNorm(self._baseResult())
+        cache = MissionOptimization.evaluationCache()
+        keys = set()
+        for segments in [None, [0]]:
+            reader = MissionOptimization.resultReader(segments=segments)
+            constraint = MissionOptimization.missionConstraint('Time', reader.integral,
+                                                               upper=1.0)
+            keys.add(cache.key(np.ones(3), self.misfile, self.segParList, self.objective,
+                               [constraint]))
+        self.assertEqual(len(keys), 2)
+        #any function in memory, only named functions in stored keys
+        stored = MissionOptimization.evaluationCache(filename=os.path.join(self.tmpdir, 'c'))
+        for func in [lambda r, v: 0.0, lambda r, v: 1.0,
+                     functools.partial(resFunctionMinimizeEndValue, variable='Time')]:
+            constraint = MissionOptimization.missionConstraint('Time', func, upper=1.0)
+            keys.add(cache.key(np.ones(3), self.misfile, self.segParList, self.objective,
+                               [constraint]))
+            self.assertRaisesRegex(ValueError, 'no stable name', stored.key, np.ones(3),
+                                   self.misfile, self.segParList, self.objective, [constraint])
+            self.assertRaises(ValueError, cache.key, np.ones(3), self.misfile, self.segParList,
+                              self.objective, [constraint], stored=True)
+        self.assertEqual(len(keys), 5)
+
+    def test_optimizeMission_lambdaParameter(self):
+        self.segParList[0] = segmentParameter(0, 8000.0,
+                                              lambda seg, x: updateEndCondition(seg, x))
+        res = MissionOptimization.optimizeMission(self.misfile, self.segParList, self.objective)
+        self.assertTrue(res['success'])
+        filename = os.path.join(self.tmpdir, 'study.ckpt')
+        self.assertRaisesRegex(ValueError, 'no stable name', MissionOptimization.optimizeMission,
+                               self.misfile, self.segParList, self.objective, checkpoint=filename)
+
+    def test_optimizeMission_onlyOptimumWritten(self):
+        MissionOptimization.optimizeMission(self.misfile, self.segParList, self.objective)
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['mission.mis', 'mission_optTmp.mis'])
+
+    def test_workDirectory_root(self):
+        root = os.path.join(self.tmpdir, 'scratch')
+        os.mkdir(root)
+        workdir = MissionOptimization.workDirectory(self.misfile, root=root)
+        path1 = workdir.newFile()
+        path2 = workdir.newFile()
+        self.assertNotEqual(path1, path2)
+        self.assertEqual(os.path.dirname(os.path.dirname(path1)), root)
+        workdir.release(path1)
+        self.assertFalse(os.path.exists(path1))
+        workdir.cleanup()
+        self.assertEqual(os.listdir(root), [])
+
+    def test_workDirectory_reused(self):
+        root = os.path.join(self.tmpdir, 'scratch')
+        os.mkdir(root)
+        workdir = MissionOptimization.workDirectory(self.misfile, root=root)
+        for tol in [1e-2, 1e-3]:
+            res = MissionOptimization.optimizeMission(self.misfile, self.segParList,
+                                                      self.objective, tol=tol, workdir=workdir)
+            self.assertTrue(res['success'])
+            self.assertTrue(os.path.isdir(workdir.path))
+        workdir.cleanup()
+        self.assertEqual(os.listdir(root), [])
+
+    def test_workDirectory_keep(self):
+        workdir = MissionOptimization.workDirectory(self.misfile, keep=True)
+        res = MissionOptimization.optimizeMission(self.misfile, self.segParList, self.objective,
+                                                  workdir=workdir)
+        self.assertEqual(len(os.listdir(self.tmpdir)), res['cacheMisses'] + 3)
+
+    def test_optimizeMission_cacheStatistics(self):
+        res = MissionOptimization.optimizeMission(self.misfile, self.segParList, self.objective)
+        self.assertEqual(res['cacheHits'] + res['cacheMisses'], res['nfev'])
+
+    def test_optimizeMission_resumeFromCacheFile(self):
+        filename = os.path.join(self.tmpdir, 'study.cache')
+        cache = MissionOptimization.evaluationCache(filename=filename)
+        res = MissionOptimization.optimizeMission(self.misfile, self.segParList, self.objective,
+                                                  cache=cache)
+        runs = MockAPP.MissionComputation.runs
+        cache = MissionOptimization.evaluationCache(filename=filename)
+        res_resumed = MissionOptimization.optimizeMission(self.misfile, self.segParList,
+                                                          self.objective, cache=cache)
+        #the norm is set, no mission is computed again
+        self.assertEqual(MockAPP.MissionComputation.runs, runs)
+        self.assertEqual(res_resumed['cacheMisses'], 0)
+        self.assertTrue(np.array_equal(res['x'], res_resumed['x']))
+
+    def test_evaluationCache_LRU(self):
+        cache = MissionOptimization.evaluationCache(maxsize=2)
+        cache.put('a', 1.0)
+        cache.put('b', 2.0)
+        cache.get('a')
+        cache.put('c', 3.0)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1.0)
+        self.assertEqual(cache.get('c'), 3.0)
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    def test_evaluationCache_keyDependsOnMission(self):
+        cache = MissionOptimization.evaluationCache()
+        self.objective.value = 1.0
+        key = cache.key(np.ones(3), self.misfile, self.segParList, self.objective)
+        self.assertEqual(key, cache.key(np.ones(3) + 1e-12, self.misfile,
+                                        self.segParList, self.objective))
+        MockAPP.writeMission(self.misfile, [8000.0, 0.7, 170.0])
+        self.assertNotEqual(key, cache.key(np.ones(3), self.misfile,
+                                           self.segParList, self.objective))
+
+    def test_optimizeMission_parseOnce(self):
+        with mock.patch.object(MockAPP.MissionComputationFile, 'fromFile',
+                               wraps=MockAPP.MissionComputationFile.fromFile) as fromFile:
+            res = MissionOptimization.optimizeMission(self.misfile, self.segParList,
+                                                      self.objective)
+        self.assertEqual(fromFile.call_count, 1)
+        self.assertEqual(sorted(res['timing'].keys()), sorted(MissionOptimization._phases))
+
+    def test_missionTemplate_patchChangedFields(self):
+        template = MissionOptimization.missionTemplate(self.misfile)
+        modpath = os.path.join(self.tmpdir, 'mod.mis')
+        with mock.patch.object(self.segParList[1], 'func') as func:
+            template.write([1.0, 1.0, 1.0], self.segParList, modpath)
+            template.write([1.1, 1.0, 1.2], self.segParList, modpath)
+        self.assertEqual(func.call_count, 1)
+        self.assertEqual(MockAPP.MissionComputationFile.fromFile(modpath).segments[2].endValue1.xx,
+                         1.2*160.0)
+
+    def test_optimizationRun_records(self):
+        filename = os.path.join(self.tmpdir, 'history.csv')
+        iterations = []
+        run = MissionOptimization.optimizationRun(
+            filename, callbacks=[lambda run, xk: iterations.append(xk)])
+        res = MissionOptimization.optimizeMission(self.misfile, self.segParList, self.objective,
+                                                  run=run)
+        self.assertIs(res['run'], run)
+        self.assertEqual(len(run.evaluations), res['cacheMisses'])
+        self.assertGreater(len(iterations), 0)
+        self.assertEqual(len(iterations), len(run.iterations))
+        data = np.genfromtxt(filename, delimiter=',', names=True)
+        self.assertEqual(len(data), len(run.evaluations))
+        self.assertTrue(np.allclose(data['objective'], [r['objective'] for r in run.evaluations]))
+
+    def test_optimizationRun_failedEvaluation(self):
+        self.objective.setNorm(self._baseResult())
+        run = MissionOptimization.optimizationRun()
+        evaluator = MissionOptimization.missionEvaluator(self.misfile, self.segParList,
+                                                         self.objective, run=run)
+        evaluator.evaluateBatch([np.ones(3), -np.ones(3)])
+        self.assertEqual([rec['failed'] for rec in run.evaluations], [False, True])
+        self.assertGreaterEqual(run.evaluations[0]['time_run'], 0.0)
+
+    def test_optimizeMissionGlobal(self):
+        res = MissionOptimization.optimizeMissionGlobal(self.misfile, self.segParList,
+                                                        self.objective, nStarts=4, seed=0)
+        self.assertTrue(res['success'])
+        #the stand-in has a single optimum, which all starts find
+        self.assertEqual(len(res['optima']), 1)
+        self.assertEqual(res['optima'][0]['starts'], [0, 1, 2, 3])
+        self.assertTrue(any(r['stopped'] for r in res['starts']))
+        x = res['x'] * np.array([p.startValue for p in self.segParList])
+        self.assertTrue(np.allclose(x, MockAPP.optimum, rtol=1e-2))
+        self.assertEqual(res['optima'][0]['path'],
+                         os.path.join(self.tmpdir, 'mission_optTmp_0.mis'))
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['mission.mis', 'mission_optTmp_0.mis'])
+        self.assertEqual(res['nfev'], sum(r['nfev'] for r in res['starts']))
+
+    def test_optimizeMissionGlobal_parallel(self):
+        res = MissionOptimization.optimizeMissionGlobal(self.misfile, self.segParList,
+                                                        self.objective, nStarts=4, seed=0,
+                                                        workers=2)
+        self.assertEqual(len(res['optima']), 1)
+        x = res['x'] * np.array([p.startValue for p in self.segParList])
+        self.assertTrue(np.allclose(x, MockAPP.optimum, rtol=1e-2))
+
+    def test_sampleStartPoints(self):
+        bounds = [(0.5, 1.0), (1.0, 2.0)]
+        for sampling in ['lhs', 'sobol']:
+            starts = MissionOptimization.sampleStartPoints(2, 8, bounds, sampling, seed=1)
+            self.assertEqual(starts.shape, (8, 2))
+            self.assertTrue(np.all((starts >= [0.5, 1.0]) & (starts <= [1.0, 2.0])))
+            self.assertTrue(np.array_equal(
+                starts, MissionOptimization.sampleStartPoints(2, 8, bounds, sampling, seed=1)))
+        self.assertRaises(ValueError, MissionOptimization.sampleStartPoints, 2, 8, bounds, 'grid')
+        self.assertRaises(ValueError, MissionOptimization.sampleStartPoints, 3, 8, bounds)
+
+    def test_rankOptima(self):
+        def result(k, x, fun, success=True, stopped=False):
+            return {'start': k, 'x': np.array(x), 'fun': fun, 'success': success,
+                    'stopped': stopped}
+        results = [result(0, [1.0, 1.0], 2.0), result(1, [2.0, 1.0], 1.0),
+                   result(2, [1.01, 1.0], 2.1), result(3, [2.02, 1.0], 1.5, False, True),
+                   result(4, [0.0, 0.0], np.nan)]
+        optima = MissionOptimization._rankOptima(results, 0.05)
+        self.assertEqual([opt['fun'] for opt in optima], [1.0, 2.0])
+        self.assertEqual([opt['starts'] for opt in optima], [[1, 3], [0, 2]])
+
+    def test_segmentParameter_bounds(self):
+        p = segmentParameter(0, 8000.0, updateEndCondition, lower=6000.0, upper=12000.0)
+        self.assertEqual(p.bounds(), (0.75, 1.5))
+        p = segmentParameter(0, -2.0, updateEndCondition, lower=-4.0, upper=-1.0)
+        self.assertEqual(p.bounds(), (0.5, 2.0))
+        p = segmentParameter(0, 8000.0, updateEndCondition, upper=12000.0)
+        self.assertEqual(p.bounds(), (None, 1.5))
+        self.assertRaises(ValueError, segmentParameter, 0, 1.0, updateEndCondition, 2.0, 1.0)
+        self.assertRaises(ValueError, segmentParameter, 0, 0.0, updateEndCondition, 0.0, 1.0)
+
+    def test_missionConstraint_margins(self):
+        constraint = MissionOptimization.missionConstraint('Time', resFunctionMinimizeEndValue,
+                                                           lower=100.0, upper=200.0)
+        self.assertEqual(constraint.margins(150.0), [0.5, 0.25])
+        self.assertEqual(constraint.margins(np.nan), [-1.0, -1.0])
+        self.assertRaises(ValueError, MissionOptimization.missionConstraint, 'Time',
+                          resFunctionMinimizeEndValue)
+
+    def test_evaluateBatch_screensBounds(self):
+        self.objective.setNorm(self._baseResult())
+        self.segParList[0] = segmentParameter(0, 8000.0, updateEndCondition, lower=0.0)
+        evaluator = MissionOptimization.missionEvaluator(self.misfile, self.segParList,
+                                                         self.objective)
+        runs = MockAPP.MissionComputation.runs
+        values = evaluator.evaluateBatch([-np.ones(3), np.ones(3)])
+        self.assertEqual(values, [np.inf, 1.0])
+        self.assertEqual(MockAPP.MissionComputation.runs, runs + 1)
+        self.assertEqual(evaluator.screened, 1)
+
+    def test_optimizeMission_bounds(self):
+        self.segParList[0] = segmentParameter(0, 8000.0, updateEndCondition, 6000.0, 8500.0)
+        run = MissionOptimization.optimizationRun(callbacks=[])
+        res = MissionOptimization.optimizeMission(self.misfile, self.segParList, self.objective,
+                                                  run=run)
+        x = res['x'] * np.array([p.startValue for p in self.segParList])
+        self.assertTrue(np.allclose(x, [8500.0] + MockAPP.optimum[1:], rtol=1e-2))
+        self.assertTrue(np.all(x[0] <= 8500.0))
+        self.assertTrue(all(r['x'][0]*8000.0 <= 8500.0 for r in run.evaluations))
+
+    def test_optimizeMission_constraints(self):
+        #the mission time at the fuel optimum is 3708 s
+        constraint = MissionOptimization.missionConstraint('Time', resFunctionMinimizeEndValue,
+                                                           upper=3650.0)
+        for method in ['SLSQP', 'trust-constr']:
+            objective = missionObjective('Fuel Mass', resFunctionMinimizeEndValue, mode='min')
+            res = MissionOptimization.optimizeMission(self.misfile, self.segParList, objective,
+                                                      method=method, constraints=[constraint])
+            self.assertTrue(res['success'])
+            MockAPP.writeMission(self.misfile, res['x'] *
+                                 np.array([p.startValue for p in self.segParList]))
+            self.assertLess(resFunctionMinimizeEndValue(self._baseResult(), 'Time'), 3650.0*1.001)
+            MockAPP.writeMission(self.misfile, [8000.0, 0.7, 160.0])
+        self.assertRaises(ValueError, MissionOptimization.optimizeMission, self.misfile,
+                          self.segParList, self.objective, constraints=[constraint])
+
+    def test_optimizeMissionSurrogate(self):
+        res = MissionOptimization.optimizeMissionSurrogate(self.misfile, self.segParList,
+                                                           self.objective, seed=0, compare=True)
+        self.assertTrue(res['success'])
+        x = res['x'] * np.array([p.startValue for p in self.segParList])
+        self.assertTrue(np.allclose(x, MockAPP.optimum, rtol=1e-3))
+        self.assertEqual(res['nfev'], len(res['run'].evaluations))
+        self.assertEqual(res['savedEvaluations'], res['referenceEvaluations'] - res['nfev'])
+        self.assertGreater(res['savedEvaluations'], 0)
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['mission.mis', 'mission_optTmp.mis'])
+
+    def test_optimizeMissionSurrogate_outputAndSearchRegion(self):
+        infill = mock.Mock(wraps=MissionOptimization._surrogateInfill)
+        with mock.patch.object(MissionOptimization, '_surrogateInfill', infill), \
+                mock.patch('builtins.print') as printed:
+            MissionOptimization.optimizeMissionSurrogate(self.misfile, self.segParList,
+                                                         self.objective, seed=0, compare=True)
+        #the comparison run does not write its optimum
+        written = [c for c in printed.call_args_list if c[0][0].startswith('Done.')]
+        self.assertEqual(len(written), 1)
+        #the first search region after the initial design covers the bounds
+        region = infill.call_args_list[0][0][2]
+        bounds = np.array([MissionOptimization._startBounds(p) for p in self.segParList])
+        self.assertTrue(np.array_equal(region, bounds))
+
+    def test_optimizeMissionSurrogate_parallel(self):
+        res = MissionOptimization.optimizeMissionSurrogate(self.misfile, self.segParList,
+                                                           self.objective, model='quadratic',
+                                                           seed=0, workers=2, maxEvaluations=20)
+        self.assertLessEqual(res['nfev'], 20)
+        x = res['x'] * np.array([p.startValue for p in self.segParList])
+        self.assertTrue(np.allclose(x, MockAPP.optimum, rtol=1e-2))
+
+    def test_responseSurface(self):
+        rng = np.random.RandomState(0)
+        X = rng.uniform(0.0, 1.0, (12, 2))
+        def f(X):
+            return 1.0 + (X[:, 0] - 0.3)**2 + 2.0*(X[:, 1] - 0.6)**2 + X[:, 0]*X[:, 1]
+        points = rng.uniform(0.0, 1.0, (5, 2))
+        for model in ['rbf', 'quadratic']:
+            surface = MissionOptimization.responseSurface(X, f(X), model)
+            self.assertTrue(np.allclose(surface(points), f(points), atol=1e-6))
+            self.assertAlmostEqual(surface(points[0]), f(points[:1])[0], places=6)
+        self.assertRaises(ValueError, MissionOptimization.responseSurface, X, f(X), 'kriging')
+
+    def test_optimizeMission_checkpointResume(self):
+        objective = missionObjective('Fuel Mass', resFunctionMinimizeEndValue, mode='min')
+        ref = MissionOptimization.optimizeMission(self.misfile, self.segParList, objective,
+                                                  run=MissionOptimization.optimizationRun(
+                                                      callbacks=[]))
+        filename = os.path.join(self.tmpdir, 'study.ckpt')
+
+        def kill(run, xk):
+            if len(run.iterations) == 10:
+                raise KeyboardInterrupt()
+        checkpoint = MissionOptimization.optimizationCheckpoint(filename, interval=0.0)
+        run = MissionOptimization.optimizationRun(callbacks=[kill])
+        self.assertRaises(KeyboardInterrupt, MissionOptimization.optimizeMission, self.misfile,
+                          self.segParList, self.objective, run=run, checkpoint=checkpoint)
+        done = len(run.evaluations)
+
+        checkpoint = MissionOptimization.optimizationCheckpoint(filename)
+        self.assertTrue(checkpoint.load())
+        self.assertFalse(checkpoint.finished)
+        self.assertEqual(len(checkpoint.evaluations), done)
+        checkpoint.writeBestMission(os.path.join(self.tmpdir, 'best.mis'))
+        best = MockAPP.MissionComputationFile.fromFile(os.path.join(self.tmpdir, 'best.mis'))
+        self.assertAlmostEqual(best.segments[0].endValue1.xx, 8000.0*checkpoint.best['x'][0])
+
+        objective = missionObjective('Fuel Mass', resFunctionMinimizeEndValue, mode='min')
+        runs = MockAPP.MissionComputation.runs
+        res = MissionOptimization.optimizeMission(self.misfile, self.segParList, objective,
+                                                  checkpoint=filename, resume=True)
+        self.assertEqual(MockAPP.MissionComputation.runs - runs, res['cacheMisses'])
+        self.assertEqual(done + res['cacheMisses'], ref['cacheMisses'])
+        self.assertTrue(np.array_equal(res['x'], ref['x']))
+        checkpoint = MissionOptimization.optimizationCheckpoint(filename)
+        checkpoint.load()
+        self.assertTrue(checkpoint.finished)
+
+    def test_optimizationCheckpoint_differentOptimization(self):
+        filename = os.path.join(self.tmpdir, 'study.ckpt')
+        MissionOptimization.optimizeMission(self.misfile, self.segParList, self.objective,
+                                            checkpoint=filename)
+        objective = missionObjective('Time', resFunctionMinimizeEndValue, mode='min')
+        self.assertRaises(ValueError, MissionOptimization.optimizeMission, self.misfile,
+                          self.segParList, objective, checkpoint=filename, resume=True)
+
+    def test_optimizeMissionPareto(self):
+        objectives = [self.objective,
+                      missionObjective('Time', resFunctionMinimizeEndValue, mode='min')]
+        res = MissionOptimization.optimizeMissionPareto(self.misfile, self.segParList,
+                                                        objectives, nPoints=16, generations=3,
+                                                        seed=0)
+        self.assertTrue(res['success'])
+        self.assertEqual(res['nfev'], 64)
+        self.assertEqual(res['fun'].shape, (len(res['x']), 2))
+        self.assertTrue(np.all(MissionOptimization.paretoFront(res['fun'])))
+        #sorted by the first objective, trading it against the second
+        self.assertTrue(np.all(np.diff(res['fun'][:, 0]) >= 0.0))
+        self.assertTrue(np.all(np.diff(res['fun'][:, 1]) <= 0.0))
+        self.assertTrue(all(os.path.exists(path) for path in res['paths']))
+
+        objectives = [missionObjective('Fuel Mass', resFunctionMinimizeEndValue, mode='min'),
+                      missionObjective('Time', resFunctionMinimizeEndValue, mode='min')]
+        res_parallel = MissionOptimization.optimizeMissionPareto(
+            self.misfile, self.segParList, objectives, nPoints=16, generations=3, seed=0,
+            workers=2)
+        self.assertTrue(np.array_equal(res['fun'], res_parallel['fun']))
+        self.assertRaises(ValueError, MissionOptimization.optimizeMissionPareto, self.misfile,
+                          self.segParList, [self.objective])
+
+    def test_paretoFront(self):
+        F = [[1.0, 3.0], [2.0, 2.0], [2.0, 3.0], [3.0, 1.0], [np.nan, 0.0], [1.0, 3.0]]
+        self.assertEqual(MissionOptimization.paretoFront(F).tolist(),
+                         [True, True, False, True, False, True])
+
+    def test_resFunctionEndValues(self):
+        result = self._baseResult()
+        values = MissionOptimization.resFunctionEndValues(result, ['Time', 'Fuel Mass'])
+        self.assertEqual(values, [resFunctionMinimizeEndValue(result, 'Time'),
+                                  resFunctionMinimizeEndValue(result, 'Fuel Mass')])
+
+    def test_sweepMission(self):
+        design = MissionOptimization.gridDesign([8000.0, 9000.0], [0.7, 0.78], [150.0])
+        self.assertEqual(design.shape, (4, 3))
+        table = MissionOptimization.sweepMission(self.misfile, self.segParList, design,
+                                                 ['Fuel Mass', 'Time'],
+                                                 names=['alt', 'Mach', 'tas'])
+        self.assertTrue(np.all(table['done']))
+        self.assertFalse(np.any(table['failed']))
+        self.assertTrue(np.array_equal(table['Mach'], [0.7, 0.78, 0.7, 0.78]))
+        dev = design / np.array(MockAPP.optimum) - 1.0
+        self.assertTrue(np.allclose(table['Fuel Mass'], 1000.0*(1.0 + np.sum(dev**2, axis=1))))
+        self.assertEqual(table['Fuel Mass'][3], 1000.0)
+        parallel = MissionOptimization.sweepMission(self.misfile, self.segParList, design,
+                                                    ['Fuel Mass', 'Time'],
+                                                    names=['alt', 'Mach', 'tas'], workers=2)
+        self.assertTrue(np.array_equal(parallel['Fuel Mass'], table['Fuel Mass']))
+        self.assertEqual(os.listdir(self.tmpdir), ['mission.mis'])
+
+    def test_sweepMission_restart(self):
+        filename = os.path.join(self.tmpdir, 'sweep.npy')
+        design = MissionOptimization.sampleDesign(self.segParList, 6, seed=0)
+        design[2, 0] = -1.0 #failed mission
+        table = MissionOptimization.sweepMission(self.misfile, self.segParList, design[:3],
+                                                 ['Fuel Mass'])
+        #a crashed sweep, which computed the first three points
+        crashed = np.zeros(6, dtype=table.dtype)
+        crashed[:3] = table
+        for i in range(3):
+            crashed['par%d' % i][3:] = design[3:, i]
+        crashed['Fuel Mass'][3:] = np.nan
+        np.save(filename, crashed)
+
+        runs = MockAPP.MissionComputation.runs
+        table = MissionOptimization.sweepMission(self.misfile, self.segParList, design,
+                                                 ['Fuel Mass'], filename=filename)
+        self.assertEqual(MockAPP.MissionComputation.runs - runs, 3)
+        self.assertTrue(np.all(table['done']))
+        self.assertEqual(list(table['failed']), [False, False, True, False, False, False])
+        saved = np.load(filename)
+        self.assertTrue(np.array_equal(saved['done'], table['done']))
+        self.assertTrue(np.array_equal(saved['Fuel Mass'], table['Fuel Mass'], equal_nan=True))
+        self.assertRaises(ValueError, MissionOptimization.sweepMission, self.misfile,
+                          self.segParList, design[:5], ['Fuel Mass'], filename=filename)
+
+    def _baseResult(self):
+        misCmp = MockAPP.MissionComputation()
+        misCmp.run(self.misfile)
+        return misCmp.result
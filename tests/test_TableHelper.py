@@ -5,6 +5,9 @@ Created on Thu Jun 15 18:40:30 2017
 @author: alr
 """
 #pylint: disable-msg=C0103
+import os
+import shutil
+import tempfile
 import unittest
 import sys
 import mock
@@ -37,3 +40,211 @@ class TestTableHelper(unittest.TestCase):
         d = np.array([0.5, 0.7, 0.9])
         res = TableHelper.restructureArrayData(a, b, c, d)
         self.assertEqual(len(res), 1)
+
+    def test_restructureArrayData_Structure(self):
+        a = np.array([1.0, 0.0, 1.0, 0.0, 0.0, 1.0])
+        b = np.array([0.5, 0.5, 0.5, 0.2, 0.5, 0.2])
+        c = np.array([2.0, 3.0, 1.0, 1.0, 1.0, 5.0])
+        d = np.array([0.1, 0.2, 0.3, 0.4, 0.5, 0.6])
+        res = TableHelper.restructureArrayData(a, b, c, d)
+        self.assertEqual([row[0] for row in res], [0.0, 1.0])
+        self.assertEqual([m for m, _ in res[0][1]], [0.2, 0.5])
+        self.assertEqual([m for m, _ in res[1][1]], [0.2, 0.5])
+        self.assertTrue(np.array_equal(res[0][1][1][1], [[1.0, 0.5], [3.0, 0.2]]))
+        self.assertTrue(np.array_equal(res[1][1][1][1], [[1.0, 0.3], [2.0, 0.1]]))
+        self.assertTrue(np.array_equal(res[1][1][0][1], [[5.0, 0.6]]))
+
+    def test_restructureArrayData_RandomDeck(self):
+        rng = np.random.RandomState(0)
+        a = rng.randint(0, 5, 500) * 1000.0
+        b = rng.randint(0, 4, 500) * 0.2
+        c = rng.permutation(500) * 10.0
+        d = rng.uniform(size=500)
+        res = TableHelper.restructureArrayData(a, b, c, d)
+        self.assertEqual(sum(len(t) for _, m_list in res for _, t in m_list), 500)
+        for alt, m_list in res:
+            for m, t_ff in m_list:
+                mask = (a == alt) & (b == m)
+                order = np.argsort(c[mask])
+                self.assertTrue(np.array_equal(t_ff[:, 0], c[mask][order]))
+                self.assertTrue(np.array_equal(t_ff[:, 1], d[mask][order]))
+
+    def test_convertX3TableToArrays(self):
+        x3table = mock.Mock(value=[0.0, 1000.0],
+                            table=[mock.Mock(value=[0.2, 0.5],
+                                             table=[np.array([[1.0, 0.1], [2.0, 0.2]]),
+                                                    np.array([[3.0, 0.3]])]),
+                                   mock.Mock(value=[0.5],
+                                             table=[np.array([[4.0, 0.4], [5.0, 0.5]])])])
+        a, b, c, d = TableHelper.convertX3TableToArrays(x3table)
+        self.assertTrue(np.array_equal(a, [0.0, 0.0, 0.0, 1000.0, 1000.0]))
+        self.assertTrue(np.array_equal(b, [0.2, 0.2, 0.5, 0.5, 0.5]))
+        self.assertTrue(np.array_equal(c, [1.0, 2.0, 3.0, 4.0, 5.0]))
+        self.assertTrue(np.array_equal(d, [0.1, 0.2, 0.3, 0.4, 0.5]))
+
+    def test_convertX3TableToArrays_Empty(self):
+        a, b, c, d = TableHelper.convertX3TableToArrays(mock.Mock(value=[], table=[]))
+        self.assertEqual(len(a), 0)
+
+    def _gridDeck(self):
+        a, b, c = np.meshgrid([0.0, 5000.0, 10000.0], [0.2, 0.5, 0.8], [1e3, 2e3, 4e3, 8e3],
+                              indexing='ij')
+        d = 1e-3 * c * (1.0 + b) * (1.0 - a / 5e4)
+        return a.ravel(), b.ravel(), c.ravel(), d.ravel()
+
+    def test_flattenNestedList_roundTrip(self):
+        alist = TableHelper.restructureArrayData(*self._gridDeck())
+        flat = TableHelper.flattenNestedList(alist)
+        self.assertEqual(list(flat[1]), [0, 3, 6, 9])
+        res = TableHelper.unflattenNestedList(*flat)
+        for (alt, m_list), (alt_ref, m_list_ref) in zip(res, alist):
+            self.assertEqual(alt, alt_ref)
+            for (m, t_ff), (m_ref, t_ff_ref) in zip(m_list, m_list_ref):
+                self.assertEqual(m, m_ref)
+                self.assertTrue(np.array_equal(t_ff, t_ff_ref))
+
+    def test_x3TableInterpolator_Bilinear(self):
+        interp = TableHelper.x3TableInterpolator.fromArrays(*self._gridDeck())
+        #the deck is linear in c and b at constant a, and linear in a
+        alt = np.array([0.0, 2500.0, 7000.0])
+        mach = np.array([0.2, 0.35, 0.6])
+        thrust = np.array([1e3, 3e3, 5e3])
+        expected = 1e-3 * thrust * (1.0 + mach) * (1.0 - alt / 5e4)
+        self.assertTrue(np.allclose(interp(alt, mach, thrust), expected))
+
+    def test_x3TableInterpolator_TableValues(self):
+        a, b, c, d = self._gridDeck()
+        interp = TableHelper.x3TableInterpolator.fromArrays(a, b, c, d)
+        self.assertTrue(np.allclose(interp(a, b, c), d))
+
+    def test_x3TableInterpolator_Bounds(self):
+        deck = self._gridDeck()
+        query = ([-100.0, 0.0], [0.5, 0.5], [2e3, 2e3])
+        clamp = TableHelper.x3TableInterpolator.fromArrays(*deck)(*query)
+        self.assertEqual(clamp[0], clamp[1])
+        nan = TableHelper.x3TableInterpolator.fromArrays(*deck, bounds='nan')(*query)
+        self.assertTrue(np.isnan(nan[0]))
+        self.assertEqual(nan[1], clamp[1])
+        extrapolate = TableHelper.x3TableInterpolator.fromArrays(
+            *deck, bounds='extrapolate')(*query)
+        self.assertGreater(extrapolate[0], extrapolate[1])
+        with self.assertRaises(ValueError):
+            TableHelper.x3TableInterpolator.fromArrays(*deck, bounds='raise')(*query)
+        #only the altitude is out of bounds
+        interp = TableHelper.x3TableInterpolator.fromArrays(
+            *deck, bounds=('clamp', 'raise', 'raise'))
+        self.assertEqual(interp(*query)[0], clamp[0])
+
+    def test_x3TableInterpolator_RaggedGridNodes(self):
+        #the ranges of b and c differ between the segments
+        alist = [[0.0, [[0.4, np.array([[0.0, 1.0], [5.0, 1.5]])],
+                        [0.7, np.array([[0.0, 2.0], [10.0, 3.0]])]]],
+                 [1000.0, [[0.5, np.array([[0.0, 1.0], [10.0, 2.0]])],
+                           [0.7, np.array([[0.0, 2.0], [10.0, 4.0]])]]]]
+        query = ([0.0, 0.0, 1000.0], [0.4, 0.7, 0.7], [5.0, 8.0, 10.0])
+        clamp = TableHelper.x3TableInterpolator.fromNestedList(alist)(*query)
+        self.assertTrue(np.allclose(clamp, [1.5, 2.8, 4.0]))
+        for bounds in ['nan', 'raise']:
+            interp = TableHelper.x3TableInterpolator.fromNestedList(alist, bounds=bounds)
+            self.assertTrue(np.array_equal(interp(*query), clamp))
+        nan = TableHelper.x3TableInterpolator.fromNestedList(alist, bounds='nan')
+        self.assertTrue(np.isnan(nan(500.0, 0.4, 5.0)))
+
+    def test_x3TableInterpolator_fromX3Table(self):
+        x3table = mock.Mock(value=[0.0, 1000.0],
+                            table=[mock.Mock(value=[0.5],
+                                             table=[np.array([[1.0, 0.1], [2.0, 0.2]])]),
+                                   mock.Mock(value=[0.5],
+                                             table=[np.array([[1.0, 0.3], [2.0, 0.4]])])])
+        interp = TableHelper.x3TableInterpolator.fromX3Table(x3table)
+        self.assertAlmostEqual(interp(500.0, 0.5, 1.5), 0.25)
+
+    def _assertNestedListEqual(self, res, ref):
+        self.assertEqual(len(res), len(ref))
+        for (alt, m_list), (alt_ref, m_list_ref) in zip(res, ref):
+            self.assertEqual(alt, alt_ref)
+            self.assertEqual(len(m_list), len(m_list_ref))
+            for (m, t_ff), (m_ref, t_ff_ref) in zip(m_list, m_list_ref):
+                self.assertEqual(m, m_ref)
+                self.assertTrue(np.array_equal(t_ff, t_ff_ref))
+
+    def test_restructureChunks(self):
+        rng = np.random.RandomState(0)
+        a, b, c, d = [x[rng.permutation(36)] for x in self._gridDeck()]
+        chunks = [(a[i:i+10], b[i:i+10], c[i:i+10], d[i:i+10]) for i in range(0, 36, 10)]
+        res = list(TableHelper.restructureChunks(chunks))
+        self._assertNestedListEqual(res, TableHelper.restructureArrayData(a, b, c, d))
+
+    def test_iterCSVChunks(self):
+        a, b, c, d = self._gridDeck()
+        tmpdir = tempfile.mkdtemp()
+        filename = os.path.join(tmpdir, 'deck.csv')
+        np.savetxt(filename, np.column_stack((d, a, b, c)), delimiter=';',
+                   header='ff;alt;mach;thrust', comments='')
+        chunks = list(TableHelper.iterCSVChunks(filename, chunksize=7, columns=(1, 2, 3, 0),
+                                                delimiter=';', skiprows=1))
+        shutil.rmtree(tmpdir)
+        self.assertEqual(len(chunks), 6)
+        self.assertTrue(np.allclose(np.concatenate([chunk[3] for chunk in chunks]), d))
+        self.assertTrue(np.allclose(np.concatenate([chunk[0] for chunk in chunks]), a))
+
+    def test_iterNpyChunks(self):
+        a, b, c, d = self._gridDeck()
+        tmpdir = tempfile.mkdtemp()
+        filename = os.path.join(tmpdir, 'deck.npy')
+        np.save(filename, np.column_stack((a, b, c, d)))
+        res = list(TableHelper.restructureChunks(TableHelper.iterNpyChunks(filename, 5)))
+        shutil.rmtree(tmpdir)
+        self._assertNestedListEqual(res, TableHelper.restructureArrayData(a, b, c, d))
+
+    def test_addChunksToX3Table(self):
+        x3table = mock.Mock()
+        a, b, c, d = self._gridDeck()
+        TableHelper.addChunksToX3Table([(a, b, c, d)], x3table)
+        x3table.clear.assert_called_once_with()
+        self.assertEqual([call[0][0] for call in x3table.insertTable.call_args_list],
+                         [0.0, 5000.0, 10000.0])
+
+    def test_saveRestructuredData_roundTrip(self):
+        alist = TableHelper.restructureArrayData(*self._gridDeck())
+        tmpdir = tempfile.mkdtemp()
+        filename = os.path.join(tmpdir, 'deck.npz')
+        TableHelper.saveRestructuredData(filename, alist, 'abc')
+        res = TableHelper.loadRestructuredData(filename)
+        _, sourceHash = TableHelper.loadRestructuredArrays(filename)
+        interp = TableHelper.x3TableInterpolator.fromFile(filename)
+        shutil.rmtree(tmpdir)
+        self._assertNestedListEqual(res, alist)
+        self.assertEqual(sourceHash, 'abc')
+        self.assertAlmostEqual(float(interp(5000.0, 0.5, 2e3)), alist[1][1][1][1][1, 1])
+
+    def test_cachedRestructureArrayData(self):
+        a, b, c, d = self._gridDeck()
+        tmpdir = tempfile.mkdtemp()
+        filename = os.path.join(tmpdir, 'deck.npz')
+        try:
+            ref = TableHelper.cachedRestructureArrayData(a, b, c, d, filename)
+            with mock.patch.object(TableHelper, 'restructureArrayData') as restructure:
+                res = TableHelper.cachedRestructureArrayData(a, b, c, d, filename)
+                self.assertFalse(restructure.called)
+            self._assertNestedListEqual(res, ref)
+            #changed source data invalidates the cache
+            d = 2.0 * d
+            res = TableHelper.cachedRestructureArrayData(a, b, c, d, filename)
+            self._assertNestedListEqual(res, TableHelper.restructureArrayData(a, b, c, d))
+            _, sourceHash = TableHelper.loadRestructuredArrays(filename)
+            self.assertEqual(sourceHash, TableHelper.arrayHash(a, b, c, d))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_loadX3Table(self):
+        x3table = mock.Mock()
+        tmpdir = tempfile.mkdtemp()
+        filename = os.path.join(tmpdir, 'deck.npz')
+        TableHelper.addArraysToX3Table(*self._gridDeck(), x3table_output=mock.Mock(),
+                                       cachefile=filename)
+        TableHelper.loadX3Table(filename, x3table)
+        shutil.rmtree(tmpdir)
+        x3table.clear.assert_called_once_with()
+        self.assertEqual([call[0][0] for call in x3table.insertTable.call_args_list],
+                         [0.0, 5000.0, 10000.0])